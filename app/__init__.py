@@ -1,14 +1,17 @@
 # app/__init__.py (versão completa e correta)
+import importlib
+import multiprocessing
 
 from flask import Flask
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
 
+from app.read_routing import SessaoRoteada
 from config import Config
 
 # 1. Cria as instâncias das extensões, mas sem inicializá-las
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": SessaoRoteada})
 mail = Mail()
 login_manager = LoginManager()
 login_manager.login_view = "main.login"  # Aponta para o login dentro do Blueprint
@@ -18,68 +21,138 @@ login_manager.login_message_category = "info"
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Carrega o usuário da sessão a partir do ID."""
-    # Importamos os modelos aqui dentro para evitar importações circulares
-    from app.models import Preceptor, Residente
+    """Carrega o usuário da sessão a partir do ID (via cache de identidades)."""
+    # Importamos aqui dentro para evitar importações circulares
+    from app.identity import cache_identidades
 
-    user_type, user_db_id = user_id.split("-")
-    if user_type == "residente":
-        return db.session.get(Residente, int(user_db_id))
-    elif user_type == "preceptor":
-        return db.session.get(Preceptor, int(user_db_id))
-    return None
+    return cache_identidades.obter(user_id)
 
 
 def create_app(config_class=Config):
     """Cria e configura a instância da aplicação Flask."""
+    from app.startup_profile import PerfilInicializacao
+
+    perfil = PerfilInicializacao(
+        ativo=getattr(config_class, "PERFIL_INICIALIZACAO", False)
+    )
+
     # Cria a aplicação Flask SEM usar a pasta instance
     app = Flask(__name__, instance_relative_config=False)
     app.config.from_object(config_class)
+    app.extensions["perfil_inicializacao"] = perfil
+
+    from app import database
 
     # 2. Inicializa as extensões com a aplicação criada
-    db.init_app(app)
-    mail.init_app(app)
-    login_manager.init_app(app)
+    with perfil.etapa("banco de dados"):
+        # Pool de conexões (PostgreSQL) precisa estar na config antes do db.init_app
+        database.configurar_engine(app)
+        db.init_app(app)
+        # PRAGMAs do SQLite antes de qualquer conexão ser aberta
+        database.init_app(app)
+
+        from app import read_routing
+
+        read_routing.init_app(app)
+
+    with perfil.etapa("mail e login"):
+        mail.init_app(app)
+        login_manager.init_app(app)
+
+        from app import accounts
+        from app.identity import cache_identidades, registrar_eventos
+        from app.passwords import verificador_senhas
+
+        cache_identidades.init_app(app)
+        verificador_senhas.init_app(app)
+        registrar_eventos()
+        accounts.registrar_eventos()
+
+    with perfil.etapa("extensões da aplicação"):
+        from app.crm import cliente_crm
+        from app.jobs import fila_relatorios
+        from app.pdf_engine import motor_pdf
+        from app.report_cache import cache_relatorios
+
+        cliente_crm.init_app(app)
+        fila_relatorios.init_app(app, config_class)
+        cache_relatorios.init_app(app)
+        motor_pdf.init_app(app)
+
+        from app import descriptions, query_counter, reference_data, search
+
+        query_counter.init_app(app)
+        search.registrar_eventos()
+        descriptions.registrar_eventos()
+        reference_data.registro_referencias.init_app(app)
+        reference_data.registrar_eventos()
+
+    # Processos filhos (workers da fila e do próprio motor) não sobem um pool
+    # de renderização só deles.
+    if app.config["PDF_AQUECER_NO_BOOT"] and multiprocessing.parent_process() is None:
+        with perfil.etapa("pool de PDF"):
+            motor_pdf.iniciar()
+
+    # Dependências pesadas ficam para a primeira requisição que as usa, a
+    # menos que a configuração peça para carregá-las já no boot
+    for modulo in app.config["PRE_AQUECER_MODULOS"]:
+        with perfil.etapa(f"pré-aquecimento: {modulo}"):
+            try:
+                importlib.import_module(modulo)
+            except Exception as e:
+                app.logger.warning("Não foi possível pré-carregar %s: %s", modulo, e)
 
     # 3. Importa e registra os Blueprints (onde estão as rotas)
-    from app.routes import main_bp
-
-    app.register_blueprint(main_bp)
-
-    # 4. Verifica e cria apenas tabelas que não existem
-    with app.app_context():
-        # Importa os modelos para garantir que sejam registrados
-        # Verifica se as tabelas existem antes de criar
-        from sqlalchemy import inspect
-
-        # from app.models import (
-        #     Especialidade,
-        #     Hospital,
-        #     Preceptor,
-        #     Procedimento,
-        #     Residente,
-        #     Universidade,
-        # )
-
-        inspector = inspect(db.engine)
-        existing_tables = inspector.get_table_names()
-
-        # Lista das tabelas esperadas
-        expected_tables = [
-            "residente",
-            "preceptor",
-            "procedimento",
-            "universidade",
-            "hospital",
-            "especialidade",
-        ]
-
-        # Verifica se alguma tabela importante está faltando
-        missing_tables = [
-            table for table in expected_tables if table not in existing_tables
-        ]
-
-        if missing_tables:
-            db.create_all()
+    with perfil.etapa("blueprints"):
+        from app.routes import main_bp
+
+        app.register_blueprint(main_bp)
+
+    # 4. Verificação do schema: por padrão é um passo do deploy
+    # (`flask db verificar` / `flask db upgrade`), não de cada boot
+    if app.config["VERIFICAR_SCHEMA_NO_BOOT"]:
+        with perfil.etapa("verificação do schema"), app.app_context():
+            from app.migrations import verificar_schema
+
+            _, pendentes = verificar_schema()
+            if pendentes:
+                app.logger.warning(
+                    "Há %d migração(ões) de schema pendente(s). Execute `flask db upgrade`.",
+                    len(pendentes),
+                )
+
+    # Worker da caixa de saída numa thread (opcional, para desenvolvimento),
+    # fora de testes e dos processos filhos
+    if (
+        app.config["EMAIL_OUTBOX_THREAD"]
+        and not app.testing
+        and multiprocessing.parent_process() is None
+    ):
+        with perfil.etapa("worker da caixa de saída"):
+            from app.outbox import iniciar_thread
+
+            iniciar_thread(app)
+
+    with perfil.etapa("comandos da CLI"):
+        from app.cli import (
+            busca_cli,
+            contas_cli,
+            crm_cli,
+            db_cli,
+            descricoes_cli,
+            inicializacao_cli,
+            outbox_cli,
+        )
+
+        app.cli.add_command(db_cli)
+        app.cli.add_command(outbox_cli)
+        app.cli.add_command(crm_cli)
+        app.cli.add_command(inicializacao_cli)
+        app.cli.add_command(busca_cli)
+        app.cli.add_command(descricoes_cli)
+        app.cli.add_command(contas_cli)
+
+    if perfil.ativo:
+        app.logger.warning("Perfil de inicialização:\n%s", perfil.relatorio())
 
     return app
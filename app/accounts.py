@@ -0,0 +1,181 @@
+# app/accounts.py
+"""Índice único de contas (tabela ``conta``) para login e cadastro.
+
+Residentes e preceptores ficam em tabelas separadas; a ``conta`` guarda,
+para os dois, email e CPF apontando para (tipo, id). Assim o login é uma
+consulta só: a conta, pelo índice de email, junto com a linha do usuário,
+que tem o hash da senha e os dados do ``Principal``. As checagens de
+duplicidade do cadastro também são uma consulta só.
+
+A tabela é mantida por eventos da ORM: inserir, alterar ou remover um
+Residente/Preceptor atualiza a conta na mesma transação. O hash da senha
+fica só no usuário, então trocar a senha por qualquer caminho vale no
+próximo login. UPDATEs em massa ou SQL direto que mudem email ou CPF não
+passam pelos eventos; depois deles, rode ``flask contas reconstruir``.
+Bancos que já tinham usuários são preenchidos pela migração 3.
+"""
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.identity import Principal, cache_identidades
+from app.passwords import precisa_rehash, verificador_senhas
+
+logger = logging.getLogger(__name__)
+
+
+def _tipo(usuario):
+    return "residente" if usuario.eh_residente else "preceptor"
+
+
+def _valores(usuario):
+    return {"email": usuario.email, "cpf": usuario.cpf}
+
+
+def _ao_inserir(mapper, connection, usuario):
+    from app.models import Conta
+
+    connection.execute(
+        Conta.__table__.insert().values(
+            tipo=_tipo(usuario), usuario_id=usuario.id, **_valores(usuario)
+        )
+    )
+
+
+def _ao_atualizar(mapper, connection, usuario):
+    from app.models import Conta
+
+    tabela = Conta.__table__
+    resultado = connection.execute(
+        tabela.update()
+        .where(tabela.c.tipo == _tipo(usuario), tabela.c.usuario_id == usuario.id)
+        .values(**_valores(usuario))
+    )
+    if resultado.rowcount == 0:
+        _ao_inserir(mapper, connection, usuario)
+
+
+def _ao_remover(mapper, connection, usuario):
+    from app.models import Conta
+
+    tabela = Conta.__table__
+    connection.execute(
+        tabela.delete().where(
+            tabela.c.tipo == _tipo(usuario), tabela.c.usuario_id == usuario.id
+        )
+    )
+
+
+def registrar_eventos():
+    from app.models import Preceptor, Residente
+
+    eventos = [
+        ("after_insert", _ao_inserir),
+        ("after_update", _ao_atualizar),
+        ("after_delete", _ao_remover),
+    ]
+    for modelo in (Residente, Preceptor):
+        for nome, funcao in eventos:
+            if not event.contains(modelo, nome, funcao):
+                event.listen(modelo, nome, funcao)
+
+
+def reconstruir(conn):
+    """Refaz a tabela ``conta`` a partir de residentes e preceptores."""
+    from app.models import Conta, Preceptor, Residente
+
+    conta = Conta.__table__
+    conn.execute(conta.delete())
+    for tipo, modelo in (("residente", Residente), ("preceptor", Preceptor)):
+        tabela = modelo.__table__
+        conn.execute(
+            conta.insert().from_select(
+                ["tipo", "usuario_id", "email", "cpf"],
+                db.select(db.literal(tipo), tabela.c.id, tabela.c.email, tabela.c.cpf),
+            )
+        )
+
+
+def _refazer_hash(tipo, usuario_id, senha):
+    from app.models import Preceptor, Residente
+
+    modelo = Residente if tipo == "residente" else Preceptor
+    usuario = db.session.get(modelo, usuario_id)
+    if usuario is None:
+        return
+    usuario.set_senha(senha)
+    try:
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        logger.exception("Falha ao refazer o hash da senha de %s-%s", tipo, usuario_id)
+
+
+def autenticar(email, senha):
+    """Retorna o ``Principal`` dono de email e senha, ou None.
+
+    A conta e o usuário vêm numa consulta só, e o principal já fica no
+    cache de identidades para as próximas requisições. Se o hash guardado é
+    de uma política anterior, a senha é refeita com a atual. Levanta
+    ``VerificacaoOcupada`` se o verificador estiver lotado.
+    """
+    from app.models import Conta, Preceptor, Residente
+
+    # Com o mesmo email nas duas tabelas vale o residente, como antes
+    # ("residente" vem antes de "preceptor" em ordem decrescente)
+    linha = db.session.execute(
+        db.select(
+            Conta.tipo,
+            Conta.usuario_id,
+            db.func.coalesce(Residente.nome, Preceptor.nome).label("nome"),
+            db.func.coalesce(Residente.email, Preceptor.email).label("email"),
+            Residente.supervisor_id,
+            db.func.coalesce(Residente.senha_hash, Preceptor.senha_hash).label(
+                "senha_hash"
+            ),
+        )
+        .outerjoin(
+            Residente,
+            db.and_(Conta.tipo == "residente", Conta.usuario_id == Residente.id),
+        )
+        .outerjoin(
+            Preceptor,
+            db.and_(Conta.tipo == "preceptor", Conta.usuario_id == Preceptor.id),
+        )
+        .where(Conta.email == email)
+        .order_by(Conta.tipo.desc())
+    ).first()
+    if linha is None or not linha.senha_hash:
+        return None
+    if not verificador_senhas.verificar(linha.senha_hash, senha):
+        return None
+    if precisa_rehash(linha.senha_hash):
+        _refazer_hash(linha.tipo, linha.usuario_id, senha)
+    principal = Principal(
+        linha.tipo, linha.usuario_id, linha.nome, linha.email, linha.supervisor_id
+    )
+    cache_identidades.guardar(principal)
+    return principal
+
+
+def conflitos_cadastro(tipo, email, cpf):
+    """Quais de email e CPF já estão em uso por uma conta de ``tipo``.
+
+    Retorna um conjunto com "email" e/ou "cpf".
+    """
+    from app.models import Conta
+
+    linhas = db.session.execute(
+        db.select(Conta.email, Conta.cpf).where(
+            Conta.tipo == tipo, db.or_(Conta.email == email, Conta.cpf == cpf)
+        )
+    ).all()
+    conflitos = set()
+    for linha in linhas:
+        if linha.email == email:
+            conflitos.add("email")
+        if linha.cpf == cpf:
+            conflitos.add("cpf")
+    return conflitos
@@ -0,0 +1,228 @@
+# app/cli.py
+import click
+from flask.cli import AppGroup
+
+db_cli = AppGroup("db", help="Gerencia o schema do banco de dados.")
+
+
+@db_cli.command("upgrade")
+def db_upgrade():
+    """Cria tabelas novas e aplica as migrações pendentes."""
+    from app.migrations import aplicar_migracoes
+
+    aplicadas = aplicar_migracoes()
+    if not aplicadas:
+        click.echo("O banco já está na versão mais recente.")
+    for m in aplicadas:
+        click.echo(f"Aplicada {m.versao:04d}: {m.descricao}")
+
+
+@db_cli.command("verificar")
+def db_verificar():
+    """Cria as tabelas que faltam e avisa se há migrações pendentes."""
+    from app.migrations import verificar_schema
+
+    criadas, pendentes = verificar_schema()
+    for tabela in criadas:
+        click.echo(f"Tabela criada: {tabela}")
+    for m in pendentes:
+        click.echo(f"Pendente {m.versao:04d}: {m.descricao}")
+    if pendentes:
+        raise click.ClickException(
+            "Há migrações pendentes. Execute `flask db upgrade`."
+        )
+    click.echo("Schema em dia.")
+
+
+@db_cli.command("status")
+def db_status():
+    """Mostra a versão atual do schema e as migrações pendentes."""
+    from app import db
+    from app.migrations import migracoes_pendentes, versao_atual
+
+    with db.engine.connect() as conn:
+        click.echo(f"Versão atual: {versao_atual(conn)}")
+        pendentes = migracoes_pendentes(conn)
+    if not pendentes:
+        click.echo("Nenhuma migração pendente.")
+    for m in pendentes:
+        click.echo(f"Pendente {m.versao:04d}: {m.descricao}")
+
+
+outbox_cli = AppGroup("outbox", help="Caixa de saída de emails.")
+
+
+@outbox_cli.command("worker")
+def outbox_worker():
+    """Envia os emails da caixa de saída continuamente (Ctrl+C para parar)."""
+    from flask import current_app
+
+    from app.outbox import RemetenteOutbox
+
+    click.echo("Worker da caixa de saída iniciado.")
+    try:
+        RemetenteOutbox(current_app._get_current_object()).executar()
+    except KeyboardInterrupt:
+        click.echo("Worker encerrado.")
+
+
+@outbox_cli.command("drenar")
+def outbox_drenar():
+    """Envia de uma vez todos os emails vencidos da caixa de saída."""
+    from flask import current_app
+
+    from app.outbox import RemetenteOutbox
+
+    remetente = RemetenteOutbox(current_app._get_current_object())
+    total = 0
+    try:
+        while processados := remetente.drenar():
+            total += processados
+    finally:
+        remetente._fechar_conexao()
+    click.echo(f"{total} email(s) processado(s).")
+
+
+crm_cli = AppGroup("crm", help="Consultas de CRM na API do CFM.")
+
+
+@crm_cli.command("verificar-lote")
+@click.argument("entrada", type=click.Path(exists=True, dir_okay=False))
+@click.argument("saida", type=click.Path(dir_okay=False, writable=True))
+def crm_verificar_lote(entrada, saida):
+    """Verifica os CRMs de ENTRADA (CSV com colunas uf e crm) e grava em SAIDA."""
+    import csv
+
+    from app.crm import ErroConsultaCRM, cliente_crm
+
+    with open(entrada, newline="", encoding="utf-8-sig") as arquivo:
+        leitor = csv.DictReader(arquivo)
+        colunas = {
+            (nome or "").strip().lower(): nome for nome in leitor.fieldnames or []
+        }
+        if "uf" not in colunas or "crm" not in colunas:
+            raise click.UsageError("O CSV de entrada precisa das colunas 'uf' e 'crm'.")
+        pares = [
+            (linha[colunas["uf"]] or "", linha[colunas["crm"]] or "")
+            for linha in leitor
+        ]
+    pares = [(uf, crm) for uf, crm in pares if uf.strip() and crm.strip()]
+
+    resultados = cliente_crm.consultar_lote(pares)
+
+    regulares = erros = 0
+    with open(saida, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(["uf", "crm", "encontrado", "situacao", "nome", "erro"])
+        for uf, crm in pares:
+            chave = (uf.strip().upper(), crm.strip())
+            resultado = resultados[chave]
+            if isinstance(resultado, ErroConsultaCRM):
+                erros += 1
+                escritor.writerow([*chave, "", "", "", str(resultado)])
+                continue
+            if resultado.encontrado and resultado.situacao == "Regular":
+                regulares += 1
+            escritor.writerow(
+                [
+                    *chave,
+                    "sim" if resultado.encontrado else "nao",
+                    resultado.situacao or "",
+                    (resultado.dados or {}).get("NM_MEDICO", ""),
+                    "",
+                ]
+            )
+    click.echo(
+        f"{len(pares)} CRM(s) verificados: {regulares} regular(es), {erros} com erro."
+    )
+
+
+inicializacao_cli = AppGroup(
+    "inicializacao", help="Diagnóstico da subida da aplicação."
+)
+
+
+@inicializacao_cli.command("perfil")
+@click.option("--limite", default=20, show_default=True, help="Imports listados.")
+def inicializacao_perfil(limite):
+    """Mede imports e etapas do create_app num processo novo."""
+    import os
+    import subprocess
+    import sys
+
+    from app.startup_profile import resumir_importtime
+
+    codigo = (
+        "from app import create_app\n"
+        "app = create_app()\n"
+        "print(app.extensions['perfil_inicializacao'].relatorio())\n"
+    )
+    ambiente = dict(os.environ, PERFIL_INICIALIZACAO="true")
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True,
+        text=True,
+        env=ambiente,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if processo.returncode != 0:
+        raise click.ClickException(processo.stderr[-2000:])
+
+    total, imports = resumir_importtime(processo.stderr, limite)
+    click.echo(f"Imports de primeiro nível: {total / 1000:.1f} ms")
+    for modulo, cumulativo in imports:
+        click.echo(f"  {modulo:<40} {cumulativo / 1000:9.1f} ms")
+    click.echo("")
+    click.echo(processo.stdout.rstrip())
+
+
+busca_cli = AppGroup("busca", help="Índice de busca textual dos procedimentos.")
+
+
+@busca_cli.command("reconstruir")
+def busca_reconstruir():
+    """Cria (se preciso) e refaz o índice FTS5 a partir dos procedimentos."""
+    from app import db
+    from app.search import criar_indice, fts5_suportado, reconstruir
+
+    with db.engine.begin() as conn:
+        if not fts5_suportado(conn):
+            raise click.ClickException(
+                "O banco não é SQLite com FTS5; a busca usa ILIKE e não tem índice."
+            )
+        criar_indice(conn)
+        reconstruir(conn)
+        total = conn.exec_driver_sql("SELECT count(*) FROM procedimento").scalar()
+    click.echo(f"Índice de busca reconstruído ({total} procedimento(s)).")
+
+
+descricoes_cli = AppGroup(
+    "descricoes", help="Descrições HEIPOC guardadas nos procedimentos."
+)
+
+
+@descricoes_cli.command("recalcular")
+def descricoes_recalcular():
+    """Refaz descricao_html e incrementa a revisão de todos os procedimentos."""
+    from app import db
+    from app.descriptions import recalcular
+
+    with db.engine.begin() as conn:
+        total = recalcular(conn)
+    click.echo(f"{total} descrição(ões) recalculada(s).")
+
+
+contas_cli = AppGroup("contas", help="Índice de contas usado no login e no cadastro.")
+
+
+@contas_cli.command("reconstruir")
+def contas_reconstruir():
+    """Refaz a tabela conta a partir de residentes e preceptores."""
+    from app import db
+    from app.accounts import reconstruir
+    from app.models import Conta
+
+    with db.engine.begin() as conn:
+        reconstruir(conn)
+        total = conn.execute(db.select(db.func.count()).select_from(Conta)).scalar()
+    click.echo(f"{total} conta(s) reconstruída(s).")
@@ -0,0 +1,361 @@
+# app/crm.py
+"""Cliente da API de busca de médicos do portal do CFM.
+
+Todas as consultas passam por uma única ``requests.Session`` com pool de
+conexões, criada na primeira utilização. Os resultados ficam em cache por
+(uf, crm): CRMs encontrados por ``CRM_CACHE_TTL`` segundos e CRMs não
+encontrados por ``CRM_CACHE_TTL_NEGATIVO``. Erros de comunicação não são
+guardados; depois de ``CRM_CIRCUITO_FALHAS`` erros seguidos o circuito abre
+e as consultas falham na hora por ``CRM_CIRCUITO_ESPERA`` segundos, quando
+uma nova tentativa é liberada.
+
+Além da memória do processo, os resultados são gravados na tabela
+``crm_cache``; assim a verificação em lote (``consultar_lote`` e ``flask crm
+verificar-lote``) e o fluxo de cadastro aproveitam as consultas um do outro.
+No lote, os CRMs que não estão em cache são agrupados em buscas de até
+``CRM_LOTE_TAMANHO`` médicos, com no máximo ``CRM_LOTE_CONCORRENCIA``
+requisições simultâneas. A resposta de uma busca com vários médicos só vale
+para os CRMs que ela identifica sem ambiguidade (um único item com o mesmo
+``NU_CRM``/``SG_UF``). Os demais são consultados um a um. Só uma consulta
+individual pode concluir que um CRM não existe, e só ela grava esse
+resultado negativo no cache compartilhado.
+
+Para testar sem o portal do CFM, aponte ``CFM_API_URL`` para um servidor
+local que responda no mesmo formato (``{"dados": [{"COUNT": ..., "SITUACAO":
+...}]}``).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# encontrado: a busca retornou exatamente um médico
+ResultadoCRM = namedtuple(
+    "ResultadoCRM", ["uf", "crm", "encontrado", "situacao", "dados"]
+)
+
+
+class ErroConsultaCRM(Exception):
+    """Falha ao consultar a API do CFM."""
+
+
+class CircuitoAberto(ErroConsultaCRM):
+    """A API do CFM falhou seguidamente; a consulta nem foi tentada."""
+
+
+def _chave(uf, crm):
+    return uf.strip().upper(), crm.strip()
+
+
+def _payload(uf, crm):
+    return {
+        "medico": {
+            "crmMedico": crm,
+            "ufMedico": uf,
+        },
+        "page": 1,
+        "pageNumber": 1,
+        "pageSize": 10,
+    }
+
+
+def _interpretar(uf, crm, dados_medico):
+    if not dados_medico:
+        return ResultadoCRM(uf, crm, False, None, None)
+    encontrado = int(dados_medico.get("COUNT", 0)) == 1
+    return ResultadoCRM(
+        uf, crm, encontrado, dados_medico.get("SITUACAO"), dados_medico
+    )
+
+
+def _interpretar_bloco(bloco, dados):
+    """Associa os itens da resposta às buscas de um bloco."""
+    if len(bloco) == 1:
+        uf, crm = bloco[0]
+        return {bloco[0]: _interpretar(uf, crm, dados[0] if dados else None)}
+
+    # Com várias buscas na mesma requisição, cada item traz o CRM e a UF do
+    # médico encontrado. CRMs sem item (ou com mais de um) ficam de fora: a
+    # falta de resposta no lote não prova que o CRM não existe.
+    por_chave = defaultdict(list)
+    for item in dados:
+        uf = str(item.get("SG_UF", "")).strip().upper()
+        crm = str(item.get("NU_CRM", "")).strip().lstrip("0")
+        por_chave[(uf, crm)].append(item)
+
+    resultados = {}
+    for uf, crm in bloco:
+        itens = por_chave.get((uf, crm.lstrip("0")), [])
+        if len(itens) == 1:
+            resultados[(uf, crm)] = ResultadoCRM(
+                uf, crm, True, itens[0].get("SITUACAO"), itens[0]
+            )
+    return resultados
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+class ClienteCRM:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessao = None
+        self._cache = OrderedDict()
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self.url = None
+
+    def init_app(self, app):
+        self.url = app.config["CFM_API_URL"]
+        self.timeout = (app.config["CRM_TIMEOUT_CONEXAO"], app.config["CRM_TIMEOUT"])
+        self.tamanho_pool = app.config["CRM_POOL_TAMANHO"]
+        self.ttl = app.config["CRM_CACHE_TTL"]
+        self.ttl_negativo = app.config["CRM_CACHE_TTL_NEGATIVO"]
+        self.cache_max = app.config["CRM_CACHE_MAX"]
+        self.limite_falhas = app.config["CRM_CIRCUITO_FALHAS"]
+        self.espera_circuito = app.config["CRM_CIRCUITO_ESPERA"]
+        self.tamanho_lote = app.config["CRM_LOTE_TAMANHO"]
+        self.concorrencia = app.config["CRM_LOTE_CONCORRENCIA"]
+        app.extensions["cliente_crm"] = self
+
+    def _obter_sessao(self):
+        with self._lock:
+            if self._sessao is None:
+                # requests só é importado na primeira consulta, fora do boot
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                adaptador = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.tamanho_pool
+                )
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                sessao.headers["Content-Type"] = "application/json"
+                self._sessao = sessao
+            return self._sessao
+
+    # Cache
+
+    def _da_memoria(self, chave):
+        with self._lock:
+            item = self._cache.get(chave)
+            if item is None:
+                return None
+            expira_em, resultado = item
+            if expira_em <= time.monotonic():
+                del self._cache[chave]
+                return None
+            self._cache.move_to_end(chave)
+            return resultado
+
+    def _guardar_na_memoria(self, resultado, ttl):
+        chave = (resultado.uf, resultado.crm)
+        with self._lock:
+            self._cache[chave] = (time.monotonic() + ttl, resultado)
+            self._cache.move_to_end(chave)
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+
+    def _do_banco(self, chaves):
+        from app.models import CrmCache
+
+        tabela = CrmCache.__table__
+        agora = _agora()
+        try:
+            with db.engine.connect() as conn:
+                linhas = conn.execute(
+                    db.select(tabela).where(
+                        tabela.c.uf.in_({uf for uf, _ in chaves}),
+                        tabela.c.crm.in_({crm for _, crm in chaves}),
+                        tabela.c.expira_em > agora,
+                    )
+                ).all()
+        except SQLAlchemyError as e:
+            logger.warning("Não foi possível ler o cache de CRM do banco: %s", e)
+            return {}
+
+        resultados = {}
+        for linha in linhas:
+            chave = (linha.uf, linha.crm)
+            if chave not in chaves:
+                continue
+            resultado = ResultadoCRM(
+                linha.uf, linha.crm, linha.encontrado, linha.situacao, linha.dados
+            )
+            expira_em = linha.expira_em.replace(tzinfo=timezone.utc)
+            self._guardar_na_memoria(resultado, (expira_em - agora).total_seconds())
+            resultados[chave] = resultado
+        return resultados
+
+    def _do_cache(self, chaves):
+        """Resultados em cache (memória, depois banco) para as chaves dadas."""
+        resultados = {}
+        for chave in chaves:
+            resultado = self._da_memoria(chave)
+            if resultado is not None:
+                resultados[chave] = resultado
+        faltantes = {chave for chave in chaves if chave not in resultados}
+        if faltantes:
+            resultados.update(self._do_banco(faltantes))
+        return resultados
+
+    def _guardar(self, resultados):
+        from app.models import CrmCache
+
+        tabela = CrmCache.__table__
+        agora = _agora()
+        linhas = []
+        for resultado in resultados:
+            ttl = self.ttl if resultado.encontrado else self.ttl_negativo
+            self._guardar_na_memoria(resultado, ttl)
+            linhas.append(
+                {
+                    "uf": resultado.uf,
+                    "crm": resultado.crm,
+                    "encontrado": resultado.encontrado,
+                    "situacao": resultado.situacao,
+                    "dados": resultado.dados,
+                    "expira_em": agora + timedelta(seconds=ttl),
+                }
+            )
+        try:
+            with db.engine.begin() as conn:
+                for linha in linhas:
+                    conn.execute(
+                        tabela.delete().where(
+                            tabela.c.uf == linha["uf"], tabela.c.crm == linha["crm"]
+                        )
+                    )
+                conn.execute(tabela.insert(), linhas)
+        except SQLAlchemyError as e:
+            logger.warning("Não foi possível gravar o cache de CRM no banco: %s", e)
+
+    def limpar_cache(self):
+        """Esvazia o cache em memória (o do banco expira sozinho)."""
+        with self._lock:
+            self._cache.clear()
+
+    # Circuit breaker
+
+    def _verificar_circuito(self):
+        with self._lock:
+            if self._falhas < self.limite_falhas:
+                return
+            agora = time.monotonic()
+            if agora < self._aberto_ate:
+                raise CircuitoAberto(
+                    "A API do CFM está indisponível no momento. "
+                    "Tente novamente em alguns instantes."
+                )
+            # Meio aberto: deixa esta consulta passar e segura as demais até
+            # ela terminar (ou o prazo vencer de novo)
+            self._aberto_ate = agora + self.espera_circuito
+
+    def _registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+
+    def _registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.espera_circuito
+                logger.warning(
+                    "Circuito da API do CFM aberto após %d falhas seguidas",
+                    self._falhas,
+                )
+
+    def _requisitar(self, payloads):
+        """POST de uma lista de buscas; retorna a lista ``dados`` da resposta."""
+        import requests
+
+        self._verificar_circuito()
+        try:
+            resposta = self._obter_sessao().post(
+                self.url, json=payloads, timeout=self.timeout
+            )
+            resposta.raise_for_status()
+            corpo = resposta.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._registrar_falha()
+            raise ErroConsultaCRM(str(e)) from e
+        self._registrar_sucesso()
+        return (corpo or {}).get("dados") or []
+
+    def _consultar_bloco(self, bloco):
+        try:
+            dados = self._requisitar([_payload(uf, crm) for uf, crm in bloco])
+        except ErroConsultaCRM as e:
+            return e
+        return _interpretar_bloco(bloco, dados)
+
+    def _consultar_blocos(self, blocos):
+        if len(blocos) <= 1:
+            return [self._consultar_bloco(bloco) for bloco in blocos]
+        with ThreadPoolExecutor(
+            max_workers=min(self.concorrencia, len(blocos)),
+            thread_name_prefix="crm",
+        ) as executor:
+            return list(executor.map(self._consultar_bloco, blocos))
+
+    def consultar_lote(self, pares):
+        """Consulta vários CRMs de uma vez.
+
+        Recebe pares (uf, crm) e devolve um dicionário (uf, crm) ->
+        ``ResultadoCRM``, ou a ``ErroConsultaCRM`` do bloco que falhou. As
+        chaves vêm normalizadas (UF em maiúsculas, sem espaços).
+        """
+        chaves = list(dict.fromkeys(_chave(uf, crm) for uf, crm in pares))
+        resultados = self._do_cache(chaves)
+        faltantes = [chave for chave in chaves if chave not in resultados]
+        blocos = [
+            faltantes[i : i + self.tamanho_lote]
+            for i in range(0, len(faltantes), self.tamanho_lote)
+        ]
+
+        novos = []
+        while blocos:
+            sem_resposta = []
+            for bloco, resposta in zip(blocos, self._consultar_blocos(blocos)):
+                if isinstance(resposta, ErroConsultaCRM):
+                    resultados.update((chave, resposta) for chave in bloco)
+                    continue
+                resultados.update(resposta)
+                novos.extend(resposta.values())
+                sem_resposta.extend(chave for chave in bloco if chave not in resposta)
+            if sem_resposta:
+                logger.debug(
+                    "%d CRM(s) sem resposta clara no lote; consultando um a um",
+                    len(sem_resposta),
+                )
+            # Blocos de um CRM sempre têm resposta, então isto termina
+            blocos = [[chave] for chave in sem_resposta]
+        if novos:
+            self._guardar(novos)
+        return resultados
+
+    def consultar(self, uf, crm):
+        """Consulta um CRM, usando o cache quando possível."""
+        resultado = self.consultar_lote([(uf, crm)])[_chave(uf, crm)]
+        if isinstance(resultado, ErroConsultaCRM):
+            raise resultado
+        return resultado
+
+    def encerrar(self):
+        with self._lock:
+            if self._sessao is not None:
+                self._sessao.close()
+                self._sessao = None
+
+
+cliente_crm = ClienteCRM()
@@ -0,0 +1,109 @@
+# app/database.py
+"""Ajustes das conexões com o banco.
+
+Com ``DATABASE_URL`` apontando para um banco servidor (PostgreSQL),
+``configurar_engine`` monta o pool de conexões a partir de ``DB_POOL_SIZE``,
+``DB_MAX_OVERFLOW``, ``DB_POOL_PRE_PING`` e ``DB_POOL_RECYCLE``. As sessões
+do PostgreSQL usam o fuso UTC, o mesmo das datas gravadas pelos modelos.
+Opções passadas diretamente em ``SQLALCHEMY_ENGINE_OPTIONS`` têm
+precedência.
+
+No SQLite, a cada nova conexão são executados os PRAGMAs configurados em
+``Config``:
+
+- ``SQLITE_JOURNAL_MODE`` (WAL): leitores não bloqueiam o escritor e
+  vice-versa, o que evita os "database is locked" dos POSTs de avaliação
+  enquanto os dashboards leem;
+- ``SQLITE_SYNCHRONOUS`` (NORMAL): com WAL continua seguro contra
+  corrupção, com bem menos fsyncs por commit;
+- ``SQLITE_BUSY_TIMEOUT`` (ms): quanto uma escrita espera pelo lock antes
+  de falhar;
+- ``SQLITE_MMAP_SIZE`` e ``SQLITE_CACHE_SIZE``: leitura via mmap e cache de
+  páginas por conexão (valor negativo = KiB).
+
+Um valor ``None`` (ou vazio) deixa o PRAGMA correspondente no padrão do
+SQLite. O bind ``leitura`` (app/read_routing.py) abre o arquivo com
+``mode=ro``, onde ``journal_mode`` e ``synchronous`` falhariam com "attempt
+to write a readonly database"; nele só entram os PRAGMAs de leitura.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app import db
+from app.read_routing import CHAVE_LEITURA
+
+_PRAGMAS = [
+    ("journal_mode", "SQLITE_JOURNAL_MODE"),
+    ("synchronous", "SQLITE_SYNCHRONOUS"),
+    ("busy_timeout", "SQLITE_BUSY_TIMEOUT"),
+    ("mmap_size", "SQLITE_MMAP_SIZE"),
+    ("cache_size", "SQLITE_CACHE_SIZE"),
+]
+
+# Os que valem numa conexão somente leitura
+_PRAGMAS_LEITURA = {"busy_timeout", "mmap_size", "cache_size"}
+
+
+def opcoes_engine(config):
+    """Opções de engine para a URL configurada (vazio para SQLite)."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        return {}
+    opcoes = {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+    if url.get_backend_name() == "postgresql":
+        opcoes["connect_args"] = {"options": "-c timezone=utc"}
+    return opcoes
+
+
+def configurar_engine(app):
+    """Completa ``SQLALCHEMY_ENGINE_OPTIONS``; chamar antes de ``db.init_app``."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **opcoes_engine(app.config),
+        **(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}),
+    }
+
+
+def pragmas_configurados(config):
+    """Lista (pragma, valor) dos PRAGMAs ativos na configuração."""
+    return [
+        (pragma, config[chave])
+        for pragma, chave in _PRAGMAS
+        if config.get(chave) not in (None, "")
+    ]
+
+
+def registrar_pragmas(engine, pragmas):
+    """Executa ``pragmas`` em toda nova conexão de ``engine``."""
+
+    def _ao_conectar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, valor in pragmas:
+                cursor.execute(f"PRAGMA {pragma} = {valor}")
+        finally:
+            cursor.close()
+
+    event.listen(engine, "connect", _ao_conectar)
+
+
+def init_app(app):
+    pragmas = pragmas_configurados(app.config)
+    if not pragmas:
+        return
+    de_leitura = [
+        (pragma, valor) for pragma, valor in pragmas if pragma in _PRAGMAS_LEITURA
+    ]
+    with app.app_context():
+        for chave, engine in db.engines.items():
+            if engine.dialect.name != "sqlite":
+                continue
+            if chave == CHAVE_LEITURA:
+                if de_leitura:
+                    registrar_pragmas(engine, de_leitura)
+            else:
+                registrar_pragmas(engine, pragmas)
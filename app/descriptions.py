@@ -0,0 +1,105 @@
+# app/descriptions.py
+"""Descrição HEIPOC guardada em cada procedimento.
+
+``descricao_html`` (o bloco HEIPOC do relatório, do template
+``_descricao_heipoc.html``) é uma coluna de Procedimento preenchida por
+eventos da ORM. Ela é recalculada no INSERT e nos UPDATEs que mudam algum
+campo HEIPOC. Validar ou rejeitar, que só mexe em status e observação, não
+refaz nada. O relatório em PDF usa ``descricao_html`` em vez de montar o
+bloco a cada renderização. As exportações mantêm uma coluna por campo
+HEIPOC, e os emails de avaliação não levam o texto clínico.
+
+Os mesmos eventos incrementam ``revisao`` a cada UPDATE que muda alguma
+coluna do procedimento. A impressão digital do relatório
+(``fingerprint_relatorio``) usa a revisão em vez de ler os textos.
+
+UPDATEs em massa (``query.update``) não passam pelos eventos; depois de um
+deles, rode ``flask descricoes recalcular``, que também incrementa as
+revisões. Bancos existentes são preenchidos pela migração 6.
+"""
+from flask import current_app
+from sqlalchemy import bindparam, event, inspect
+
+CAMPOS_HEIPOC = [
+    "historia_clinica",
+    "exame_fisico",
+    "interpretacao_diagnostico",
+    "plano_terapeutico",
+    "orientacao_paciente",
+    "conhecimento_aprendizagem",
+]
+
+
+def renderizar(procedimento):
+    """HTML da descrição HEIPOC de ``procedimento``.
+
+    Aceita um Procedimento ou qualquer objeto com os campos HEIPOC (uma
+    linha de consulta, por exemplo).
+    """
+    template = current_app.jinja_env.get_template("_descricao_heipoc.html")
+    return template.render(proc=procedimento)
+
+
+def _antes_de_inserir(mapper, connection, procedimento):
+    procedimento.descricao_html = renderizar(procedimento)
+
+
+def _antes_de_atualizar(mapper, connection, procedimento):
+    estado = inspect(procedimento)
+    colunas = mapper.column_attrs
+    if not any(estado.attrs[coluna.key].history.has_changes() for coluna in colunas):
+        # Marcado como alterado, mas sem nenhuma mudança de fato
+        return
+    # Incrementado no próprio UPDATE, para dois workers não gravarem a mesma
+    # revisão
+    procedimento.revisao = mapper.class_.revisao + 1
+    if procedimento.descricao_html is None or any(
+        estado.attrs[campo].history.has_changes() for campo in CAMPOS_HEIPOC
+    ):
+        procedimento.descricao_html = renderizar(procedimento)
+
+
+def registrar_eventos():
+    from app.models import Procedimento
+
+    for nome, funcao in (
+        ("before_insert", _antes_de_inserir),
+        ("before_update", _antes_de_atualizar),
+    ):
+        if not event.contains(Procedimento, nome, funcao):
+            event.listen(Procedimento, nome, funcao)
+
+
+def recalcular(conn, lote=500):
+    """Recalcula as descrições de todos os procedimentos; retorna o total.
+
+    Incrementa também a revisão de cada um, então relatórios guardados em
+    cache antes de um UPDATE em massa deixam de ser usados.
+    """
+    from app.models import Procedimento
+
+    tabela = Procedimento.__table__
+    colunas = [tabela.c.id, *(tabela.c[campo] for campo in CAMPOS_HEIPOC)]
+    ultimo_id, total = 0, 0
+    while True:
+        linhas = conn.execute(
+            tabela.select()
+            .with_only_columns(*colunas)
+            .where(tabela.c.id > ultimo_id)
+            .order_by(tabela.c.id)
+            .limit(lote)
+        ).all()
+        if not linhas:
+            return total
+        valores = [{"_id": linha.id, "_html": renderizar(linha)} for linha in linhas]
+        conn.execute(
+            tabela.update()
+            .where(tabela.c.id == bindparam("_id"))
+            .values(
+                descricao_html=bindparam("_html"),
+                revisao=tabela.c.revisao + 1,
+            ),
+            valores,
+        )
+        ultimo_id = linhas[-1].id
+        total += len(linhas)
@@ -1,34 +1,49 @@
 # app/email.py
-import threading
+from datetime import datetime, timedelta, timezone
 
 from flask import current_app
-from flask_mail import Message
-
-from app import mail
-
-
-def send_async_email(app, msg):
-    """Envia email de forma assíncrona"""
-    with app.app_context():
-        mail.send(msg)
-
-
-def send_email(subject, sender, recipients, text_body, html_body=None):
-    """Função para enviar emails"""
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    if html_body:
-        msg.html = html_body
-
-    # Envia o email em uma thread separada para não bloquear a aplicação
-    thread = threading.Thread(
-        target=send_async_email, args=(current_app._get_current_object(), msg)
+from markupsafe import escape
+
+from app import db
+
+
+def send_email(
+    subject,
+    sender,
+    recipients,
+    text_body,
+    html_body=None,
+    atraso=0,
+    chave_resumo=None,
+    procedimento_id=None,
+    avaliacao_status=None,
+):
+    """Coloca o email na caixa de saída (o envio é feito por app/outbox.py).
+
+    O registro só é adicionado à sessão: ele é gravado no mesmo commit da
+    ação que gerou o email, e nada é enviado se essa ação for desfeita.
+    Com ``chave_resumo``, o email é enviado só depois de ``atraso`` segundos,
+    junto com os outros pendentes da mesma chave.
+    """
+    from app.models import EmailOutbox
+
+    db.session.add(
+        EmailOutbox(
+            assunto=subject,
+            remetente=sender,
+            destinatarios=",".join(recipients),
+            corpo_texto=text_body,
+            corpo_html=html_body,
+            proxima_tentativa=datetime.now(timezone.utc) + timedelta(seconds=atraso),
+            chave_resumo=chave_resumo,
+            procedimento_id=procedimento_id,
+            avaliacao_status=avaliacao_status,
+        )
     )
-    thread.start()
 
 
-def send_procedimento_avaliado_email(residente, procedimento, status):
-    """Envia email quando um procedimento é avaliado"""
+def montar_email_avaliacao(residente, procedimento, status):
+    """Monta assunto, texto e HTML do email de um procedimento avaliado"""
     if status == "Validado":
         subject = f"✅ Procedimento Aprovado - {procedimento.nome_procedimento}"
         template_text = f"""
@@ -53,19 +68,19 @@ Sistema de Logbook do Residente
 <html>
 <body>
     <h2 style="color: #28a745;">✅ Procedimento Aprovado</h2>
-    <p>Olá <strong>{residente.nome}</strong>,</p>
+    <p>Olá <strong>{escape(residente.nome)}</strong>,</p>
     
     <p>Seu procedimento foi <strong style="color: #28a745;">APROVADO</strong>!</p>
     
     <div style="border: 1px solid #ddd; padding: 15px; margin: 15px 0; border-radius: 5px;">
         <h3>Detalhes do Procedimento:</h3>
         <ul>
-            <li><strong>Nome:</strong> {procedimento.nome_procedimento}</li>
+            <li><strong>Nome:</strong> {escape(procedimento.nome_procedimento)}</li>
             <li><strong>Data de Realização:</strong> {procedimento.data_realizacao.strftime('%d/%m/%Y')}</li>
-            <li><strong>Preceptor:</strong> {procedimento.preceptor.nome}</li>
+            <li><strong>Preceptor:</strong> {escape(procedimento.preceptor.nome)}</li>
         </ul>
         
-        {f"<p><strong>Observações do Preceptor:</strong><br>{procedimento.observacao_preceptor}</p>" if procedimento.observacao_preceptor else ""}
+        {f"<p><strong>Observações do Preceptor:</strong><br>{escape(procedimento.observacao_preceptor)}</p>" if procedimento.observacao_preceptor else ""}
     </div>
     
     <p style="color: #28a745;"><strong>Parabéns pelo seu progresso!</strong></p>
@@ -100,19 +115,19 @@ Sistema de Logbook do Residente
 <html>
 <body>
     <h2 style="color: #dc3545;">❌ Procedimento Rejeitado</h2>
-    <p>Olá <strong>{residente.nome}</strong>,</p>
+    <p>Olá <strong>{escape(residente.nome)}</strong>,</p>
     
     <p>Seu procedimento foi <strong style="color: #dc3545;">REJEITADO</strong> e precisa ser revisado.</p>
     
     <div style="border: 1px solid #ddd; padding: 15px; margin: 15px 0; border-radius: 5px;">
         <h3>Detalhes do Procedimento:</h3>
         <ul>
-            <li><strong>Nome:</strong> {procedimento.nome_procedimento}</li>
+            <li><strong>Nome:</strong> {escape(procedimento.nome_procedimento)}</li>
             <li><strong>Data de Realização:</strong> {procedimento.data_realizacao.strftime('%d/%m/%Y')}</li>
-            <li><strong>Preceptor:</strong> {procedimento.preceptor.nome}</li>
+            <li><strong>Preceptor:</strong> {escape(procedimento.preceptor.nome)}</li>
         </ul>
         
-        {f"<p><strong>Observações do Preceptor:</strong><br>{procedimento.observacao_preceptor}</p>" if procedimento.observacao_preceptor else ""}
+        {f"<p><strong>Observações do Preceptor:</strong><br>{escape(procedimento.observacao_preceptor)}</p>" if procedimento.observacao_preceptor else ""}
     </div>
     
     <p style="color: #ffc107;">Por favor, revise as informações e reenvie o procedimento se necessário.</p>
@@ -123,10 +138,117 @@ Sistema de Logbook do Residente
 </html>
         """
 
+    return subject, template_text, template_html
+
+
+def _linha_resumo_texto(procedimento, status):
+    linha = (
+        f"- [{'APROVADO' if status == 'Validado' else 'REJEITADO'}] "
+        f"{procedimento.nome_procedimento} "
+        f"({procedimento.data_realizacao.strftime('%d/%m/%Y')}, "
+        f"Preceptor: {procedimento.preceptor.nome})"
+    )
+    if procedimento.observacao_preceptor:
+        linha += f"\n  Observações: {procedimento.observacao_preceptor}"
+    return linha
+
+
+def _linha_resumo_html(procedimento, status):
+    if status == "Validado":
+        situacao = '<span style="color: #28a745;">✅ Aprovado</span>'
+    else:
+        situacao = '<span style="color: #dc3545;">❌ Rejeitado</span>'
+    return f"""
+        <tr>
+            <td style="padding: 6px; border-bottom: 1px solid #ddd;">{situacao}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #ddd;">{escape(procedimento.nome_procedimento)}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #ddd;">{procedimento.data_realizacao.strftime('%d/%m/%Y')}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #ddd;">{escape(procedimento.preceptor.nome)}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #ddd;">{escape(procedimento.observacao_preceptor or "")}</td>
+        </tr>"""
+
+
+def montar_email_resumo_avaliacoes(residente, avaliacoes):
+    """Monta um único email com várias avaliações.
+
+    ``avaliacoes`` é uma lista de pares (procedimento, status).
+    """
+    aprovados = sum(1 for _, status in avaliacoes if status == "Validado")
+    rejeitados = len(avaliacoes) - aprovados
+    subject = (
+        f"📋 {len(avaliacoes)} procedimentos avaliados - "
+        f"{aprovados} aprovado(s), {rejeitados} rejeitado(s)"
+    )
+    linhas_texto = "\n".join(
+        _linha_resumo_texto(procedimento, status)
+        for procedimento, status in avaliacoes
+    )
+    template_text = f"""
+Olá {residente.nome},
+
+{len(avaliacoes)} procedimentos seus foram avaliados: {aprovados} aprovado(s) e {rejeitados} rejeitado(s).
+
+{linhas_texto}
+
+{"Revise os procedimentos rejeitados e reenvie-os se necessário." if rejeitados else "Parabéns pelo seu progresso!"}
+
+Atenciosamente,
+Sistema de Logbook do Residente
+        """
+
+    linhas_html = "".join(
+        _linha_resumo_html(procedimento, status)
+        for procedimento, status in avaliacoes
+    )
+    template_html = f"""
+<html>
+<body>
+    <h2>📋 Procedimentos Avaliados</h2>
+    <p>Olá <strong>{escape(residente.nome)}</strong>,</p>
+
+    <p>{len(avaliacoes)} procedimentos seus foram avaliados:
+    <strong style="color: #28a745;">{aprovados} aprovado(s)</strong> e
+    <strong style="color: #dc3545;">{rejeitados} rejeitado(s)</strong>.</p>
+
+    <table style="border-collapse: collapse; margin: 15px 0;">
+        <tr>
+            <th style="padding: 6px; text-align: left;">Situação</th>
+            <th style="padding: 6px; text-align: left;">Procedimento</th>
+            <th style="padding: 6px; text-align: left;">Data</th>
+            <th style="padding: 6px; text-align: left;">Preceptor</th>
+            <th style="padding: 6px; text-align: left;">Observações</th>
+        </tr>{linhas_html}
+    </table>
+
+    {'<p style="color: #ffc107;">Revise os procedimentos rejeitados e reenvie-os se necessário.</p>' if rejeitados else '<p style="color: #28a745;"><strong>Parabéns pelo seu progresso!</strong></p>'}
+
+    <hr>
+    <p><em>Sistema de Logbook do Residente</em></p>
+</body>
+</html>
+        """
+    return subject, template_text, template_html
+
+
+def send_procedimento_avaliado_email(residente, procedimento, status):
+    """Envia email quando um procedimento é avaliado.
+
+    Com ``EMAIL_RESUMO_JANELA`` maior que zero, o email espera essa janela
+    na caixa de saída e é enviado num resumo com as demais avaliações do
+    residente feitas nesse meio tempo.
+    """
+    subject, template_text, template_html = montar_email_avaliacao(
+        residente, procedimento, status
+    )
+    janela = current_app.config["EMAIL_RESUMO_JANELA"]
     send_email(
         subject=subject,
         sender=current_app.config["MAIL_DEFAULT_SENDER"],
         recipients=[residente.email],
         text_body=template_text,
         html_body=template_html,
+        atraso=janela,
+        chave_resumo=f"avaliacoes:{residente.email}" if janela > 0 else None,
+        procedimento_id=procedimento.id,
+        avaliacao_status=status,
     )
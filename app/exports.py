@@ -0,0 +1,172 @@
+# app/exports.py
+"""Exportação do logbook de um residente em CSV e XLSX.
+
+Os procedimentos são lidos em lotes (``yield_per``) como linhas simples,
+sem montar objetos da ORM, e cada lote é escrito e enviado antes do
+próximo. A memória fica constante mesmo para residentes com milhares de
+registros.
+
+O CSV sai direto na resposta, em pedaços. O XLSX é um ZIP que só fica
+completo no fim, por isso é montado com o XlsxWriter em ``constant_memory``
+(uma linha por vez, em arquivo temporário) e depois enviado em pedaços.
+"""
+import csv
+import re
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+from app import db
+from app.models import Preceptor, Procedimento
+
+LOTE = 500
+TAMANHO_PEDACO = 64 * 1024
+
+COLUNAS = [
+    ("ID", Procedimento.id),
+    ("Procedimento", Procedimento.nome_procedimento),
+    ("Data de realização", Procedimento.data_realizacao),
+    ("Status", Procedimento.status),
+    ("Preceptor", Preceptor.nome),
+    ("H - História clínica", Procedimento.historia_clinica),
+    ("E - Exame físico", Procedimento.exame_fisico),
+    ("I - Interpretação/diagnósticos", Procedimento.interpretacao_diagnostico),
+    ("P - Plano terapêutico", Procedimento.plano_terapeutico),
+    ("O - Orientação ao paciente", Procedimento.orientacao_paciente),
+    ("C - Conhecimento adquirido", Procedimento.conhecimento_aprendizagem),
+    ("Observação do preceptor", Procedimento.observacao_preceptor),
+]
+_COLUNA_DATA = 2
+
+# Começos de célula que o Excel/LibreOffice interpretam como fórmula
+_INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+# Caracteres que o Excel não aceita no nome de uma planilha
+_PROIBIDOS_PLANILHA = re.compile(r"[\[\]:*?/\\]")
+
+
+def _celula_csv(valor):
+    """Texto digitado pelo usuário nunca vira fórmula ao abrir o CSV."""
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def nome_planilha_valido(nome):
+    """``nome`` sem os caracteres proibidos, com até 31 caracteres."""
+    # O Excel também recusa nomes que começam ou terminam com apóstrofo
+    nome = _PROIBIDOS_PLANILHA.sub("", nome)[:31].strip().strip("'").strip()
+    return nome or "Logbook"
+
+
+def linhas_logbook(residente_id):
+    """Linhas do logbook (na ordem de COLUNAS), em lotes de ``LOTE``."""
+    consulta = (
+        db.select(*(coluna for _, coluna in COLUNAS))
+        .join(Preceptor, Procedimento.preceptor_id == Preceptor.id)
+        .where(Procedimento.residente_id == residente_id)
+        .order_by(Procedimento.data_realizacao, Procedimento.id)
+        .execution_options(yield_per=LOTE)
+    )
+    resultado = db.session.execute(consulta)
+    try:
+        for lote in resultado.partitions():
+            yield lote
+    finally:
+        resultado.close()
+
+
+class _Saida:
+    """Destino de escrita que acumula o texto até ser lido."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(dados)
+        return len(dados)
+
+    def esvaziar(self):
+        dados = "".join(self._partes)
+        self._partes.clear()
+        return dados.encode("utf-8")
+
+
+def gerar_csv(residente_id):
+    """Gera o CSV do logbook em pedaços, um por lote de procedimentos.
+
+    Precisa do contexto da requisição (use com ``stream_with_context``).
+    """
+    saida = _Saida()
+    escritor = csv.writer(saida)
+    # BOM para o Excel reconhecer o UTF-8
+    saida.write("\ufeff")
+    escritor.writerow([titulo for titulo, _ in COLUNAS])
+    yield saida.esvaziar()
+    for lote in linhas_logbook(residente_id):
+        for linha in lote:
+            linha = [_celula_csv(valor) for valor in linha]
+            linha[_COLUNA_DATA] = linha[_COLUNA_DATA].strftime("%d/%m/%Y")
+            escritor.writerow(linha)
+        yield saida.esvaziar()
+
+
+def gerar_xlsx(residente_id, nome_planilha="Logbook"):
+    """Gera o XLSX do logbook em pedaços de ``TAMANHO_PEDACO`` bytes.
+
+    Levanta ImportError antes de começar se o XlsxWriter não estiver
+    instalado. Precisa do contexto da requisição (use com
+    ``stream_with_context``).
+    """
+    import xlsxwriter
+
+    def pedacos():
+        with tempfile.TemporaryFile() as arquivo:
+            # Texto dos residentes é sempre texto, nunca fórmula ou link
+            livro = xlsxwriter.Workbook(
+                arquivo,
+                {
+                    "constant_memory": True,
+                    "strings_to_formulas": False,
+                    "strings_to_urls": False,
+                },
+            )
+            planilha = livro.add_worksheet(nome_planilha_valido(nome_planilha))
+            negrito = livro.add_format({"bold": True})
+            formato_data = livro.add_format({"num_format": "dd/mm/yyyy"})
+            planilha.write_row(0, 0, [titulo for titulo, _ in COLUNAS], negrito)
+            planilha.set_column(_COLUNA_DATA, _COLUNA_DATA, 12)
+            numero = 1
+            for lote in linhas_logbook(residente_id):
+                for linha in lote:
+                    planilha.write_row(numero, 0, linha)
+                    planilha.write_datetime(
+                        numero, _COLUNA_DATA, linha[_COLUNA_DATA], formato_data
+                    )
+                    numero += 1
+            livro.close()
+
+            arquivo.seek(0)
+            while pedaco := arquivo.read(TAMANHO_PEDACO):
+                yield pedaco
+
+    return pedacos()
+
+
+def nome_arquivo_logbook(residente, extensao):
+    return f'logbook_{residente.nome.replace(" ", "_").lower()}.{extensao}'
+
+
+def content_disposition(nome):
+    """Parâmetros do cabeçalho Content-Disposition para baixar ``nome``.
+
+    Nomes com acento vão em ``filename*`` (RFC 5987), como no ``send_file``.
+    """
+    try:
+        nome.encode("ascii")
+    except UnicodeEncodeError:
+        simples = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore")
+        return {
+            "filename": simples.decode("ascii"),
+            "filename*": f"UTF-8''{quote(nome, safe='!#$&+^`|~')}",
+        }
+    return {"filename": nome}
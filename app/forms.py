@@ -1,5 +1,6 @@
 # app/forms.py
 from flask_wtf import FlaskForm
+from sqlalchemy.orm import load_only
 from wtforms import (
     DateField,
     HiddenField,
@@ -20,25 +21,31 @@ from wtforms.validators import (
 from wtforms_sqlalchemy.fields import QuerySelectField
 
 # Importe seus modelos para usar nas queries dos formulários
-from app.models import Especialidade, Hospital, Preceptor, Universidade
+from app.models import Preceptor
+from app.reference_data import registro_referencias
 
 
 # Garante que só retorna preceptores distintos e válidos
 def preceptor_query():
-    return Preceptor.query
+    return Preceptor.query.options(load_only(Preceptor.id, Preceptor.nome))
 
 
-# Crie duas novas funções de query para os campos de seleção
+# Universidades, hospitais e especialidades vêm do registro em memória
+# (namedtuples, por isso os campos usam get_pk=_pelo_id)
 def universidade_query():
-    return Universidade.query
+    return registro_referencias.obter().universidades.itens
 
 
 def hospital_query():
-    return Hospital.query
+    return registro_referencias.obter().hospitais.itens
 
 
 def especialidade_query():
-    return Especialidade.query.order_by(Especialidade.nome)
+    return registro_referencias.obter().especialidades.itens
+
+
+def _pelo_id(registro):
+    return registro.id
 
 
 class RegistroForm(FlaskForm):
@@ -57,6 +64,7 @@ class RegistroForm(FlaskForm):
     especialidade = QuerySelectField(
         "Especialidade da Residência",
         query_factory=especialidade_query,
+        get_pk=_pelo_id,
         get_label="nome",
         allow_blank=True,
         blank_text="-- Selecione sua especialidade --",
@@ -194,6 +202,7 @@ class RegistroPreceptorForm(FlaskForm):
     supervisor = QuerySelectField(
         "Especialidade Principal",
         query_factory=especialidade_query,
+        get_pk=_pelo_id,
         get_label="nome",
         allow_blank=True,
         blank_text="-- Selecione sua especialidade --",
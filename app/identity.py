@@ -0,0 +1,143 @@
+# app/identity.py
+"""Cache das identidades carregadas pelo ``user_loader``.
+
+Em vez da linha inteira do Residente/Preceptor, ``current_user`` é um
+``Principal``: um objeto pequeno, com ``__slots__``, só com o que as views e
+os templates usam (tipo, id, nome, email e supervisor). Os principals ficam
+em memória por ``IDENTIDADE_CACHE_TTL`` segundos, então a maioria das
+páginas não consulta o usuário no banco.
+
+Qualquer alteração ou remoção de um Residente/Preceptor pela ORM invalida a
+entrada correspondente neste processo; nos outros workers ela expira pelo
+TTL. Código que altere usuários por fora da ORM deve chamar
+``cache_identidades.invalidar(usuario.get_id())``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from app import db
+
+
+class Principal:
+    """Usuário autenticado, no formato que o Flask-Login espera."""
+
+    __slots__ = ("tipo", "id", "nome", "email", "supervisor_id")
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, tipo, id, nome, email, supervisor_id=None):
+        self.tipo = tipo
+        self.id = id
+        self.nome = nome
+        self.email = email
+        self.supervisor_id = supervisor_id
+
+    @property
+    def eh_residente(self):
+        return self.tipo == "residente"
+
+    @property
+    def eh_preceptor(self):
+        return self.tipo == "preceptor"
+
+    def get_id(self):
+        return f"{self.tipo}-{self.id}"
+
+    def __eq__(self, other):
+        if hasattr(other, "get_id"):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.get_id())
+
+    def __repr__(self):
+        return f"<Principal {self.get_id()}>"
+
+
+def _carregar(tipo, id):
+    from app.models import Preceptor, Residente
+
+    if tipo == "residente":
+        consulta = db.select(
+            Residente.id, Residente.nome, Residente.email, Residente.supervisor_id
+        ).where(Residente.id == id)
+    elif tipo == "preceptor":
+        consulta = db.select(
+            Preceptor.id, Preceptor.nome, Preceptor.email, db.null()
+        ).where(Preceptor.id == id)
+    else:
+        return None
+    linha = db.session.execute(consulta).first()
+    return Principal(tipo, *linha) if linha else None
+
+
+class CacheIdentidades:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self.ttl = 60
+        self.maximo = 10000
+
+    def init_app(self, app):
+        self.ttl = app.config["IDENTIDADE_CACHE_TTL"]
+        self.maximo = app.config["IDENTIDADE_CACHE_MAX"]
+        app.extensions["cache_identidades"] = self
+
+    def obter(self, user_id):
+        """Principal de ``user_id`` ("residente-1"), ou None se não existir."""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(user_id)
+            if item is not None and item[0] > agora:
+                self._itens.move_to_end(user_id)
+                return item[1]
+
+        try:
+            tipo, id = user_id.split("-")
+            principal = _carregar(tipo, int(id))
+        except ValueError:
+            return None
+        if principal is None:
+            return None
+        self.guardar(principal, agora)
+        return principal
+
+    def guardar(self, principal, agora=None):
+        """Guarda um principal já carregado (pelo login, por exemplo)."""
+        expira = (agora or time.monotonic()) + self.ttl
+        user_id = principal.get_id()
+        with self._lock:
+            self._itens[user_id] = (expira, principal)
+            self._itens.move_to_end(user_id)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._itens.pop(user_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cache_identidades = CacheIdentidades()
+
+
+def _invalidar_usuario(mapper, connection, usuario):
+    cache_identidades.invalidar(usuario.get_id())
+
+
+def registrar_eventos():
+    from app.models import Preceptor, Residente
+
+    for modelo in (Residente, Preceptor):
+        for nome in ("after_update", "after_delete"):
+            if not event.contains(modelo, nome, _invalidar_usuario):
+                event.listen(modelo, nome, _invalidar_usuario)
@@ -0,0 +1,273 @@
+# app/jobs.py
+"""Fila de geração assíncrona dos relatórios em PDF.
+
+Os pedidos ficam gravados na tabela ``relatorio_job`` e são processados por
+um pool local de processos (``RELATORIO_WORKERS``). Cada worker cria a sua
+própria aplicação Flask, então o processo web só grava o pedido e devolve o
+id do job. Pedidos que estavam pendentes quando o servidor caiu são
+retomados na próxima vez que a fila é iniciada.
+
+Se o processo filho falhar antes de reivindicar o job (erro ao criar a
+aplicação, banco fora do ar...), o callback do ``Future`` marca o job como
+"Erro" com a mensagem. A exceção é o pool quebrado (``BrokenProcessPool``):
+o job volta uma vez para a fila, num pool novo, porque pode ter caído só
+porque outro processo do pool morreu. Um job que continue "Pendente" por
+mais de ``RELATORIO_JOB_PENDENTE_TIMEOUT`` segundos é dado como perdido na
+próxima consulta de status.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Aplicação Flask criada dentro de cada processo worker
+_app_worker = None
+
+
+def _inicializar_worker(config_class):
+    global _app_worker
+    from app import create_app
+    from app.pdf_engine import motor_pdf
+
+    _app_worker = create_app(config_class)
+    # O worker da fila já é um processo em segundo plano: renderiza nele
+    # mesmo, com fontes e CSS carregados uma vez só.
+    motor_pdf.usar_processo_atual(_app_worker.config["RELATORIO_JOB_LIMITE_MEMORIA_MB"])
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+def _executar_job(job_id):
+    """Gera o PDF de um job. Roda dentro de um processo do pool."""
+    from app.models import RelatorioJob, Residente
+    from app.reports import ler_pdf_relatorio
+
+    with _app_worker.app_context():
+        # Reivindica o job de forma atômica: se outro worker (ou outra
+        # instância da aplicação) já o pegou, não faz nada.
+        reivindicado = RelatorioJob.query.filter_by(
+            id=job_id, status="Pendente"
+        ).update({"status": "Processando", "atualizado_em": _agora()})
+        db.session.commit()
+        if not reivindicado:
+            return
+
+        job = db.session.get(RelatorioJob, job_id)
+        try:
+            residente = db.session.get(Residente, job.residente_id)
+            # Reaproveita o PDF do cache quando nada mudou; o job grava a
+            # própria cópia, que continua disponível se o cache a descartar.
+            pdf_bytes = ler_pdf_relatorio(residente)
+
+            diretorio = _app_worker.config["RELATORIO_JOBS_DIR"]
+            os.makedirs(diretorio, exist_ok=True)
+            caminho = os.path.join(diretorio, f"{job.id}.pdf")
+            temporario = f"{caminho}.tmp"
+            with open(temporario, "wb") as arquivo:
+                arquivo.write(pdf_bytes)
+            os.replace(temporario, caminho)
+
+            job.arquivo = caminho
+            job.status = "Concluido"
+        except Exception as e:
+            logger.exception("Erro ao gerar relatório do job %s", job_id)
+            job.status = "Erro"
+            job.erro = str(e)
+        job.atualizado_em = _agora()
+        db.session.commit()
+
+
+def _marcar_erro(job_id, mensagem):
+    """Marca como "Erro" um job que ainda não terminou; retorna se marcou."""
+    from app.models import RelatorioJob
+
+    marcado = (
+        RelatorioJob.query.filter(
+            RelatorioJob.id == job_id,
+            RelatorioJob.status.in_(["Pendente", "Processando"]),
+        ).update(
+            {"status": "Erro", "erro": mensagem, "atualizado_em": _agora()},
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    return bool(marcado)
+
+
+class FilaRelatorios:
+    """Pool de processos que gera os relatórios pedidos em modo assíncrono."""
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._app = None
+        self._config_class = None
+        self._workers = 1
+        self._timeout = 600
+        self._timeout_pendente = 1800
+        # Jobs já devolvidos à fila depois de um pool quebrado
+        self._reenviados = set()
+
+    def init_app(self, app, config_class):
+        self._app = app
+        self._config_class = config_class
+        self._workers = app.config["RELATORIO_WORKERS"]
+        self._timeout = app.config["RELATORIO_JOB_TIMEOUT"]
+        self._timeout_pendente = app.config["RELATORIO_JOB_PENDENTE_TIMEOUT"]
+        app.extensions["fila_relatorios"] = self
+
+    def _obter_executor(self):
+        """Cria o pool na primeira utilização e retoma jobs interrompidos."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_worker,
+                    initargs=(self._config_class,),
+                )
+                self._retomar_pendentes()
+            return self._executor
+
+    def _descartar(self, executor):
+        """Tira de uso um pool quebrado; o próximo pedido cria outro."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _submeter(self, executor, job_id):
+        futuro = executor.submit(_executar_job, job_id)
+        futuro.add_done_callback(partial(self._ao_terminar, executor, job_id))
+
+    def _ao_terminar(self, executor, job_id, futuro):
+        """Registra no job a falha que aconteceu fora do ``_executar_job``."""
+        if futuro.cancelled():
+            # Pool encerrado: o job continua pendente e é retomado depois
+            return
+        erro = futuro.exception()
+        if erro is None:
+            self._reenviados.discard(job_id)
+            return
+        logger.error("Job de relatório %s falhou no worker: %r", job_id, erro)
+        try:
+            with self._app.app_context():
+                if isinstance(erro, BrokenProcessPool):
+                    self._descartar(executor)
+                    # Quebrar o pool de novo já não é azar: é o próprio job
+                    with self._lock:
+                        reenviar = job_id not in self._reenviados
+                        self._reenviados.add(job_id)
+                    if reenviar and self._reenviar(job_id):
+                        return
+                self._reenviados.discard(job_id)
+                _marcar_erro(job_id, str(erro) or erro.__class__.__name__)
+        except SQLAlchemyError:
+            logger.exception("Não foi possível registrar o erro do job %s", job_id)
+
+    def _reenviar(self, job_id):
+        """Devolve à fila um job que não terminou; retorna se devolveu."""
+        from app.models import RelatorioJob
+
+        devolvido = (
+            RelatorioJob.query.filter(
+                RelatorioJob.id == job_id,
+                RelatorioJob.status.in_(["Pendente", "Processando"]),
+            ).update(
+                {"status": "Pendente", "atualizado_em": _agora()},
+                synchronize_session=False,
+            )
+        )
+        db.session.commit()
+        if devolvido:
+            logger.warning("Job de relatório %s devolvido à fila", job_id)
+            # Um pool novo já retoma os pendentes; submeter de novo não
+            # duplica o trabalho, porque o job é reivindicado de forma atômica
+            self._submeter(self._obter_executor(), job_id)
+        return bool(devolvido)
+
+    def _retomar_pendentes(self):
+        from app.models import RelatorioJob
+
+        # Jobs "Processando" há mais tempo que o timeout pertenciam a um
+        # worker que morreu; voltam para a fila.
+        limite = _agora() - timedelta(seconds=self._timeout)
+        RelatorioJob.query.filter(
+            RelatorioJob.status == "Processando",
+            RelatorioJob.atualizado_em < limite,
+        ).update({"status": "Pendente"}, synchronize_session=False)
+        db.session.commit()
+
+        pendentes = (
+            db.session.query(RelatorioJob.id)
+            .filter_by(status="Pendente")
+            .order_by(RelatorioJob.criado_em)
+            .all()
+        )
+        for (job_id,) in pendentes:
+            self._submeter(self._executor, job_id)
+        if pendentes:
+            logger.info("%d job(s) de relatório retomado(s)", len(pendentes))
+
+    def enfileirar(self, residente, solicitante):
+        """Grava um novo job para o relatório de ``residente`` e o envia ao pool."""
+        from app.models import RelatorioJob
+
+        executor = self._obter_executor()
+        job = RelatorioJob(
+            residente_id=residente.id, solicitante_id=solicitante.get_id()
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._submeter(executor, job.id)
+        return job
+
+    def expirar_pendente(self, job_id):
+        """Dá como perdido um job parado na fila; retorna se ele foi marcado.
+
+        Vale para jobs "Pendente" há mais de ``RELATORIO_JOB_PENDENTE_TIMEOUT``
+        segundos.
+        """
+        from app.models import RelatorioJob
+
+        limite = _agora() - timedelta(seconds=self._timeout_pendente)
+        parado = (
+            db.session.query(RelatorioJob.id)
+            .filter(
+                RelatorioJob.id == job_id,
+                RelatorioJob.status == "Pendente",
+                RelatorioJob.atualizado_em < limite,
+            )
+            .first()
+        )
+        if parado is None:
+            return False
+        logger.warning("Job de relatório %s expirou na fila", job_id)
+        return _marcar_erro(
+            job_id, "O relatório não foi processado a tempo. Peça-o novamente."
+        )
+
+    def garantir_execucao(self):
+        """Garante que o pool está ativo (e, com ele, a retomada de pendentes)."""
+        self._obter_executor()
+
+    def encerrar(self, aguardar=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=aguardar)
+                self._executor = None
+
+
+fila_relatorios = FilaRelatorios()
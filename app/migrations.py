@@ -0,0 +1,216 @@
+# app/migrations.py
+"""Migrações versionadas do schema.
+
+As versões já aplicadas ficam registradas na tabela ``schema_version``.
+Tabelas novas são criadas a partir dos modelos (``create_all``); as
+migrações cuidam do que o ``create_all`` não faz em bancos já existentes,
+como índices e colunas novas em tabelas antigas. Toda migração é
+idempotente, então um banco criado do zero pode passar por todas elas sem
+erro.
+
+Uso: ``flask db upgrade`` aplica as pendentes, ``flask db status`` lista e
+``flask db verificar`` cria as tabelas que faltam e avisa das pendentes. A
+verificação só roda no boot com ``VERIFICAR_SCHEMA_NO_BOOT`` ligado; em
+produção ela faz parte do deploy, não da subida de cada worker.
+
+Por isso a aplicação não cria o banco sozinha: num checkout novo, e depois
+de cada atualização, rode ``flask --app run db upgrade`` antes de subir o
+servidor. Scripts que criam um banco próprio (testes, benchmarks) chamam
+``aplicar_migracoes()`` logo depois do ``create_app``.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    text,
+)
+from sqlalchemy.schema import CreateColumn
+
+from app import db
+
+Migracao = namedtuple("Migracao", ["versao", "descricao", "aplicar"])
+
+MIGRACOES = []
+
+# A tabela de controle fica fora do db.metadata para não ser tratada como
+# um modelo da aplicação.
+_metadata_controle = MetaData()
+schema_version = Table(
+    "schema_version",
+    _metadata_controle,
+    Column("versao", Integer, primary_key=True),
+    Column("descricao", String(200), nullable=False),
+    Column("aplicada_em", DateTime, nullable=False),
+)
+
+
+def migracao(versao, descricao):
+    """Registra a função decorada como a migração ``versao``."""
+
+    def decorador(funcao):
+        MIGRACOES.append(Migracao(versao, descricao, funcao))
+        MIGRACOES.sort(key=lambda m: m.versao)
+        return funcao
+
+    return decorador
+
+
+def _criar_indices(conn, tabela, nomes):
+    """Cria, se ainda não existirem, índices declarados no modelo."""
+    indices = {indice.name: indice for indice in db.metadata.tables[tabela].indexes}
+    for nome in nomes:
+        indices[nome].create(conn, checkfirst=True)
+
+
+def _adicionar_colunas(conn, tabela, nomes):
+    """Adiciona a uma tabela existente colunas declaradas no modelo."""
+    existentes = {coluna["name"] for coluna in inspect(conn).get_columns(tabela)}
+    colunas = db.metadata.tables[tabela].c
+    for nome in nomes:
+        if nome in existentes:
+            continue
+        definicao = CreateColumn(colunas[nome]).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {definicao}"))
+
+
+@migracao(1, "Índices compostos de procedimento e índice de residente.supervisor_id")
+def _indices_de_acesso(conn):
+    _criar_indices(
+        conn,
+        "procedimento",
+        [
+            "ix_procedimento_preceptor_status_data",
+            "ix_procedimento_residente_status_data",
+        ],
+    )
+    _criar_indices(conn, "residente", ["ix_residente_supervisor_id"])
+
+
+@migracao(2, "Colunas do modo resumo na caixa de saída de emails")
+def _outbox_resumo(conn):
+    _adicionar_colunas(
+        conn, "email_outbox", ["chave_resumo", "procedimento_id", "avaliacao_status"]
+    )
+    _criar_indices(conn, "email_outbox", ["ix_email_outbox_chave_resumo_status"])
+
+
+@migracao(3, "Tabela conta (índice de login) preenchida a partir dos usuários")
+def _contas(conn):
+    from app.accounts import reconstruir
+    from app.models import Conta
+
+    Conta.__table__.create(conn, checkfirst=True)
+    reconstruir(conn)
+
+
+@migracao(4, "Índice de busca textual (FTS5) dos procedimentos")
+def _indice_busca(conn):
+    from app import search
+
+    # Fora do SQLite (ou sem FTS5) a busca usa ILIKE e não há o que criar
+    if not search.fts5_suportado(conn):
+        return
+    search.criar_indice(conn)
+    search.reconstruir(conn)
+
+
+@migracao(5, "Índices de procedimento para a paginação por (data, id)")
+def _indices_paginacao(conn):
+    _criar_indices(
+        conn,
+        "procedimento",
+        ["ix_procedimento_preceptor_data_id", "ix_procedimento_residente_data_id"],
+    )
+
+
+@migracao(6, "Descrição HEIPOC guardada em procedimento")
+def _descricoes(conn):
+    from app.descriptions import recalcular
+
+    _adicionar_colunas(conn, "procedimento", ["descricao_html", "revisao"])
+    recalcular(conn)
+
+
+@migracao(7, "Contador de versão dos dados de referência")
+def _versao_referencias(conn):
+    from app.models import VersaoReferencias
+    from app.reference_data import criar_contador
+
+    VersaoReferencias.__table__.create(conn, checkfirst=True)
+    criar_contador(conn)
+
+
+def versao_atual(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    versao = conn.execute(db.select(db.func.max(schema_version.c.versao))).scalar()
+    return versao or 0
+
+
+def _registrar(conn, m):
+    conn.execute(
+        schema_version.insert().values(
+            versao=m.versao,
+            descricao=m.descricao,
+            aplicada_em=datetime.now(timezone.utc),
+        )
+    )
+
+
+def migracoes_pendentes(conn):
+    atual = versao_atual(conn)
+    return [m for m in MIGRACOES if m.versao > atual]
+
+
+def aplicar_migracoes(engine=None):
+    """Cria as tabelas que faltam e aplica as migrações pendentes, em ordem.
+
+    Retorna a lista de migrações aplicadas.
+    """
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        db.metadata.create_all(conn)
+        schema_version.create(conn, checkfirst=True)
+        pendentes = migracoes_pendentes(conn)
+
+    for m in pendentes:
+        # Uma transação por migração: se uma falhar, as anteriores ficam
+        with engine.begin() as conn:
+            m.aplicar(conn)
+            _registrar(conn, m)
+    return pendentes
+
+
+def marcar_como_atualizado(engine=None):
+    """Registra todas as migrações como aplicadas (banco recém-criado)."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+        for m in migracoes_pendentes(conn):
+            _registrar(conn, m)
+
+
+def verificar_schema(engine=None):
+    """Cria as tabelas que faltam e devolve (tabelas criadas, migrações pendentes).
+
+    Um banco vazio já nasce com o schema mais recente, então todas as
+    migrações são registradas como aplicadas.
+    """
+    engine = engine or db.engine
+    existentes = set(inspect(engine).get_table_names())
+    faltando = [nome for nome in db.metadata.tables if nome not in existentes]
+    if faltando:
+        db.metadata.create_all(engine)
+        if len(faltando) == len(db.metadata.tables):
+            marcar_como_atualizado(engine)
+    with engine.connect() as conn:
+        pendentes = migracoes_pendentes(conn)
+    return faltando, pendentes
+
@@ -1,10 +1,12 @@
 # app/models.py
+import uuid
 from datetime import datetime, timezone
 
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import check_password_hash
 
 from app import db  # Importa da nossa fábrica
+from app.passwords import gerar_hash
 
 
 class Residente(db.Model, UserMixin):
@@ -18,7 +20,9 @@ class Residente(db.Model, UserMixin):
     especialidade_id = db.Column(
         db.Integer, db.ForeignKey("especialidade.id"), nullable=False
     )
-    supervisor_id = db.Column(db.Integer, db.ForeignKey("preceptor.id"), nullable=False)
+    supervisor_id = db.Column(
+        db.Integer, db.ForeignKey("preceptor.id"), nullable=False, index=True
+    )
     universidade_id = db.Column(
         db.Integer, db.ForeignKey("universidade.id"), nullable=False
     )
@@ -46,11 +50,14 @@ class Residente(db.Model, UserMixin):
         "Hospital", backref="residentes", foreign_keys=[hospital_id]
     )
 
+    eh_residente = True
+    eh_preceptor = False
+
     def get_id(self):
         return f"residente-{self.id}"
 
     def set_senha(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
 
     def check_senha(self, senha):
         return check_password_hash(self.senha_hash, senha) if self.senha_hash else False
@@ -87,11 +94,14 @@ class Preceptor(db.Model, UserMixin):
         "Especialidade", backref="preceptores", foreign_keys=[especialidade_id]
     )
 
+    eh_residente = False
+    eh_preceptor = True
+
     def get_id(self):
         return f"preceptor-{self.id}"
 
     def set_senha(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
 
     def check_senha(self, senha):
         return check_password_hash(self.senha_hash, senha) if self.senha_hash else False
@@ -101,6 +111,30 @@ class Preceptor(db.Model, UserMixin):
 
 
 class Procedimento(db.Model):
+    # Caminhos de acesso dos dashboards e do relatório: filtro por preceptor
+    # ou residente + status, ordenado pela data de realização.
+    __table_args__ = (
+        db.Index(
+            "ix_procedimento_preceptor_status_data",
+            "preceptor_id",
+            "status",
+            "data_realizacao",
+        ),
+        db.Index(
+            "ix_procedimento_residente_status_data",
+            "residente_id",
+            "status",
+            "data_realizacao",
+        ),
+        # Paginação por chave das listas (app/pagination.py)
+        db.Index(
+            "ix_procedimento_preceptor_data_id", "preceptor_id", "data_realizacao", "id"
+        ),
+        db.Index(
+            "ix_procedimento_residente_data_id", "residente_id", "data_realizacao", "id"
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     nome_procedimento = db.Column(db.String(200), nullable=False)
     data_realizacao = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -124,6 +158,12 @@ class Procedimento(db.Model):
     # C - Conhecimento adquirido/necessidade de aprendizagem (O que aprendi?)
     conhecimento_aprendizagem = db.Column(db.Text, nullable=False)
 
+    # Descrição HEIPOC pronta no HTML do relatório e revisão da linha,
+    # incrementada a cada alteração; mantidas pelos eventos de
+    # app/descriptions.py
+    descricao_html = db.Column(db.Text, nullable=True)
+    revisao = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
     status = db.Column(db.String(20), default="Pendente", nullable=False)
     observacao_preceptor = db.Column(db.Text, nullable=True)
     residente_id = db.Column(db.Integer, db.ForeignKey("residente.id"), nullable=False)
@@ -168,6 +208,106 @@ class Procedimento(db.Model):
         return "\n\n".join(descricao_parts)
 
 
+class Conta(db.Model):
+    """Índice de login: email e CPF -> (tipo, id) de Residentes e Preceptores.
+
+    Mantida pelos eventos de app/accounts.py a partir das tabelas de
+    usuários; não deve ser alterada diretamente.
+    """
+
+    __table_args__ = (
+        db.UniqueConstraint("tipo", "usuario_id", name="uq_conta_tipo_usuario"),
+        db.Index("ix_conta_email", "email"),
+        db.Index("ix_conta_cpf", "cpf"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # "residente" ou "preceptor"
+    tipo = db.Column(db.String(20), nullable=False)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    cpf = db.Column(db.String(20), nullable=False)
+
+    def __repr__(self):
+        return f"<Conta {self.tipo}-{self.usuario_id}>"
+
+
+class RelatorioJob(db.Model):
+    """Pedido de geração assíncrona do relatório em PDF de um residente."""
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    residente_id = db.Column(db.Integer, db.ForeignKey("residente.id"), nullable=False)
+    # get_id() de quem pediu o relatório ("residente-1", "preceptor-3")
+    solicitante_id = db.Column(db.String(40), nullable=False)
+    # Pendente -> Processando -> Concluido | Erro
+    status = db.Column(db.String(20), default="Pendente", nullable=False)
+    arquivo = db.Column(db.String(500), nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    criado_em = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    atualizado_em = db.Column(
+        db.DateTime, default=lambda: datetime.now(timezone.utc)
+    )
+
+    residente = db.relationship("Residente")
+
+    def __repr__(self):
+        return f"<RelatorioJob {self.id} {self.status}>"
+
+
+class EmailOutbox(db.Model):
+    """Email aguardando envio pelo worker da caixa de saída (app/outbox.py)."""
+
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_proxima", "status", "proxima_tentativa"),
+        db.Index("ix_email_outbox_chave_resumo_status", "chave_resumo", "status"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    assunto = db.Column(db.String(255), nullable=False)
+    remetente = db.Column(db.String(120), nullable=False)
+    # Endereços separados por vírgula
+    destinatarios = db.Column(db.Text, nullable=False)
+    corpo_texto = db.Column(db.Text, nullable=False)
+    corpo_html = db.Column(db.Text, nullable=True)
+    # Pendente -> Enviando -> Enviado | Falhou
+    status = db.Column(db.String(20), default="Pendente", nullable=False)
+    tentativas = db.Column(db.Integer, default=0, nullable=False)
+    proxima_tentativa = db.Column(
+        db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    criado_em = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    enviado_em = db.Column(db.DateTime, nullable=True)
+
+    # Modo resumo: emails pendentes com a mesma chave são enviados juntos,
+    # numa só mensagem, quando o primeiro deles vence.
+    chave_resumo = db.Column(db.String(150), nullable=True)
+    procedimento_id = db.Column(
+        db.Integer, db.ForeignKey("procedimento.id"), nullable=True
+    )
+    # Status do procedimento no momento da avaliação
+    avaliacao_status = db.Column(db.String(20), nullable=True)
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.id} {self.status}>"
+
+
+class CrmCache(db.Model):
+    """Resultado de uma consulta de CRM na API do CFM (cache de app/crm.py)."""
+
+    __tablename__ = "crm_cache"
+
+    uf = db.Column(db.String(2), primary_key=True)
+    crm = db.Column(db.String(20), primary_key=True)
+    encontrado = db.Column(db.Boolean, nullable=False)
+    situacao = db.Column(db.String(50), nullable=True)
+    dados = db.Column(db.JSON, nullable=True)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<CrmCache {self.uf}-{self.crm}>"
+
+
 class Universidade(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(200), unique=True, nullable=False)
@@ -195,3 +335,15 @@ class Especialidade(db.Model):
 
     def __repr__(self):
         return f"<Especialidade {self.nome}>"
+
+
+class VersaoReferencias(db.Model):
+    """Contador de versão de Universidade, Hospital e Especialidade.
+
+    Incrementado pelos eventos de app/reference_data.py a cada alteração
+    numa dessas tabelas; cada processo compara com a versão do seu registro
+    em memória. Tem uma linha só (id 1), criada junto com a tabela.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,307 @@
+# app/outbox.py
+"""Worker da caixa de saída de emails.
+
+``send_email`` (app/email.py) só grava o email na tabela ``email_outbox``,
+na mesma transação da ação que o gerou, então nada se perde se o processo
+reiniciar. Um único worker de longa duração drena a tabela reaproveitando
+a mesma conexão SMTP enquanto houver emails na fila; falhas voltam para a
+fila com backoff exponencial até ``EMAIL_OUTBOX_MAX_TENTATIVAS``.
+
+O worker roda como processo próprio: ``flask outbox worker``, um só por
+instalação. ``EMAIL_OUTBOX_THREAD`` sobe também uma thread de envio em cada
+processo da aplicação, o que só convém no desenvolvimento com um único
+processo. Os emails são reivindicados um a um antes do envio, então mais de
+um worker ativo não gera envios duplicados.
+
+Emails com ``chave_resumo`` (modo resumo, ``EMAIL_RESUMO_JANELA``) ficam
+retidos até vencer; quando o primeiro de uma chave vence, todos os
+pendentes dessa chave saem juntos numa única mensagem.
+
+Para testar localmente, suba um servidor SMTP de mentira e aponte a
+configuração de email para ele::
+
+    python -m aiosmtpd -n -l localhost:8025
+    MAIL_SERVER=localhost MAIL_PORT=8025 MAIL_USE_TLS=false flask outbox drenar
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask_mail import Message
+from sqlalchemy.orm import joinedload
+
+from app import db, mail
+
+logger = logging.getLogger(__name__)
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+class RemetenteOutbox:
+    def __init__(self, app):
+        self.app = app
+        self.lote = app.config["EMAIL_OUTBOX_LOTE"]
+        self.max_tentativas = app.config["EMAIL_OUTBOX_MAX_TENTATIVAS"]
+        self.backoff_base = app.config["EMAIL_OUTBOX_BACKOFF_BASE"]
+        self.backoff_max = app.config["EMAIL_OUTBOX_BACKOFF_MAX"]
+        self.intervalo = app.config["EMAIL_OUTBOX_INTERVALO"]
+        # Tempo que um email reivindicado fica reservado para este worker
+        self.reserva = app.config["EMAIL_OUTBOX_RESERVA"]
+        self._conexao = None
+
+    def _abrir_conexao(self):
+        if self._conexao is None:
+            conexao = mail.connect()
+            conexao.__enter__()
+            self._conexao = conexao
+        return self._conexao
+
+    def _fechar_conexao(self):
+        if self._conexao is None:
+            return
+        conexao, self._conexao = self._conexao, None
+        try:
+            conexao.__exit__(None, None, None)
+        except Exception as e:
+            logger.debug("Erro ao encerrar a conexão SMTP: %s", e)
+
+    def _reivindicar(self):
+        """Reserva para este worker o próximo lote de emails vencidos."""
+        from app.models import EmailOutbox
+
+        agora = _agora()
+        # Reservas vencidas pertenciam a um worker que parou no meio do envio
+        EmailOutbox.query.filter(
+            EmailOutbox.status == "Enviando",
+            EmailOutbox.proxima_tentativa <= agora,
+        ).update({"status": "Pendente"}, synchronize_session=False)
+
+        candidatos = (
+            db.session.query(EmailOutbox.id, EmailOutbox.chave_resumo)
+            .filter(
+                EmailOutbox.status == "Pendente",
+                EmailOutbox.proxima_tentativa <= agora,
+            )
+            .order_by(EmailOutbox.proxima_tentativa, EmailOutbox.id)
+            .limit(self.lote)
+            .all()
+        )
+        # O horário da reserva identifica os emails reivindicados nesta rodada
+        reservado_ate = agora + timedelta(seconds=self.reserva)
+        reivindicados, chaves = [], set()
+        for email_id, chave in candidatos:
+            if EmailOutbox.query.filter_by(id=email_id, status="Pendente").update(
+                {"status": "Enviando", "proxima_tentativa": reservado_ate},
+                synchronize_session=False,
+            ):
+                reivindicados.append(email_id)
+                if chave:
+                    chaves.add(chave)
+        # Modo resumo: leva junto os pendentes da mesma chave, mesmo os que
+        # ainda não venceram
+        if chaves:
+            EmailOutbox.query.filter(
+                EmailOutbox.chave_resumo.in_(chaves),
+                EmailOutbox.status == "Pendente",
+            ).update(
+                {"status": "Enviando", "proxima_tentativa": reservado_ate},
+                synchronize_session=False,
+            )
+        db.session.commit()
+        if not reivindicados:
+            return []
+        return (
+            EmailOutbox.query.filter(
+                EmailOutbox.status == "Enviando",
+                EmailOutbox.proxima_tentativa == reservado_ate,
+                db.or_(
+                    EmailOutbox.id.in_(reivindicados),
+                    EmailOutbox.chave_resumo.in_(chaves),
+                ),
+            )
+            .order_by(EmailOutbox.id)
+            .all()
+        )
+
+    @staticmethod
+    def _agrupar(emails):
+        """Separa os emails em envios: um por chave de resumo, ou um por email.
+
+        Um resumo só sai com dois ou mais procedimentos que ainda existem; os
+        demais emails da chave saem um a um, cada um com o próprio corpo.
+        """
+        from app.models import Procedimento
+
+        grupos = {}
+        for email in emails:
+            grupos.setdefault(email.chave_resumo or email.id, []).append(email)
+
+        ids = {email.procedimento_id for email in emails if email.chave_resumo}
+        existentes = set()
+        if ids:
+            existentes = {
+                procedimento_id
+                for (procedimento_id,) in db.session.query(Procedimento.id).filter(
+                    Procedimento.id.in_(ids)
+                )
+            }
+
+        envios = []
+        for grupo in grupos.values():
+            resumo = [email for email in grupo if email.procedimento_id in existentes]
+            if len({email.procedimento_id for email in resumo}) < 2:
+                resumo = []
+            else:
+                envios.append(resumo)
+            envios.extend([email] for email in grupo if email not in resumo)
+        return envios
+
+    def _registrar_falha(self, email, erro):
+        email.tentativas += 1
+        email.ultimo_erro = str(erro)
+        if email.tentativas >= self.max_tentativas:
+            email.status = "Falhou"
+            logger.error(
+                "Email %s descartado após %d tentativas: %s",
+                email.id,
+                email.tentativas,
+                erro,
+            )
+            return
+        espera = min(self.backoff_base * 2 ** (email.tentativas - 1), self.backoff_max)
+        email.status = "Pendente"
+        email.proxima_tentativa = _agora() + timedelta(seconds=espera)
+
+    @staticmethod
+    def _mensagem_unica(email):
+        return Message(
+            email.assunto,
+            sender=email.remetente,
+            recipients=email.destinatarios.split(","),
+            body=email.corpo_texto,
+            html=email.corpo_html,
+        )
+
+    def _mensagem(self, grupo):
+        """Mensagem de um envio; grupos de avaliações viram um email de resumo."""
+        if len(grupo) == 1:
+            return self._mensagem_unica(grupo[0])
+
+        from app.email import montar_email_resumo_avaliacoes
+        from app.models import Procedimento
+
+        procedimentos = {
+            procedimento.id: procedimento
+            for procedimento in Procedimento.query.filter(
+                Procedimento.id.in_([email.procedimento_id for email in grupo])
+            ).options(
+                joinedload(Procedimento.residente), joinedload(Procedimento.preceptor)
+            )
+        }
+        # Um procedimento avaliado duas vezes na janela entra só com a última
+        avaliacoes = {}
+        for email in grupo:
+            if email.procedimento_id in procedimentos:
+                avaliacoes[email.procedimento_id] = (
+                    procedimentos[email.procedimento_id],
+                    email.avaliacao_status,
+                )
+        if not avaliacoes:
+            # Removidos depois do agrupamento; volta para a fila e é reagrupado
+            raise RuntimeError("Procedimentos do resumo não existem mais")
+
+        avaliacoes = list(avaliacoes.values())
+        assunto, texto, html = montar_email_resumo_avaliacoes(
+            avaliacoes[0][0].residente, avaliacoes
+        )
+        ultimo = grupo[-1]
+        return Message(
+            assunto,
+            sender=ultimo.remetente,
+            recipients=ultimo.destinatarios.split(","),
+            body=texto,
+            html=html,
+        )
+
+    def drenar(self):
+        """Envia um lote de emails vencidos e retorna quantos foram processados."""
+        emails = self._reivindicar()
+        if not emails:
+            return 0
+
+        try:
+            conexao = self._abrir_conexao()
+        except Exception as e:
+            logger.warning("Não foi possível conectar ao servidor SMTP: %s", e)
+            for email in emails:
+                self._registrar_falha(email, e)
+            db.session.commit()
+            return len(emails)
+
+        for grupo in self._agrupar(emails):
+            try:
+                conexao.send(self._mensagem(grupo))
+            except Exception as e:
+                logger.warning(
+                    "Falha ao enviar o(s) email(s) %s: %s",
+                    ", ".join(str(email.id) for email in grupo),
+                    e,
+                )
+                for email in grupo:
+                    self._registrar_falha(email, e)
+                # A conexão pode ter ficado inválida; reabre para o próximo
+                self._fechar_conexao()
+                try:
+                    conexao = self._abrir_conexao()
+                except Exception:
+                    conexao = None
+            else:
+                enviado_em = _agora()
+                for email in grupo:
+                    email.tentativas += 1
+                    email.status = "Enviado"
+                    email.enviado_em = enviado_em
+                    email.ultimo_erro = None
+            # Commit por envio: uma queda no meio do lote não reenvia os já enviados
+            db.session.commit()
+            if conexao is None:
+                break
+
+        # Devolve à fila o que sobrou do lote, se a conexão caiu de vez
+        for email in emails:
+            if email.status == "Enviando":
+                email.status = "Pendente"
+                email.proxima_tentativa = _agora()
+        db.session.commit()
+        return len(emails)
+
+    def executar(self, parar=None):
+        """Laço do worker: drena a fila até ``parar`` ser sinalizado."""
+        parar = parar or threading.Event()
+        with self.app.app_context():
+            while not parar.is_set():
+                try:
+                    processados = self.drenar()
+                except Exception:
+                    logger.exception("Erro no worker da caixa de saída")
+                    db.session.rollback()
+                    processados = 0
+                finally:
+                    db.session.remove()
+                if not processados:
+                    # Fila vazia: não segura a conexão SMTP ociosa
+                    self._fechar_conexao()
+                    parar.wait(self.intervalo)
+            self._fechar_conexao()
+
+
+def iniciar_thread(app):
+    """Sobe o worker da caixa de saída numa thread daemon da aplicação."""
+    remetente = RemetenteOutbox(app)
+    thread = threading.Thread(
+        target=remetente.executar, name="email-outbox", daemon=True
+    )
+    thread.start()
+    return thread
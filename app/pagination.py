@@ -0,0 +1,99 @@
+# app/pagination.py
+"""Paginação por chave (keyset) das listas de procedimentos dos dashboards.
+
+As listas são ordenadas por (data_realizacao, id), do mais recente para o
+mais antigo. Em vez de OFFSET, cada página pede "os próximos depois de
+(data, id)" do último item da página anterior. Com os índices
+(preceptor_id, data_realizacao, id) e (residente_id, data_realizacao, id),
+cada página custa o mesmo, não importa quantos anos de histórico o usuário
+tenha.
+
+O cursor que vai para o navegador é só "AAAA-MM-DD.id".
+
+As listas carregam só as colunas que aparecem na tabela
+(``colunas_da_lista``); os textos HEIPOC vêm do endpoint de detalhe quando
+o modal é aberto.
+"""
+from datetime import date
+
+from sqlalchemy.orm import joinedload, load_only
+
+from app import db
+from app.models import Preceptor, Procedimento, Residente
+
+
+def colunas_da_lista():
+    """Opção de consulta que carrega só o necessário para as listas.
+
+    Os demais campos ficam com raiseload: um template que volte a usar um
+    texto HEIPOC na lista falha na hora, em vez de fazer uma consulta por
+    linha.
+    """
+    return load_only(
+        Procedimento.id,
+        Procedimento.nome_procedimento,
+        Procedimento.data_realizacao,
+        Procedimento.status,
+        Procedimento.residente_id,
+        Procedimento.preceptor_id,
+        raiseload=True,
+    )
+
+
+def codificar_cursor(procedimento):
+    return f"{procedimento.data_realizacao.isoformat()}.{procedimento.id}"
+
+
+def decodificar_cursor(cursor):
+    """(data, id) de um cursor; levanta ValueError se for inválido."""
+    data, _, id = cursor.partition(".")
+    return date.fromisoformat(data), int(id)
+
+
+def pagina_keyset(consulta, cursor=None, tamanho=25):
+    """Uma página de ``consulta`` (de Procedimento) depois de ``cursor``.
+
+    Retorna (procedimentos, cursor da próxima página ou None).
+    """
+    if cursor:
+        data, id = decodificar_cursor(cursor)
+        # O primeiro termo sozinho já delimita a faixa no índice; o segundo
+        # desempata os procedimentos do mesmo dia
+        consulta = consulta.filter(
+            Procedimento.data_realizacao <= data,
+            db.or_(Procedimento.data_realizacao < data, Procedimento.id < id),
+        )
+    procedimentos = (
+        consulta.order_by(
+            Procedimento.data_realizacao.desc(), Procedimento.id.desc()
+        )
+        .limit(tamanho + 1)
+        .all()
+    )
+    if len(procedimentos) > tamanho:
+        procedimentos = procedimentos[:tamanho]
+        return procedimentos, codificar_cursor(procedimentos[-1])
+    return procedimentos, None
+
+
+def avaliados_do_preceptor(preceptor_id, cursor=None, tamanho=25):
+    """Página do histórico de avaliações (status diferente de Pendente)."""
+    consulta = Procedimento.query.filter(
+        Procedimento.preceptor_id == preceptor_id,
+        Procedimento.status != "Pendente",
+    ).options(
+        colunas_da_lista(),
+        joinedload(Procedimento.residente).load_only(Residente.nome),
+    )
+    return pagina_keyset(consulta, cursor, tamanho)
+
+
+def procedimentos_do_residente(residente_id, cursor=None, tamanho=25):
+    """Página dos procedimentos registrados pelo residente."""
+    consulta = Procedimento.query.filter(
+        Procedimento.residente_id == residente_id
+    ).options(
+        colunas_da_lista(),
+        joinedload(Procedimento.preceptor).load_only(Preceptor.nome),
+    )
+    return pagina_keyset(consulta, cursor, tamanho)
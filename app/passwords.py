@@ -0,0 +1,105 @@
+# app/passwords.py
+"""Política de hash de senhas.
+
+``SENHA_HASH_METODO`` define o algoritmo e o custo usados por ``set_senha``,
+no formato do Werkzeug: ``pbkdf2:sha256:600000`` (iterações) ou
+``scrypt:32768:8:1`` (N, r, p). Baixar o custo deixa o login mais barato em
+CPU; aumentar deixa o hash mais resistente. Quando a política muda, cada
+senha é refeita no próximo login bem-sucedido do usuário (``precisa_rehash``),
+sem forçar ninguém a trocar de senha.
+
+A verificação roda num executor com ``SENHA_VERIFICACAO_WORKERS`` threads.
+Uma rajada de logins, como na troca de plantão, ocupa no máximo esse número
+de núcleos e o resto do worker continua atendendo as outras páginas. Se
+mais de ``SENHA_VERIFICACAO_FILA`` verificações já estiverem esperando, a
+tentativa falha na hora com ``VerificacaoOcupada`` em vez de enfileirar.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class VerificacaoOcupada(Exception):
+    """Muitas verificações de senha em andamento neste processo."""
+
+
+def _configuracao():
+    if has_app_context():
+        config = current_app.config
+        return config["SENHA_HASH_METODO"], config["SENHA_SALT_TAMANHO"]
+    return "pbkdf2", 16
+
+
+@lru_cache(maxsize=None)
+def _metodo_normalizado(metodo, salt_tamanho):
+    # O Werkzeug completa os parâmetros omitidos ("pbkdf2" vira
+    # "pbkdf2:sha256:600000"); o prefixo de um hash gerado é a forma canônica
+    return generate_password_hash("", metodo, salt_tamanho).split("$", 1)[0]
+
+
+def gerar_hash(senha):
+    """Hash de ``senha`` com a política configurada."""
+    metodo, salt_tamanho = _configuracao()
+    return generate_password_hash(senha, metodo, salt_tamanho)
+
+
+def precisa_rehash(senha_hash):
+    """Se ``senha_hash`` foi gerado com outra política que não a atual."""
+    if not senha_hash or "$" not in senha_hash:
+        return True
+    metodo, sal, _ = senha_hash.split("$", 2)
+    atual, salt_tamanho = _configuracao()
+    return (
+        metodo != _metodo_normalizado(atual, salt_tamanho)
+        or len(sal) != salt_tamanho
+    )
+
+
+class VerificadorSenhas:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._vagas = None
+        self.workers = 2
+        self.fila = 32
+
+    def init_app(self, app):
+        self.workers = app.config["SENHA_VERIFICACAO_WORKERS"]
+        self.fila = app.config["SENHA_VERIFICACAO_FILA"]
+        app.extensions["verificador_senhas"] = self
+
+    def _iniciar(self):
+        with self._lock:
+            if self._executor is None:
+                self._vagas = threading.BoundedSemaphore(self.workers + self.fila)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="senhas"
+                )
+        return self._executor
+
+    def verificar(self, senha_hash, senha):
+        """``check_password_hash`` no executor limitado.
+
+        Levanta ``VerificacaoOcupada`` se a fila estiver cheia.
+        """
+        if not senha_hash:
+            return False
+        executor = self._iniciar()
+        if not self._vagas.acquire(blocking=False):
+            raise VerificacaoOcupada()
+        try:
+            return executor.submit(check_password_hash, senha_hash, senha).result()
+        finally:
+            self._vagas.release()
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+verificador_senhas = VerificadorSenhas()
@@ -0,0 +1,342 @@
+# app/pdf_engine.py
+"""Motor de renderização dos relatórios em PDF.
+
+A descoberta de fontes e o parse do CSS do WeasyPrint custam caro, então
+são feitos uma única vez por processo (``preparar_processo``). O motor
+mantém um pool de processos já preparados (``PDF_WORKERS``); cada
+renderização tem um tempo máximo (``PDF_TIMEOUT``) e cada processo do pool
+tem um teto de memória (``PDF_LIMITE_MEMORIA_MB``), de modo que um
+relatório patológico derruba no máximo um processo do pool, nunca o worker
+web. Com ``PDF_WORKERS = 0`` a renderização acontece no próprio processo.
+Os workers da fila de relatórios (app/jobs.py) também renderizam no próprio
+processo, com o teto de memória ``RELATORIO_JOB_LIMITE_MEMORIA_MB``.
+
+O tempo máximo é contado dentro do processo que renderiza, a partir do
+início da renderização; a espera na fila do pool não conta. O SIGALRM
+interrompe a renderização normalmente. Se o processo estiver preso em
+código C e o alarme não conseguir agir, o watchdog do ``faulthandler``
+encerra o processo pouco depois. O pool só é trocado quando um processo
+morre assim (``BrokenProcessPool``); nenhuma renderização é cancelada pelo
+processo web. Nos workers da fila o watchdog só registra onde o processo
+está preso, sem encerrá-lo: lá, um processo morto quebraria o pool da fila
+e com ele os jobs dos outros workers.
+"""
+import faulthandler
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+RELATORIO_CSS = """
+        @page {
+            size: A4;
+            margin: 2cm;
+            @top-center {
+                content: "Hospital de Clínicas - UFU";
+                font-size: 10px;
+                color: #666;
+            }
+            @bottom-right {
+                content: "Page " counter(page) " of " counter(pages);
+                font-size: 10px;
+                color: #666;
+            }
+        }
+        body {
+            font-family: 'DejaVu Sans', Arial, sans-serif;
+            line-height: 1.4;
+            color: #333;
+        }
+        .header-institucional {
+            text-align: center;
+            margin-bottom: 30px;
+            border-bottom: 2px solid #003366;
+            padding-bottom: 15px;
+        }
+        .header-institucional h1 {
+            color: #003366;
+            font-size: 16px;
+            margin: 5px 0;
+        }
+        .header-institucional h2 {
+            color: #0066CC;
+            font-size: 14px;
+            margin: 5px 0;
+        }
+        .titulo-principal {
+            text-align: center;
+            color: #003366;
+            font-size: 18px;
+            font-weight: bold;
+            margin: 20px 0;
+        }
+        .secao {
+            margin-bottom: 25px;
+        }
+        .secao h3 {
+            color: #0066CC;
+            font-size: 14px;
+            font-weight: bold;
+            border-bottom: 1px solid #0066CC;
+            padding-bottom: 5px;
+            margin-bottom: 15px;
+        }
+        .dados-residente {
+            width: 100%;
+            border-collapse: collapse;
+            margin-bottom: 20px;
+        }
+        .dados-residente td {
+            padding: 8px;
+            border: 1px solid #ddd;
+        }
+        .dados-residente td:first-child {
+            font-weight: bold;
+            background-color: #f0f4f8;
+            width: 30%;
+        }
+        .estatisticas {
+            width: 100%;
+            border-collapse: collapse;
+            margin-bottom: 20px;
+        }
+        .estatisticas th {
+            background-color: #003366;
+            color: white;
+            padding: 10px;
+            text-align: center;
+            font-weight: bold;
+        }
+        .estatisticas td {
+            padding: 8px;
+            text-align: center;
+            border: 1px solid #ddd;
+        }
+        .estatisticas tr:nth-child(even) {
+            background-color: #f8f9fa;
+        }
+        .procedimentos {
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 9px;
+        }
+        .procedimentos th {
+            background-color: #003366;
+            color: white;
+            padding: 8px;
+            text-align: center;
+            font-weight: bold;
+        }
+        .procedimentos td {
+            padding: 6px;
+            border: 1px solid #ddd;
+            text-align: center;
+        }
+        .procedimentos tr:nth-child(even) {
+            background-color: #f8f9fa;
+        }
+        .observacoes {
+            text-align: justify;
+            line-height: 1.6;
+            margin: 20px 0;
+        }
+        .rodape {
+            margin-top: 30px;
+            padding-top: 15px;
+            border-top: 1px solid #ccc;
+            font-size: 8px;
+            color: #666;
+        }
+        """
+
+
+# Estado "quente" do processo atual: fontes configuradas e CSS já parseado
+_font_config = None
+_stylesheet = None
+_timeout = 0
+_encerrar_se_preso = True
+
+# Segundos além do PDF_TIMEOUT antes de o watchdog encerrar o processo
+_FOLGA_WATCHDOG = 10
+
+
+class TempoRenderizacaoEsgotado(Exception):
+    """A renderização de um PDF passou do tempo máximo permitido."""
+
+
+def _aquecer():
+    global _font_config, _stylesheet
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    _stylesheet = CSS(string=RELATORIO_CSS, font_config=_font_config)
+
+
+def preparar_processo(timeout=0, limite_memoria_mb=0, encerrar_se_preso=True):
+    """Configura o processo atual para renderizar: limites, fontes e CSS.
+
+    Com ``encerrar_se_preso`` o watchdog encerra o processo quando o alarme
+    não consegue interromper a renderização; sem ele, só registra o
+    traceback. Falhas ao carregar o WeasyPrint não impedem o processo de
+    subir; elas voltam a acontecer (e são propagadas) na primeira
+    renderização.
+    """
+    global _timeout, _encerrar_se_preso
+    _timeout = timeout
+    _encerrar_se_preso = encerrar_se_preso
+    if limite_memoria_mb:
+        import resource
+
+        limite = limite_memoria_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+    try:
+        _aquecer()
+    except Exception as e:
+        logger.warning("Não foi possível pré-carregar o WeasyPrint: %s", e)
+
+
+def _alarme(signum, frame):
+    raise TempoRenderizacaoEsgotado(
+        f"Renderização do PDF excedeu {_timeout} segundos."
+    )
+
+
+def renderizar_no_processo(html_renderizado):
+    """Renderiza o PDF no processo atual, reaproveitando fontes e CSS."""
+    from weasyprint import HTML
+
+    if _stylesheet is None:
+        _aquecer()
+
+    # SIGALRM só pode ser tratado na thread principal. _timeout só é
+    # definido por preparar_processo, nunca no worker web.
+    usar_alarme = _timeout and threading.current_thread() is threading.main_thread()
+    if usar_alarme:
+        signal.signal(signal.SIGALRM, _alarme)
+        signal.alarm(_timeout)
+        faulthandler.dump_traceback_later(
+            _timeout + _FOLGA_WATCHDOG, exit=_encerrar_se_preso
+        )
+    try:
+        return HTML(string=html_renderizado).write_pdf(
+            stylesheets=[_stylesheet], font_config=_font_config
+        )
+    finally:
+        if usar_alarme:
+            signal.alarm(0)
+            faulthandler.cancel_dump_traceback_later()
+
+
+def _ping():
+    return _stylesheet is not None
+
+
+class MotorPDF:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.workers = 0
+        self.timeout = 0
+        self.limite_memoria_mb = 0
+
+    def init_app(self, app):
+        self.workers = app.config["PDF_WORKERS"]
+        self.timeout = app.config["PDF_TIMEOUT"]
+        self.limite_memoria_mb = app.config["PDF_LIMITE_MEMORIA_MB"]
+        app.extensions["motor_pdf"] = self
+
+    def usar_processo_atual(self, limite_memoria_mb=0):
+        """Renderiza sem pool, no processo atual (usado pelos workers da fila).
+
+        O teto de memória é o do processo inteiro, que também carrega a
+        aplicação; por isso ele vem de quem chama e não do
+        ``PDF_LIMITE_MEMORIA_MB``, pensado para um processo que só renderiza.
+        O tempo máximo continua valendo, mas o watchdog não encerra o
+        processo: ele é um worker do pool da fila, e não só deste motor.
+        """
+        self.workers = 0
+        preparar_processo(self.timeout, limite_memoria_mb, encerrar_se_preso=False)
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=preparar_processo,
+                    initargs=(self.timeout, self.limite_memoria_mb),
+                )
+            return self._executor
+
+    def iniciar(self):
+        """Sobe o pool e já prepara todos os processos, sem esperar por eles."""
+        if self.workers == 0:
+            return
+        executor = self._obter_executor()
+        for _ in range(self.workers):
+            executor.submit(_ping)
+
+    def _descartar(self, executor):
+        """Tira de uso um pool quebrado; o próximo pedido cria outro.
+
+        Um processo que morre (watchdog do tempo máximo, teto de memória)
+        quebra o pool inteiro, e o pool quebrado já não tem renderizações em
+        andamento.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        logger.warning("Pool de renderização de PDF quebrado; criando outro")
+        executor.shutdown(wait=False)
+
+    def _ao_terminar(self, executor, futuro):
+        if not futuro.cancelled() and isinstance(futuro.exception(), BrokenProcessPool):
+            self._descartar(executor)
+
+    def submeter(self, html_renderizado):
+        """Envia uma renderização ao pool e devolve o ``Future`` correspondente."""
+        if self.workers == 0:
+            futuro = Future()
+            try:
+                futuro.set_result(renderizar_no_processo(html_renderizado))
+            except Exception as e:
+                futuro.set_exception(e)
+            return futuro
+        executor = self._obter_executor()
+        try:
+            futuro = executor.submit(renderizar_no_processo, html_renderizado)
+        except BrokenProcessPool:
+            self._descartar(executor)
+            executor = self._obter_executor()
+            futuro = executor.submit(renderizar_no_processo, html_renderizado)
+        futuro.add_done_callback(partial(self._ao_terminar, executor))
+        return futuro
+
+    def aguardar(self, future):
+        """Espera o resultado de ``submeter``.
+
+        O tempo máximo é aplicado pelo próprio processo que renderiza
+        (``TempoRenderizacaoEsgotado``); aqui só se espera. Se o processo
+        morreu, o ``BrokenProcessPool`` do ``future`` já tirou o pool de uso.
+        """
+        return future.result()
+
+    def renderizar(self, html_renderizado):
+        """Gera o PDF do HTML informado e retorna os bytes."""
+        return self.aguardar(self.submeter(html_renderizado))
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+motor_pdf = MotorPDF()
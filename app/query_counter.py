@@ -0,0 +1,119 @@
+# app/query_counter.py
+"""Contagem dos comandos SQL executados por requisição.
+
+Serve para pegar regressões de N+1: com ``SQL_LIMITE_POR_REQUISICAO``
+definido, cada resposta recebe o cabeçalho ``X-SQL-Queries`` e, se a
+contagem passar do limite, a requisição falha com ``AssertionError`` quando
+a aplicação está em modo de teste (fora dele só gera um aviso no log).
+Limites específicos por endpoint vão em ``SQL_LIMITES_POR_ENDPOINT``, por
+exemplo ``{"main.dashboard_preceptor": 6}``; a chave pode levar o método na
+frente (``"GET main.dashboard_preceptor"``) para valer só para ele.
+
+Em respostas em streaming (dashboard, exportações, ZIP) boa parte das
+consultas acontece depois do ``after_request``, enquanto o corpo é gerado.
+Nelas não há cabeçalho; a contagem continua até o fim do corpo e o limite é
+conferido quando a resposta é fechada.
+
+Para contar um trecho qualquer de código use ``contar_queries``::
+
+    with contar_queries(app) as contador:
+        client.get("/dashboard/preceptor")
+    assert contador.total <= 6
+"""
+from contextlib import contextmanager, nullcontext
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from app import db
+
+
+class ContadorQueries:
+    def __init__(self):
+        self.comandos = []
+
+    @property
+    def total(self):
+        return len(self.comandos)
+
+
+# Contadores ativos via contar_queries()
+_contadores = []
+
+
+def _ao_executar(conn, cursor, statement, parameters, context, executemany):
+    for contador in _contadores:
+        contador.comandos.append(statement)
+    if has_app_context() and "contador_sql" in g:
+        g.contador_sql.comandos.append(statement)
+
+
+def _registrar_listener(engine):
+    if not event.contains(engine, "before_cursor_execute", _ao_executar):
+        event.listen(engine, "before_cursor_execute", _ao_executar)
+
+
+@contextmanager
+def contar_queries(app=None):
+    """Conta os comandos SQL executados dentro do bloco ``with``.
+
+    Informe ``app`` para usar fora de um contexto de aplicação (em volta de
+    chamadas do ``test_client``, por exemplo).
+    """
+    with app.app_context() if app is not None else nullcontext():
+        for engine in db.engines.values():
+            _registrar_listener(engine)
+    contador = ContadorQueries()
+    _contadores.append(contador)
+    try:
+        yield contador
+    finally:
+        _contadores.remove(contador)
+
+
+def _iniciar_contagem():
+    g.contador_sql = ContadorQueries()
+
+
+def _conferir(app, descricao, total, limite):
+    if total <= limite:
+        return
+    mensagem = f"{descricao} executou {total} comandos SQL (limite: {limite})"
+    if app.testing:
+        raise AssertionError(mensagem)
+    app.logger.warning(mensagem)
+
+
+def _verificar_limite(response):
+    if "contador_sql" not in g:
+        return response
+
+    contador = g.contador_sql
+    limites = current_app.config["SQL_LIMITES_POR_ENDPOINT"] or {}
+    limite = limites.get(
+        f"{request.method} {request.endpoint}",
+        limites.get(request.endpoint, current_app.config["SQL_LIMITE_POR_REQUISICAO"]),
+    )
+    descricao = f"{request.method} {request.path}"
+
+    if response.is_streamed:
+        # O corpo ainda vai ser gerado (com stream_with_context, no mesmo g)
+        app = current_app._get_current_object()
+        response.call_on_close(
+            lambda: _conferir(app, descricao, contador.total, limite)
+        )
+        return response
+
+    response.headers["X-SQL-Queries"] = str(contador.total)
+    _conferir(current_app, descricao, contador.total, limite)
+    return response
+
+
+def init_app(app):
+    if app.config["SQL_LIMITE_POR_REQUISICAO"] is None:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            _registrar_listener(engine)
+    app.before_request(_iniciar_contagem)
+    app.after_request(_verificar_limite)
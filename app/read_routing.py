@@ -0,0 +1,88 @@
+# app/read_routing.py
+"""Roteamento das leituras para um banco somente leitura.
+
+Com ``DATABASE_READ_URL`` configurado, a aplicação ganha o bind ``leitura``:
+uma réplica do PostgreSQL ou uma segunda conexão, read-only, ao mesmo
+arquivo SQLite (``sqlite:///file:residentes.db?mode=ro&uri=true``). Nos GETs
+das views marcadas com ``@rota_de_leitura``, os SELECTs vão para esse bind;
+flushes, commits e UPDATE/DELETE em massa continuam no banco principal.
+
+Para o usuário ver o que acabou de gravar, toda requisição que escreve no
+banco anota o horário na sessão do navegador. Por
+``LEITURA_JANELA_POS_ESCRITA`` segundos depois disso, as views de leitura
+desse usuário continuam no principal, então o redirect depois de um POST
+não lê de uma réplica atrasada. Uma requisição que grava algo também deixa
+de usar o bind de leitura até o fim.
+"""
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+CHAVE_LEITURA = "leitura"
+
+
+class SessaoRoteada(Session):
+    """Sessão do ``db`` que manda os SELECTs das views de leitura à réplica."""
+
+    def _rotear_para_leitura(self, clause):
+        return (
+            not self._flushing
+            and not self.info.get("escreveu")
+            and getattr(clause, "is_select", False)
+            and has_app_context()
+            and g.get("usar_leitura", False)
+        )
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._rotear_para_leitura(clause):
+            engine = self._db.engines.get(CHAVE_LEITURA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(SessaoRoteada, "after_flush")
+def _marcar_escrita(sessao, flush_context):
+    sessao.info["escreveu"] = True
+
+
+@event.listens_for(SessaoRoteada, "do_orm_execute")
+def _marcar_escrita_em_massa(estado):
+    # UPDATE/DELETE em massa (Query.update, db.update...) não passam pelo flush
+    if not estado.is_select:
+        estado.session.info["escreveu"] = True
+
+
+def _escrita_recente():
+    ultima = session.get("ultima_escrita")
+    janela = current_app.config["LEITURA_JANELA_POS_ESCRITA"]
+    return ultima is not None and time.time() - ultima < janela
+
+
+def rota_de_leitura(view):
+    """Manda as leituras dos GETs desta view para o bind de leitura."""
+
+    @wraps(view)
+    def envoltorio(*args, **kwargs):
+        if request.method == "GET" and not _escrita_recente():
+            g.usar_leitura = True
+        return view(*args, **kwargs)
+
+    return envoltorio
+
+
+def _registrar_escrita(response):
+    from app import db
+
+    if db.session.registry.has() and db.session.info.get("escreveu"):
+        session["ultima_escrita"] = time.time()
+    return response
+
+
+def init_app(app):
+    if CHAVE_LEITURA not in (app.config.get("SQLALCHEMY_BINDS") or {}):
+        return
+    app.after_request(_registrar_escrita)
@@ -0,0 +1,179 @@
+# app/reference_data.py
+"""Registro em memória das tabelas de referência.
+
+Universidades, hospitais e especialidades quase nunca mudam, mas eram
+consultados inteiros a cada formulário de cadastro exibido e por nome a cada
+envio. O registro carrega as três tabelas uma vez por processo, em
+namedtuples imutáveis, com mapas por id e por nome.
+
+Qualquer alteração por meio da ORM nessas tabelas incrementa o contador da
+tabela ``versao_referencias`` na mesma transação, e o registro do processo
+atual é descartado depois do commit. Os outros workers conferem o contador
+no máximo a cada ``REFERENCIAS_VERIFICAR_INTERVALO`` segundos e recarregam
+quando ele mudou. Código que altere essas tabelas por fora da ORM deve
+chamar ``incrementar_versao(conn)`` na transação e
+``registro_referencias.invalidar()`` depois do commit.
+"""
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+
+UniversidadeRef = namedtuple("UniversidadeRef", ["id", "nome", "uf"])
+HospitalRef = namedtuple("HospitalRef", ["id", "nome", "universidade_id"])
+EspecialidadeRef = namedtuple("EspecialidadeRef", ["id", "nome"])
+
+# Uma tabela de referência: itens em ordem de nome e mapas (somente leitura)
+Tabela = namedtuple("Tabela", ["itens", "por_id", "por_nome"])
+Referencias = namedtuple(
+    "Referencias", ["versao", "universidades", "hospitais", "especialidades"]
+)
+
+
+def _tabela(linhas, registro):
+    itens = tuple(registro(*linha) for linha in linhas)
+    return Tabela(
+        itens,
+        MappingProxyType({item.id: item for item in itens}),
+        MappingProxyType({item.nome: item for item in itens}),
+    )
+
+
+def _versao_no_banco():
+    from app.models import VersaoReferencias
+
+    versao = db.session.execute(
+        db.select(VersaoReferencias.versao).where(VersaoReferencias.id == 1)
+    ).scalar()
+    return versao or 0
+
+
+def _carregar():
+    from app.models import Especialidade, Hospital, Universidade
+
+    # A versão é lida antes dos dados: se algo mudar no meio, a próxima
+    # conferência recarrega de novo
+    versao = _versao_no_banco()
+    consultas = [
+        (Universidade, [Universidade.id, Universidade.nome, Universidade.uf]),
+        (Hospital, [Hospital.id, Hospital.nome, Hospital.universidade_id]),
+        (Especialidade, [Especialidade.id, Especialidade.nome]),
+    ]
+    universidades, hospitais, especialidades = (
+        db.session.execute(db.select(*colunas).order_by(modelo.nome)).all()
+        for modelo, colunas in consultas
+    )
+    return Referencias(
+        versao,
+        _tabela(universidades, UniversidadeRef),
+        _tabela(hospitais, HospitalRef),
+        _tabela(especialidades, EspecialidadeRef),
+    )
+
+
+class RegistroReferencias:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._atual = None
+        self._conferido_em = 0.0
+        # Muda a cada invalidar(): uma carga que começou antes não é guardada
+        self._geracao = 0
+        self.intervalo = 30
+
+    def init_app(self, app):
+        self.intervalo = app.config["REFERENCIAS_VERIFICAR_INTERVALO"]
+        app.extensions["registro_referencias"] = self
+
+    def obter(self):
+        """As ``Referencias`` atuais, recarregadas se a versão mudou."""
+        agora = time.monotonic()
+        with self._lock:
+            atual = self._atual
+            conferir = (
+                atual is not None and agora - self._conferido_em >= self.intervalo
+            )
+            if conferir:
+                # Só uma thread confere; as outras seguem com o que há
+                self._conferido_em = agora
+            geracao = self._geracao
+        if atual is not None:
+            if not conferir or _versao_no_banco() == atual.versao:
+                return atual
+
+        referencias = _carregar()
+        with self._lock:
+            if self._geracao == geracao:
+                self._atual = referencias
+                self._conferido_em = agora
+        return referencias
+
+    def invalidar(self):
+        with self._lock:
+            self._atual = None
+            self._geracao += 1
+
+
+registro_referencias = RegistroReferencias()
+
+
+def criar_contador(conn):
+    """Cria a linha única do contador de versão, se ainda não existir."""
+    from app.models import VersaoReferencias
+
+    tabela = VersaoReferencias.__table__
+    existe = conn.execute(db.select(tabela.c.id).where(tabela.c.id == 1)).first()
+    if existe is None:
+        conn.execute(tabela.insert().values(id=1, versao=0))
+
+
+def incrementar_versao(conn):
+    """Incrementa o contador de versão; use na transação da alteração."""
+    from app.models import VersaoReferencias
+
+    tabela = VersaoReferencias.__table__
+    conn.execute(
+        tabela.update().where(tabela.c.id == 1).values(versao=tabela.c.versao + 1)
+    )
+
+
+def _ao_alterar(mapper, connection, alvo):
+    incrementar_versao(connection)
+    # Só depois do commit: antes dele, uma carga em outra thread ainda leria
+    # a versão e os dados antigos e os guardaria de novo
+    object_session(alvo).info["referencias_alteradas"] = True
+
+
+def _apos_commit(sessao):
+    if sessao.info.pop("referencias_alteradas", False):
+        registro_referencias.invalidar()
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop("referencias_alteradas", None)
+
+
+def _ao_criar_tabela(target, connection, **kw):
+    criar_contador(connection)
+
+
+def registrar_eventos():
+    from app.models import Especialidade, Hospital, Universidade, VersaoReferencias
+
+    for modelo in (Universidade, Hospital, Especialidade):
+        for nome in ("after_insert", "after_update", "after_delete"):
+            if not event.contains(modelo, nome, _ao_alterar):
+                event.listen(modelo, nome, _ao_alterar)
+    for nome, funcao in (
+        ("after_commit", _apos_commit),
+        ("after_rollback", _apos_rollback),
+    ):
+        if not event.contains(Session, nome, funcao):
+            event.listen(Session, nome, funcao)
+    tabela = VersaoReferencias.__table__
+    if not event.contains(tabela, "after_create", _ao_criar_tabela):
+        event.listen(tabela, "after_create", _ao_criar_tabela)
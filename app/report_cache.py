@@ -0,0 +1,102 @@
+# app/report_cache.py
+"""Cache em disco dos relatórios em PDF já gerados.
+
+Cada arquivo é identificado pelo residente e pela impressão digital
+(``fingerprint_relatorio``) dos dados que aparecem no relatório, então uma
+entrada nunca fica "velha": quando algo muda a chave muda junto. O tamanho
+total é limitado por ``RELATORIO_CACHE_MAX_BYTES``, descartando primeiro os
+arquivos usados há mais tempo (o mtime é atualizado a cada acerto).
+"""
+import glob
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        # Outro processo já removeu o arquivo
+        pass
+
+
+class CacheRelatorios:
+    def __init__(self):
+        self.diretorio = None
+        self.max_bytes = 0
+
+    def init_app(self, app):
+        self.diretorio = app.config["RELATORIO_CACHE_DIR"]
+        self.max_bytes = app.config["RELATORIO_CACHE_MAX_BYTES"]
+        app.extensions["cache_relatorios"] = self
+
+    def _caminho(self, residente_id, chave):
+        return os.path.join(self.diretorio, f"{residente_id}-{chave}.pdf")
+
+    def _entradas_do_residente(self, residente_id):
+        return glob.glob(os.path.join(self.diretorio, f"{residente_id}-*.pdf"))
+
+    def obter(self, residente_id, chave):
+        """Retorna o caminho do PDF em cache ou ``None``."""
+        caminho = self._caminho(residente_id, chave)
+        try:
+            # Marca o uso para a política LRU
+            os.utime(caminho)
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    def guardar(self, residente_id, chave, pdf_bytes):
+        """Grava o PDF, descarta versões antigas do mesmo residente e aplica o limite."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho(residente_id, chave)
+        for antigo in self._entradas_do_residente(residente_id):
+            if antigo != caminho:
+                _remover(antigo)
+
+        # Um temporário por escrita: duas threads podem gravar a mesma chave
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as arquivo:
+                arquivo.write(pdf_bytes)
+            os.replace(temporario, caminho)
+        except Exception:
+            _remover(temporario)
+            raise
+
+        self._aplicar_limite()
+        return caminho
+
+    def invalidar(self, residente_id):
+        """Remove todas as versões em cache do relatório de um residente."""
+        if not self.diretorio:
+            return
+        for caminho in self._entradas_do_residente(residente_id):
+            _remover(caminho)
+
+    def _aplicar_limite(self):
+        entradas = []
+        for caminho in glob.glob(os.path.join(self.diretorio, "*.pdf")):
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        if total <= self.max_bytes:
+            return
+
+        # Menos usados recentemente primeiro
+        for _, tamanho, caminho in sorted(entradas):
+            _remover(caminho)
+            total -= tamanho
+            logger.debug("Relatório removido do cache: %s", caminho)
+            if total <= self.max_bytes:
+                break
+
+
+cache_relatorios = CacheRelatorios()
@@ -0,0 +1,317 @@
+# app/reports.py
+import hashlib
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime
+
+from flask import current_app, render_template
+from sqlalchemy.orm import aliased, joinedload, load_only
+
+from app import db
+from app.models import (
+    Especialidade,
+    Hospital,
+    Preceptor,
+    Procedimento,
+    Residente,
+    Universidade,
+)
+from app.pdf_engine import motor_pdf
+from app.report_cache import cache_relatorios
+from app.stats import estatisticas_procedimentos
+
+# Incrementar quando o template ou o CSS do relatório (app/pdf_engine.py)
+# mudarem, para que os PDFs já guardados no cache deixem de ser usados.
+RELATORIO_VERSAO = 1
+
+
+def _agora_local():
+    """Data e hora atuais no fuso do relatório (America/Sao_Paulo)."""
+    import pytz
+
+    return datetime.now(pytz.timezone("America/Sao_Paulo"))
+
+
+def montar_contexto_relatorio(residente):
+    """Reúne os dados usados pelo template do relatório do residente."""
+    # Carrega de uma vez os relacionamentos que o template usa no cabeçalho
+    # (especialidade, supervisor, universidade e hospital do supervisor).
+    residente = (
+        Residente.query.options(
+            joinedload(Residente.especialidade),
+            joinedload(Residente.supervisor).joinedload(Preceptor.universidade),
+            joinedload(Residente.supervisor).joinedload(Preceptor.hospital),
+        )
+        .filter_by(id=residente.id)
+        .one()
+    )
+
+    procedimentos_validados = (
+        Procedimento.query.filter_by(residente_id=residente.id, status="Validado")
+        .options(
+            # O bloco HEIPOC já vem pronto em descricao_html; os textos
+            # originais só são lidos se a descrição ainda não foi calculada
+            load_only(
+                Procedimento.nome_procedimento,
+                Procedimento.data_realizacao,
+                Procedimento.descricao_html,
+                Procedimento.observacao_preceptor,
+                Procedimento.preceptor_id,
+            ),
+            joinedload(Procedimento.preceptor).load_only(Preceptor.nome),
+        )
+        .order_by(Procedimento.data_realizacao.asc())
+        .all()
+    )
+
+    data_emissao_local = _agora_local()
+
+    estatisticas = estatisticas_procedimentos(residente_id=residente.id)
+    total_procedimentos = estatisticas.por_status["Validado"]
+    procedimentos_pendentes = estatisticas.por_status["Pendente"]
+    procedimentos_rejeitados = estatisticas.por_status["Rejeitado"]
+    total_geral = (
+        total_procedimentos + procedimentos_pendentes + procedimentos_rejeitados
+    )
+    preceptores_stats = estatisticas.contraparte("Validado")
+
+    return {
+        "residente": residente,
+        "procedimentos": procedimentos_validados,
+        "data_emissao": data_emissao_local,
+        "total_procedimentos": total_procedimentos,
+        "procedimentos_pendentes": procedimentos_pendentes,
+        "procedimentos_rejeitados": procedimentos_rejeitados,
+        "total_geral": total_geral,
+        "preceptores_stats": preceptores_stats,
+    }
+
+
+def renderizar_html_relatorio(residente):
+    """Renderiza o HTML do relatório (exige contexto de aplicação)."""
+    return render_template(
+        "relatorio_template.html", **montar_contexto_relatorio(residente)
+    )
+
+
+def gerar_pdf(html_renderizado):
+    """Converte o HTML do relatório em PDF usando o motor de renderização."""
+    return motor_pdf.renderizar(html_renderizado)
+
+
+def fingerprint_relatorio(residente):
+    """Impressão digital de tudo o que aparece no relatório do residente.
+
+    Entram os dados do cabeçalho (residente, especialidade, supervisor,
+    universidade e hospital), o status de todos os procedimentos (os totais
+    de pendentes e rejeitados aparecem no relatório) e, dos validados, a
+    revisão (app/descriptions.py) e o nome do preceptor; nenhum texto dos
+    procedimentos é lido. O dia da emissão também entra, então o PDF em
+    cache nunca traz a data de um dia anterior; a hora impressa é a da
+    geração do arquivo.
+    """
+    supervisor = aliased(Preceptor)
+    cabecalho = (
+        db.session.query(
+            Residente.nome,
+            Residente.crm_numero,
+            Residente.crm_uf,
+            Residente.categoria,
+            Residente.ano_ingresso,
+            Especialidade.nome,
+            supervisor.nome,
+            Universidade.nome,
+            Hospital.nome,
+        )
+        .outerjoin(Especialidade, Residente.especialidade_id == Especialidade.id)
+        .outerjoin(supervisor, Residente.supervisor_id == supervisor.id)
+        .outerjoin(Universidade, supervisor.universidade_id == Universidade.id)
+        .outerjoin(Hospital, supervisor.hospital_id == Hospital.id)
+        .filter(Residente.id == residente.id)
+        .one()
+    )
+    validado = Procedimento.status == "Validado"
+    procedimentos = (
+        db.session.query(
+            Procedimento.id,
+            Procedimento.status,
+            # Dos validados, a revisão cobre nome, data, descrição HEIPOC e
+            # observação; o nome do preceptor vem da tabela dele
+            db.case((validado, Procedimento.revisao)),
+            db.case((validado, Preceptor.nome)),
+        )
+        .outerjoin(Preceptor, Procedimento.preceptor_id == Preceptor.id)
+        .filter(Procedimento.residente_id == residente.id)
+        .order_by(Procedimento.id)
+        .all()
+    )
+
+    digest = hashlib.sha256()
+    digest.update(
+        repr(
+            (
+                RELATORIO_VERSAO,
+                _agora_local().date().isoformat(),
+                tuple(cabecalho),
+            )
+        ).encode()
+    )
+    for linha in procedimentos:
+        digest.update(b"|")
+        digest.update(repr(tuple(linha)).encode())
+    return digest.hexdigest()[:32]
+
+
+def obter_pdf_relatorio(residente, chave=None):
+    """Retorna ``(chave, caminho)`` do PDF, gerando-o só se não estiver em cache."""
+    chave = chave or fingerprint_relatorio(residente)
+    caminho = cache_relatorios.obter(residente.id, chave)
+    if caminho is None:
+        pdf_bytes = gerar_pdf(renderizar_html_relatorio(residente))
+        caminho = cache_relatorios.guardar(residente.id, chave, pdf_bytes)
+    return chave, caminho
+
+
+def _ler_do_cache(residente_id, chave):
+    """Bytes do PDF em cache, ou None se não houver.
+
+    O limite do cache pode descartar o arquivo a qualquer momento, até entre
+    o ``obter`` e a leitura; nesse caso também é None, e quem chamou
+    renderiza o PDF de novo.
+    """
+    caminho = cache_relatorios.obter(residente_id, chave)
+    if caminho is None:
+        return None
+    try:
+        with open(caminho, "rb") as arquivo:
+            return arquivo.read()
+    except FileNotFoundError:
+        return None
+
+
+def ler_pdf_relatorio(residente):
+    """Bytes do PDF do relatório, do cache quando possível.
+
+    Para quem guarda uma cópia própria (a fila de jobs), que não pode ficar
+    com um caminho que o limite do cache apague depois.
+    """
+    chave = fingerprint_relatorio(residente)
+    pdf_bytes = _ler_do_cache(residente.id, chave)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    pdf_bytes = gerar_pdf(renderizar_html_relatorio(residente))
+    cache_relatorios.guardar(residente.id, chave, pdf_bytes)
+    return pdf_bytes
+
+
+def nome_arquivo_relatorio(residente):
+    return f'report_{residente.nome.replace(" ", "_").lower()}.pdf'
+
+
+class _SaidaZip:
+    """Destino de escrita sem seek para o ZipFile: acumula os bytes até serem lidos."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _limite_espera_zip():
+    """Segundos sem nenhuma renderização terminar antes de desistir das demais.
+
+    O processo que renderiza aplica ``PDF_TIMEOUT`` (e o watchdog, logo
+    depois); o dobro disso, com folga, só estoura se o pool travou.
+    """
+    if not motor_pdf.timeout:
+        return None
+    return 2 * motor_pdf.timeout + 30
+
+
+def gerar_zip_relatorios(residentes):
+    """Gera, em pedaços, um ZIP com o relatório em PDF de cada residente.
+
+    Os relatórios em cache entram na hora; os demais são renderizados pelo
+    motor de PDF, no máximo um por processo do pool de cada vez, e cada um
+    é enviado assim que fica pronto, sem montar o arquivo inteiro em
+    memória. O HTML de cada relatório só é montado quando ele vai para o
+    pool. Precisa do contexto da requisição (use com ``stream_with_context``).
+    """
+    saida = _SaidaZip()
+    simultaneos = max(motor_pdf.workers, 1)
+    limite_espera = _limite_espera_zip()
+    # PDFs já são comprimidos; ZIP_STORED evita gastar CPU à toa
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_STORED) as arquivo_zip:
+
+        def gravar_erro(nome, erro):
+            # A resposta já começou; o erro vai como um arquivo no ZIP
+            arquivo_zip.writestr(
+                nome.replace(".pdf", "_ERRO.txt"),
+                f"Não foi possível gerar este relatório: {erro}",
+            )
+
+        em_renderizacao = {}
+        pendentes = iter(residentes)
+        while True:
+            for residente in pendentes:
+                nome = f"{residente.id}_{nome_arquivo_relatorio(residente)}"
+                chave = fingerprint_relatorio(residente)
+                pdf_bytes = _ler_do_cache(residente.id, chave)
+                if pdf_bytes is not None:
+                    arquivo_zip.writestr(nome, pdf_bytes)
+                    yield saida.esvaziar()
+                    continue
+                try:
+                    futuro = motor_pdf.submeter(renderizar_html_relatorio(residente))
+                except Exception as e:
+                    current_app.logger.exception(
+                        "Erro ao gerar o PDF do residente %s", residente.id
+                    )
+                    gravar_erro(nome, e)
+                    yield saida.esvaziar()
+                    continue
+                em_renderizacao[futuro] = (residente.id, chave, nome)
+                if len(em_renderizacao) >= simultaneos:
+                    break
+            if not em_renderizacao:
+                break
+
+            prontos, _ = wait(
+                em_renderizacao, timeout=limite_espera, return_when=FIRST_COMPLETED
+            )
+            if not prontos:
+                current_app.logger.error(
+                    "Nenhum PDF ficou pronto em %s segundos; desistindo de %d",
+                    limite_espera,
+                    len(em_renderizacao),
+                )
+                for residente_id, chave, nome in em_renderizacao.values():
+                    gravar_erro(nome, "tempo de renderização esgotado")
+                em_renderizacao.clear()
+                yield saida.esvaziar()
+                continue
+
+            for futuro in prontos:
+                residente_id, chave, nome = em_renderizacao.pop(futuro)
+                try:
+                    pdf_bytes = motor_pdf.aguardar(futuro)
+                except Exception as e:
+                    current_app.logger.exception(
+                        "Erro ao gerar o PDF do residente %s", residente_id
+                    )
+                    gravar_erro(nome, e)
+                else:
+                    cache_relatorios.guardar(residente_id, chave, pdf_bytes)
+                    arquivo_zip.writestr(nome, pdf_bytes)
+                yield saida.esvaziar()
+    yield saida.esvaziar()
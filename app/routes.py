@@ -1,19 +1,38 @@
 # app/routes.py
-import requests
+import os
+
 from flask import (
     Blueprint,
+    Response,
+    abort,
+    current_app,
     flash,
+    get_flashed_messages,
+    jsonify,
     make_response,
     redirect,
     render_template,
     request,
+    send_file,
     session,
+    stream_template,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user, login_required, login_user, logout_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy.orm import joinedload, load_only
 
 from app import db
+from app.accounts import autenticar, conflitos_cadastro
+from app.crm import ErroConsultaCRM, cliente_crm
 from app.email import send_procedimento_avaliado_email
+from app.exports import (
+    content_disposition,
+    gerar_csv,
+    gerar_xlsx,
+    nome_arquivo_logbook,
+)
 from app.forms import (
     AvaliacaoForm,
     LoginForm,
@@ -22,17 +41,48 @@ from app.forms import (
     RegistroPreceptorForm,
     VerificacaoCRMForm,
 )
+from app.jobs import fila_relatorios
 from app.models import (
-    Hospital,
     Preceptor,
     Procedimento,
+    RelatorioJob,
     Residente,
-    Universidade,
 )
+from app.pagination import (
+    avaliados_do_preceptor,
+    colunas_da_lista,
+    procedimentos_do_residente,
+)
+from app.passwords import VerificacaoOcupada
+from app.read_routing import rota_de_leitura
+from app.reference_data import registro_referencias
+from app.report_cache import cache_relatorios
+from app.reports import (
+    fingerprint_relatorio,
+    gerar_zip_relatorios,
+    nome_arquivo_relatorio,
+    obter_pdf_relatorio,
+    renderizar_html_relatorio,
+)
+from app.search import buscar
+from app.stats import estatisticas_procedimentos
 
 main_bp = Blueprint("main", __name__)
 
 
+def _em_blocos(partes, tamanho=8192):
+    """Junta os pedaços pequenos do ``stream_template`` em blocos maiores."""
+    bloco, acumulado = [], 0
+    for parte in partes:
+        bloco.append(parte)
+        acumulado += len(parte)
+        if acumulado >= tamanho:
+            yield "".join(bloco)
+            bloco, acumulado = [], 0
+    if bloco:
+        yield "".join(bloco)
+
+
 @main_bp.route("/")
 def index():
     return redirect(url_for("main.login"))
@@ -46,11 +96,12 @@ def login():
     if form.validate_on_submit():
         email = form.email.data
         password = form.password.data
-        user = (
-            Residente.query.filter_by(email=email).first()
-            or Preceptor.query.filter_by(email=email).first()
-        )
-        if user and user.check_senha(password):
+        try:
+            user = autenticar(email, password)
+        except VerificacaoOcupada:
+            flash("Muitos acessos no momento. Tente novamente em instantes.", "warning")
+            return render_template("login.html", title="Acesso", form=form), 503
+        if user:
             login_user(user)
             return redirect(url_for("main.home"))
         else:
@@ -69,17 +120,18 @@ def logout():
 @main_bp.route("/home")
 @login_required
 def home():
-    if isinstance(current_user, Residente):
+    if current_user.eh_residente:
         return redirect(url_for("main.dashboard_residente"))
-    elif isinstance(current_user, Preceptor):
+    elif current_user.eh_preceptor:
         return redirect(url_for("main.dashboard_preceptor"))
     return redirect(url_for("main.login"))
 
 
 @main_bp.route("/dashboard/residente", methods=["GET", "POST"])
 @login_required
+@rota_de_leitura
 def dashboard_residente():
-    if not isinstance(current_user, Residente):
+    if not current_user.eh_residente:
         flash("Acesso não autorizado.", "danger")
         return redirect(url_for("main.home"))
     form = ProcedimentoForm()
@@ -106,23 +158,24 @@ def dashboard_residente():
         db.session.commit()
         flash("Procedimento registrado com sucesso! Aguardando validação.", "success")
         return redirect(url_for("main.dashboard_residente"))
-    procedimentos = (
-        Procedimento.query.filter_by(residente_id=current_user.id)
-        .order_by(Procedimento.data_realizacao.desc())
-        .all()
+    procedimentos, proximo_cursor = procedimentos_do_residente(
+        current_user.id, tamanho=current_app.config["DASHBOARD_PAGINA_TAMANHO"]
     )
     return render_template(
         "dashboard_residente.html",
         title="Meu Dashboard",
         form=form,
         procedimentos=procedimentos,
+        proximo_cursor=proximo_cursor,
+        estatisticas=estatisticas_procedimentos(residente_id=current_user.id),
     )
 
 
 @main_bp.route("/dashboard/preceptor", methods=["GET", "POST"])
 @login_required
+@rota_de_leitura
 def dashboard_preceptor():
-    if not isinstance(current_user, Preceptor):
+    if not current_user.eh_preceptor:
         flash("Acesso não autorizado.", "danger")
         return redirect(url_for("main.home"))
     form = AvaliacaoForm()
@@ -154,53 +207,163 @@ def dashboard_preceptor():
                     "warning",
                 )
             db.session.commit()
+            cache_relatorios.invalidar(procedimento.residente_id)
         return redirect(url_for("main.dashboard_preceptor"))
+    # As consultas das listas são iteradas pelo template à medida que ele
+    # chega em cada seção; no modo streaming o cabeçalho e a fila de
+    # pendentes já estão no navegador enquanto o resto é lido.
     procedimentos_pendentes = (
         Procedimento.query.filter_by(preceptor_id=current_user.id, status="Pendente")
-        .order_by(Procedimento.data_realizacao.asc())
-        .all()
-    )
-    procedimentos_avaliados = (
-        Procedimento.query.filter(
-            Procedimento.preceptor_id == current_user.id,
-            Procedimento.status != "Pendente",
+        .options(
+            colunas_da_lista(),
+            joinedload(Procedimento.residente).load_only(Residente.nome),
         )
-        .order_by(Procedimento.data_realizacao.desc())
-        .all()
+        .order_by(Procedimento.data_realizacao.asc())
+        .yield_per(100)
     )
     residentes_supervisionados = (
         db.session.query(Residente)
+        .options(load_only(Residente.id, Residente.nome))
         .join(Procedimento)
         .filter(Procedimento.preceptor_id == current_user.id)
         .distinct()
-        .all()
+        .yield_per(100)
     )
-    return render_template(
-        "dashboard_preceptor.html",
-        title="Dashboard do Preceptor",
-        pendentes=procedimentos_pendentes,
-        avaliados=procedimentos_avaliados,
-        residentes=residentes_supervisionados,
-        form_avaliacao=form,
+    tamanho = current_app.config["DASHBOARD_PAGINA_TAMANHO"]
+    contexto = {
+        "title": "Dashboard do Preceptor",
+        "pendentes": procedimentos_pendentes,
+        "pagina_avaliados": lambda: avaliados_do_preceptor(
+            current_user.id, tamanho=tamanho
+        ),
+        "residentes": residentes_supervisionados,
+        "estatisticas": estatisticas_procedimentos(preceptor_id=current_user.id),
+        "form_avaliacao": form,
+    }
+    if not current_app.config["DASHBOARD_STREAMING"]:
+        return render_template("dashboard_preceptor.html", **contexto)
+
+    # Depois que o streaming começa os cabeçalhos já foram enviados e a
+    # sessão não pode mais mudar: as mensagens flash são consumidas e o token
+    # CSRF é gerado agora, antes da resposta sair.
+    get_flashed_messages(with_categories=True)
+    generate_csrf()
+    return Response(
+        _em_blocos(stream_template("dashboard_preceptor.html", **contexto)),
+        mimetype="text/html",
     )
 
 
-@main_bp.route("/relatorio/residente/<int:residente_id>")
+def _item_lista(procedimento, contraparte):
+    """Linha das listas dos dashboards, no formato da rolagem infinita."""
+    return {
+        "id": procedimento.id,
+        "nome_procedimento": procedimento.nome_procedimento,
+        "data_realizacao": procedimento.data_realizacao.strftime("%d/%m/%Y"),
+        "status": procedimento.status,
+        "contraparte": contraparte.nome,
+        "detalhe_url": url_for(
+            "main.api_procedimento_detalhe", procedimento_id=procedimento.id
+        ),
+    }
+
+
+def _pagina_json(buscar_pagina, usuario_id, contraparte):
+    try:
+        procedimentos, proximo_cursor = buscar_pagina(
+            usuario_id,
+            request.args.get("cursor") or None,
+            current_app.config["DASHBOARD_PAGINA_TAMANHO"],
+        )
+    except ValueError:
+        abort(400)
+    return jsonify(
+        itens=[_item_lista(p, getattr(p, contraparte)) for p in procedimentos],
+        proximo_cursor=proximo_cursor,
+    )
+
+
+@main_bp.route("/api/dashboard/residente/procedimentos")
 @login_required
-def gerar_relatorio(residente_id):
-    residente = db.session.get(Residente, residente_id)
+@rota_de_leitura
+def api_procedimentos_residente():
+    """Próxima página dos procedimentos do residente (?cursor=)."""
+    if not current_user.eh_residente:
+        abort(403)
+    return _pagina_json(procedimentos_do_residente, current_user.id, "preceptor")
 
-    if not residente:
-        flash("Residente não encontrado.", "danger")
-        return redirect(url_for("main.home"))
 
-    if isinstance(current_user, Residente):
-        if current_user.id != residente_id:
+@main_bp.route("/api/dashboard/preceptor/avaliados")
+@login_required
+@rota_de_leitura
+def api_avaliados_preceptor():
+    """Próxima página do histórico de avaliações do preceptor (?cursor=)."""
+    if not current_user.eh_preceptor:
+        abort(403)
+    return _pagina_json(avaliados_do_preceptor, current_user.id, "residente")
+
+
+@main_bp.route("/api/procedimentos/<int:procedimento_id>")
+@login_required
+@rota_de_leitura
+def api_procedimento_detalhe(procedimento_id):
+    """Texto HEIPOC completo de um procedimento, para os modais."""
+    procedimento = db.session.get(
+        Procedimento,
+        procedimento_id,
+        options=[
+            joinedload(Procedimento.residente).load_only(
+                Residente.nome, Residente.supervisor_id
+            ),
+            joinedload(Procedimento.preceptor).load_only(Preceptor.nome),
+        ],
+    )
+    if not procedimento:
+        abort(404)
+    if current_user.eh_residente:
+        permitido = procedimento.residente_id == current_user.id
+    elif current_user.eh_preceptor:
+        permitido = (
+            procedimento.preceptor_id == current_user.id
+            or procedimento.residente.supervisor_id == current_user.id
+        )
+    else:
+        permitido = False
+    if not permitido:
+        abort(403)
+
+    response = jsonify(
+        id=procedimento.id,
+        nome_procedimento=procedimento.nome_procedimento,
+        data_realizacao=procedimento.data_realizacao.strftime("%d/%m/%Y"),
+        status=procedimento.status,
+        residente=procedimento.residente.nome,
+        preceptor=procedimento.preceptor.nome,
+        historia_clinica=procedimento.historia_clinica,
+        exame_fisico=procedimento.exame_fisico,
+        interpretacao_diagnostico=procedimento.interpretacao_diagnostico,
+        plano_terapeutico=procedimento.plano_terapeutico,
+        orientacao_paciente=procedimento.orientacao_paciente,
+        conhecimento_aprendizagem=procedimento.conhecimento_aprendizagem,
+        observacao_preceptor=procedimento.observacao_preceptor,
+    )
+    # O navegador guarda o detalhe e revalida pelo ETag a cada abertura do
+    # modal; sem mudança a resposta é um 304 vazio.
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _negar_acesso_relatorio(residente):
+    """Retorna um redirect se o usuário atual não pode ver o relatório."""
+    if current_user.eh_residente:
+        if current_user.id != residente.id:
             flash(
                 "Acesso negado. Você só pode acessar seu próprio relatório.", "danger"
             )
             return redirect(url_for("main.dashboard_residente"))
-    elif isinstance(current_user, Preceptor):
+    elif current_user.eh_preceptor:
         if residente.supervisor_id != current_user.id:
             flash(
                 "Acesso negado. Você só pode acessar relatórios de residentes sob sua supervisão.",
@@ -210,223 +373,227 @@ def gerar_relatorio(residente_id):
     else:
         flash("Acesso negado.", "danger")
         return redirect(url_for("main.home"))
+    return None
 
-    procedimentos_validados = (
-        Procedimento.query.filter_by(residente_id=residente.id, status="Validado")
-        .order_by(Procedimento.data_realizacao.asc())
-        .all()
-    )
 
-    from collections import Counter
-    from datetime import datetime
-
-    import pytz
+@main_bp.route("/relatorio/residente/<int:residente_id>")
+@login_required
+@rota_de_leitura
+def gerar_relatorio(residente_id):
+    residente = db.session.get(Residente, residente_id)
 
-    brasil_tz = pytz.timezone("America/Sao_Paulo")
-    data_emissao_local = datetime.now(brasil_tz)
+    if not residente:
+        flash("Residente não encontrado.", "danger")
+        return redirect(url_for("main.home"))
 
-    total_procedimentos = len(procedimentos_validados)
-    procedimentos_pendentes = Procedimento.query.filter_by(
-        residente_id=residente.id, status="Pendente"
-    ).count()
-    procedimentos_rejeitados = Procedimento.query.filter_by(
-        residente_id=residente.id, status="Rejeitado"
-    ).count()
-    total_geral = (
-        total_procedimentos + procedimentos_pendentes + procedimentos_rejeitados
-    )
+    negado = _negar_acesso_relatorio(residente)
+    if negado:
+        return negado
+
+    # Modo assíncrono: o PDF é gerado pela fila e baixado depois
+    if request.args.get("modo") == "assincrono":
+        job = fila_relatorios.enfileirar(residente, current_user)
+        return (
+            jsonify(
+                job_id=job.id,
+                status=job.status,
+                status_url=url_for("main.status_relatorio_job", job_id=job.id),
+            ),
+            202,
+        )
 
-    preceptores_stats = Counter(
-        [proc.preceptor.nome for proc in procedimentos_validados]
-    )
+    # O ETag é a impressão digital dos dados do relatório: se o navegador
+    # já tem esta versão, nem o cache em disco precisa ser lido.
+    chave = fingerprint_relatorio(residente)
+    if request.if_none_match.contains(chave):
+        response = make_response("", 304)
+        response.set_etag(chave)
+        return response
 
     try:
-        from weasyprint import CSS, HTML
-        from weasyprint.text.fonts import FontConfiguration
-
-        html_renderizado = render_template(
-            "relatorio_template.html",
-            residente=residente,
-            procedimentos=procedimentos_validados,
-            data_emissao=data_emissao_local,
-            total_procedimentos=total_procedimentos,
-            procedimentos_pendentes=procedimentos_pendentes,
-            procedimentos_rejeitados=procedimentos_rejeitados,
-            total_geral=total_geral,
-            preceptores_stats=preceptores_stats,
-        )
-
-        font_config = FontConfiguration()
-
-        css_string = """
-        @page {
-            size: A4;
-            margin: 2cm;
-            @top-center {
-                content: "Hospital de Clínicas - UFU";
-                font-size: 10px;
-                color: #666;
-            }
-            @bottom-right {
-                content: "Page " counter(page) " of " counter(pages);
-                font-size: 10px;
-                color: #666;
-            }
-        }
-        body {
-            font-family: 'DejaVu Sans', Arial, sans-serif;
-            line-height: 1.4;
-            color: #333;
-        }
-        .header-institucional {
-            text-align: center;
-            margin-bottom: 30px;
-            border-bottom: 2px solid #003366;
-            padding-bottom: 15px;
-        }
-        .header-institucional h1 {
-            color: #003366;
-            font-size: 16px;
-            margin: 5px 0;
-        }
-        .header-institucional h2 {
-            color: #0066CC;
-            font-size: 14px;
-            margin: 5px 0;
-        }
-        .titulo-principal {
-            text-align: center;
-            color: #003366;
-            font-size: 18px;
-            font-weight: bold;
-            margin: 20px 0;
-        }
-        .secao {
-            margin-bottom: 25px;
-        }
-        .secao h3 {
-            color: #0066CC;
-            font-size: 14px;
-            font-weight: bold;
-            border-bottom: 1px solid #0066CC;
-            padding-bottom: 5px;
-            margin-bottom: 15px;
-        }
-        .dados-residente {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 20px;
-        }
-        .dados-residente td {
-            padding: 8px;
-            border: 1px solid #ddd;
-        }
-        .dados-residente td:first-child {
-            font-weight: bold;
-            background-color: #f0f4f8;
-            width: 30%;
-        }
-        .estatisticas {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 20px;
-        }
-        .estatisticas th {
-            background-color: #003366;
-            color: white;
-            padding: 10px;
-            text-align: center;
-            font-weight: bold;
-        }
-        .estatisticas td {
-            padding: 8px;
-            text-align: center;
-            border: 1px solid #ddd;
-        }
-        .estatisticas tr:nth-child(even) {
-            background-color: #f8f9fa;
-        }
-        .procedimentos {
-            width: 100%;
-            border-collapse: collapse;
-            font-size: 9px;
-        }
-        .procedimentos th {
-            background-color: #003366;
-            color: white;
-            padding: 8px;
-            text-align: center;
-            font-weight: bold;
-        }
-        .procedimentos td {
-            padding: 6px;
-            border: 1px solid #ddd;
-            text-align: center;
-        }
-        .procedimentos tr:nth-child(even) {
-            background-color: #f8f9fa;
-        }
-        .observacoes {
-            text-align: justify;
-            line-height: 1.6;
-            margin: 20px 0;
-        }
-        .rodape {
-            margin-top: 30px;
-            padding-top: 15px;
-            border-top: 1px solid #ccc;
-            font-size: 8px;
-            color: #666;
-        }
-        """
-
-        html_doc = HTML(string=html_renderizado)
-        css_doc = CSS(string=css_string, font_config=font_config)
-        pdf_bytes = html_doc.write_pdf(stylesheets=[css_doc], font_config=font_config)
-
-        response = make_response(pdf_bytes)
-        response.headers["Content-Type"] = "application/pdf"
-        response.headers["Content-Disposition"] = (
-            f'attachment; filename=report_{residente.nome.replace(" ", "_").lower()}.pdf'
+        chave, caminho = obter_pdf_relatorio(residente, chave)
+
+        response = send_file(
+            caminho,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=nome_arquivo_relatorio(residente),
+            etag=chave,
+            conditional=True,
         )
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
         return response
 
     except ImportError as e:
         print(f"WeasyPrint not available: {e}")
         flash("Aviso: WeasyPrint não está instalado. Visualizando como HTML.", "info")
-        html_renderizado = render_template(
-            "relatorio_template.html",
-            residente=residente,
-            procedimentos=procedimentos_validados,
-            data_emissao=data_emissao_local,
-            total_procedimentos=total_procedimentos,
-            procedimentos_pendentes=procedimentos_pendentes,
-            procedimentos_rejeitados=procedimentos_rejeitados,
-            total_geral=total_geral,
-            preceptores_stats=preceptores_stats,
-        )
-        response = make_response(html_renderizado)
+        response = make_response(renderizar_html_relatorio(residente))
         response.headers["Content-Type"] = "text/html"
         return response
     except Exception as e:
         print(f"Error generating PDF: {e}")
         flash("Erro ao gerar PDF. Visualizando como HTML.", "warning")
-        html_renderizado = render_template(
-            "relatorio_template.html",
-            residente=residente,
-            procedimentos=procedimentos_validados,
-            data_emissao=data_emissao_local,
-            total_procedimentos=total_procedimentos,
-            procedimentos_pendentes=procedimentos_pendentes,
-            procedimentos_rejeitados=procedimentos_rejeitados,
-            total_geral=total_geral,
-            preceptores_stats=preceptores_stats,
-        )
-        response = make_response(html_renderizado)
+        response = make_response(renderizar_html_relatorio(residente))
         response.headers["Content-Type"] = "text/html"
         return response
 
 
+@main_bp.route("/relatorio/residente/<int:residente_id>/logbook.<formato>")
+@login_required
+@rota_de_leitura
+def exportar_logbook(residente_id, formato):
+    if formato not in ("csv", "xlsx"):
+        abort(404)
+    residente = db.session.get(Residente, residente_id)
+
+    if not residente:
+        flash("Residente não encontrado.", "danger")
+        return redirect(url_for("main.home"))
+
+    negado = _negar_acesso_relatorio(residente)
+    if negado:
+        return negado
+
+    if formato == "csv":
+        pedacos = gerar_csv(residente.id)
+        mimetype = "text/csv; charset=utf-8"
+    else:
+        try:
+            pedacos = gerar_xlsx(residente.id, residente.nome)
+        except ImportError as e:
+            current_app.logger.warning("XlsxWriter indisponível: %s", e)
+            flash("Aviso: XLSX indisponível no servidor. Exportando em CSV.", "info")
+            return redirect(
+                url_for(
+                    "main.exportar_logbook", residente_id=residente.id, formato="csv"
+                )
+            )
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    response = Response(stream_with_context(pedacos), mimetype=mimetype)
+    response.headers.set(
+        "Content-Disposition",
+        "attachment",
+        **content_disposition(nome_arquivo_logbook(residente, formato)),
+    )
+    return response
+
+
+@main_bp.route("/relatorio/preceptor/residentes.zip")
+@login_required
+@rota_de_leitura
+def exportar_relatorios_zip():
+    if not current_user.eh_preceptor:
+        flash("Acesso não autorizado.", "danger")
+        return redirect(url_for("main.home"))
+
+    residentes = (
+        Residente.query.filter_by(supervisor_id=current_user.id)
+        .order_by(Residente.nome)
+        .all()
+    )
+    if not residentes:
+        flash("Nenhum residente sob sua supervisão.", "info")
+        return redirect(url_for("main.dashboard_preceptor"))
+
+    response = Response(
+        stream_with_context(gerar_zip_relatorios(residentes)),
+        mimetype="application/zip",
+    )
+    response.headers["Content-Disposition"] = (
+        "attachment; filename=relatorios_residentes.zip"
+    )
+    return response
+
+
+@main_bp.route("/api/estatisticas")
+@login_required
+@rota_de_leitura
+def api_estatisticas():
+    """Estatísticas do usuário atual; preceptores podem pedir ?residente_id=."""
+    residente_id = request.args.get("residente_id", type=int)
+    if current_user.eh_residente:
+        if residente_id not in (None, current_user.id):
+            abort(403)
+        estatisticas = estatisticas_procedimentos(residente_id=current_user.id)
+    elif current_user.eh_preceptor:
+        if residente_id is None:
+            estatisticas = estatisticas_procedimentos(preceptor_id=current_user.id)
+        else:
+            residente = db.session.get(Residente, residente_id)
+            if not residente:
+                abort(404)
+            if residente.supervisor_id != current_user.id:
+                abort(403)
+            estatisticas = estatisticas_procedimentos(residente_id=residente_id)
+    else:
+        abort(403)
+    return jsonify(estatisticas.como_dict())
+
+
+@main_bp.route("/api/procedimentos/busca")
+@login_required
+@rota_de_leitura
+def api_busca_procedimentos():
+    """Busca textual nos procedimentos visíveis ao usuário: ?q=&pagina=."""
+    pagina = max(request.args.get("pagina", 1, type=int), 1)
+    por_pagina = min(
+        max(request.args.get("por_pagina", 20, type=int), 1),
+        current_app.config["BUSCA_MAX_POR_PAGINA"],
+    )
+    itens, total = buscar(request.args.get("q", ""), current_user, pagina, por_pagina)
+    return jsonify(
+        itens=itens,
+        total=total,
+        pagina=pagina,
+        por_pagina=por_pagina,
+        paginas=(total + por_pagina - 1) // por_pagina,
+    )
+
+
+def _obter_job_do_usuario(job_id):
+    job = db.session.get(RelatorioJob, job_id)
+    if not job:
+        abort(404)
+    if job.solicitante_id != current_user.get_id():
+        abort(403)
+    return job
+
+
+@main_bp.route("/relatorio/job/<job_id>")
+@login_required
+def status_relatorio_job(job_id):
+    job = _obter_job_do_usuario(job_id)
+    if job.status == "Pendente":
+        if fila_relatorios.expirar_pendente(job.id):
+            db.session.refresh(job)
+        else:
+            # Após um reinício, a consulta de status religa o pool e retoma o job
+            fila_relatorios.garantir_execucao()
+
+    dados = {"job_id": job.id, "status": job.status}
+    if job.status == "Concluido":
+        dados["download_url"] = url_for("main.download_relatorio_job", job_id=job.id)
+    elif job.status == "Erro":
+        dados["erro"] = job.erro
+    return jsonify(dados)
+
+
+@main_bp.route("/relatorio/job/<job_id>/download")
+@login_required
+def download_relatorio_job(job_id):
+    job = _obter_job_do_usuario(job_id)
+    if job.status != "Concluido" or not job.arquivo or not os.path.exists(job.arquivo):
+        return jsonify(job_id=job.id, status=job.status), 409
+    return send_file(
+        job.arquivo,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=nome_arquivo_relatorio(job.residente),
+    )
+
+
 @main_bp.route("/verificar-crm", methods=["GET", "POST"])
 def verificar_crm():
     if current_user.is_authenticated:
@@ -436,51 +603,31 @@ def verificar_crm():
         uf = form.uf.data
         crm = form.crm.data
 
-        url = "https://portal.cfm.org.br/api_rest_php/api/v1/medicos/buscar_medicos"
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "medico": {
-                "crmMedico": crm,
-                "ufMedico": uf,
-            },
-            "page": 1,
-            "pageNumber": 1,
-            "pageSize": 10,
-        }
-
         try:
-            response = requests.post(url, json=[payload], headers=headers, timeout=10)
-            response.raise_for_status()
-            resultado = response.json()
-        except requests.exceptions.RequestException as e:
+            resultado = cliente_crm.consultar(uf, crm)
+        except ErroConsultaCRM as e:
             flash(f"Erro ao acessar API externa: {str(e)}", "danger")
             return render_template(
                 "verificar_crm.html", title="Etapa 1: Verificação do CRM", form=form
             )
 
-        if resultado and resultado.get("dados"):
-            dados_medico = resultado["dados"][0]
-            quantidade_encontrada = int(dados_medico.get("COUNT", 0))
-
-            if quantidade_encontrada == 1:
-                situacao = dados_medico.get("SITUACAO")
-                if situacao == "Regular":
-                    session["crm_verificado"] = {
-                        "uf": uf,
-                        "crm": crm,
-                    }
-                    flash(
-                        "CRM está regular! Por favor, complete seu cadastro.",
-                        "success",
-                    )
-                    return redirect(url_for("main.selecionar_perfil"))
-                else:
-                    flash(
-                        f"CRM encontrado, mas sua situação é '{situacao}'. Apenas CRMs regulares podem se cadastrar.",
-                        "danger",
-                    )
+        if resultado.encontrado:
+            situacao = resultado.situacao
+            if situacao == "Regular":
+                session["crm_verificado"] = {
+                    "uf": uf,
+                    "crm": crm,
+                }
+                flash(
+                    "CRM está regular! Por favor, complete seu cadastro.",
+                    "success",
+                )
+                return redirect(url_for("main.selecionar_perfil"))
             else:
-                flash("CRM não encontrado ou inválido. Tente novamente.", "danger")
+                flash(
+                    f"CRM encontrado, mas sua situação é '{situacao}'. Apenas CRMs regulares podem se cadastrar.",
+                    "danger",
+                )
         else:
             flash("CRM não encontrado ou inválido. Tente novamente.", "danger")
 
@@ -514,22 +661,24 @@ def registrar():
         form.nome.data = session["crm_verificado"].get("nome", "")
 
     if form.validate_on_submit():
-        if Residente.query.filter_by(email=form.email.data).first():
+        conflitos = conflitos_cadastro("residente", form.email.data, form.cpf.data)
+        if "email" in conflitos:
             flash("Este email já está em uso.", "danger")
-        elif Residente.query.filter_by(cpf=form.cpf.data).first():
+        elif "cpf" in conflitos:
             flash("Este CPF já está cadastrado.", "danger")
         else:
             crm_info = session.get("crm_verificado", {})
 
-            universidade = Universidade.query.filter_by(
-                nome=form.instituicao.data
-            ).first()
-            hospital = Hospital.query.filter_by(
-                nome="Hospital de Clínicas de Uberlândia (HC-UFU)"
-            ).first()
+            referencias = registro_referencias.obter()
+            universidade = referencias.universidades.por_nome.get(
+                form.instituicao.data
+            )
+            hospital = referencias.hospitais.por_nome.get(
+                "Hospital de Clínicas de Uberlândia (HC-UFU)"
+            )
 
             if not universidade:
-                universidade = Universidade.query.first()
+                universidade = next(iter(referencias.universidades.itens), None)
                 if not universidade:
                     flash("Erro: Nenhuma universidade encontrada no sistema.", "danger")
                     return render_template(
@@ -539,7 +688,7 @@ def registrar():
                     )
 
             if not hospital:
-                hospital = Hospital.query.first()
+                hospital = next(iter(referencias.hospitais.itens), None)
                 if not hospital:
                     flash("Erro: Nenhum hospital encontrado no sistema.", "danger")
                     return render_template(
@@ -590,15 +739,17 @@ def registrar_preceptor():
         form.nome.data = session["crm_verificado"].get("nome", "")
 
     if form.validate_on_submit():
-        if Preceptor.query.filter_by(email=form.email.data).first():
+        conflitos = conflitos_cadastro("preceptor", form.email.data, form.cpf.data)
+        if "email" in conflitos:
             flash("Este email já está em uso. Escolha outro.", "danger")
-        elif Preceptor.query.filter_by(cpf=form.cpf.data).first():
+        elif "cpf" in conflitos:
             flash("Este CPF já está cadastrado.", "danger")
         else:
-            universidade = Universidade.query.filter_by(
-                nome=form.instituicao.data
-            ).first()
-            hospital = Hospital.query.filter_by(nome=form.hospital.data).first()
+            referencias = registro_referencias.obter()
+            universidade = referencias.universidades.por_nome.get(
+                form.instituicao.data
+            )
+            hospital = referencias.hospitais.por_nome.get(form.hospital.data)
 
             if not universidade or not hospital:
                 flash(
@@ -0,0 +1,207 @@
+# app/search.py
+"""Busca textual nos procedimentos (nome e campos HEIPOC).
+
+No SQLite, a busca usa a tabela virtual FTS5 ``procedimento_fts``, de
+conteúdo externo: ela guarda só o índice invertido e lê o texto da própria
+tabela ``procedimento``. Triggers no banco mantêm o índice em dia a cada
+INSERT, DELETE e UPDATE dos campos de texto. Mudanças só de status (as
+avaliações) não mexem no índice. Os resultados vêm ordenados por relevância
+(bm25, com peso maior para o nome do procedimento).
+
+A tabela e os triggers são criados junto com a tabela ``procedimento``
+(``create_all``) e, em bancos existentes, pela migração 4.
+``flask busca reconstruir`` refaz o índice a partir dos dados.
+
+Em outros bancos, ou num SQLite sem FTS5, a busca cai para ``ILIKE`` em
+todos os campos, sem ranking (mais recentes primeiro).
+"""
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, inspect
+
+from app import db
+
+TABELA_FTS = "procedimento_fts"
+CAMPOS = [
+    "nome_procedimento",
+    "historia_clinica",
+    "exame_fisico",
+    "interpretacao_diagnostico",
+    "plano_terapeutico",
+    "orientacao_paciente",
+    "conhecimento_aprendizagem",
+]
+# Pesos do bm25, na ordem de CAMPOS
+PESOS = [4.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0]
+MAX_TERMOS = 10
+
+# Marcadores do snippet; viram <mark> depois de escapar o texto
+_INICIO, _FIM = "\x02", "\x03"
+
+_colunas = ", ".join(CAMPOS)
+_novos = ", ".join(f"new.{campo}" for campo in CAMPOS)
+_antigos = ", ".join(f"old.{campo}" for campo in CAMPOS)
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+    f"{_colunas}, content='procedimento', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON procedimento "
+    f"BEGIN INSERT INTO {TABELA_FTS}(rowid, {_colunas}) "
+    f"VALUES (new.id, {_novos}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON procedimento "
+    f"BEGIN INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {_colunas}) "
+    f"VALUES ('delete', old.id, {_antigos}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF {_colunas} "
+    f"ON procedimento BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {_colunas}) "
+    f"VALUES ('delete', old.id, {_antigos}); "
+    f"INSERT INTO {TABELA_FTS}(rowid, {_colunas}) VALUES (new.id, {_novos}); END",
+]
+
+_disponivel = {}
+
+
+def fts5_suportado(conn):
+    """Se a conexão é SQLite compilado com FTS5."""
+    if conn.dialect.name != "sqlite":
+        return False
+    opcoes = conn.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in opcoes
+
+
+def criar_indice(conn):
+    """Cria a tabela FTS5 e os triggers, se ainda não existirem."""
+    for comando in _DDL:
+        conn.exec_driver_sql(comando)
+
+
+def reconstruir(conn):
+    """Refaz o índice a partir da tabela ``procedimento``."""
+    conn.exec_driver_sql(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def _criar_com_tabela(ddl, target, bind, **kw):
+    return fts5_suportado(bind)
+
+
+_DDL_COM_TABELA = [
+    DDL(comando).execute_if(callable_=_criar_com_tabela) for comando in _DDL
+]
+
+
+def registrar_eventos():
+    from app.models import Procedimento
+
+    tabela = Procedimento.__table__
+    for ddl in _DDL_COM_TABELA:
+        if not event.contains(tabela, "after_create", ddl):
+            event.listen(tabela, "after_create", ddl)
+
+
+def indice_disponivel():
+    engine = db.engine
+    if engine not in _disponivel:
+        _disponivel[engine] = engine.dialect.name == "sqlite" and inspect(
+            engine
+        ).has_table(TABELA_FTS)
+    return _disponivel[engine]
+
+
+def termos_da_consulta(texto):
+    """Palavras de ``texto``, sem a sintaxe do FTS5 (aspas, operadores...)."""
+    return re.findall(r"\w+", (texto or "").lower())[:MAX_TERMOS]
+
+
+def _escopo(usuario):
+    from app.models import Procedimento, Residente
+
+    if usuario.eh_residente:
+        return Procedimento.residente_id == usuario.id
+    # Preceptor: o que ele avalia e tudo dos residentes que supervisiona
+    supervisionados = db.select(Residente.id).where(
+        Residente.supervisor_id == usuario.id
+    )
+    return db.or_(
+        Procedimento.preceptor_id == usuario.id,
+        Procedimento.residente_id.in_(supervisionados),
+    )
+
+
+def _trecho(texto):
+    if texto is None:
+        return None
+    return Markup(
+        str(escape(texto)).replace(_INICIO, "<mark>").replace(_FIM, "</mark>")
+    )
+
+
+def buscar(texto, usuario, pagina=1, por_pagina=20):
+    """Procedimentos visíveis a ``usuario`` que contêm todas as palavras.
+
+    Retorna (itens, total); cada item tem id, nome_procedimento,
+    data_realizacao, status, residente e trecho (HTML com <mark>).
+    """
+    from app.models import Procedimento, Residente
+
+    termos = termos_da_consulta(texto)
+    if not termos:
+        return [], 0
+
+    colunas = [
+        Procedimento.id,
+        Procedimento.nome_procedimento,
+        Procedimento.data_realizacao,
+        Procedimento.status,
+        Residente.nome.label("residente"),
+    ]
+    if indice_disponivel():
+        fts = db.table(TABELA_FTS, db.column("rowid"))
+        tabela_fts = db.literal_column(TABELA_FTS)
+        consulta_fts = " ".join(f'"{termo}"*' for termo in termos)
+        base = (
+            db.select(*colunas)
+            .select_from(fts)
+            .join(Procedimento, Procedimento.id == fts.c.rowid)
+            .where(tabela_fts.op("MATCH")(consulta_fts))
+        )
+        trecho = db.func.snippet(tabela_fts, -1, _INICIO, _FIM, "…", 16)
+        ordem = [db.func.bm25(tabela_fts, *PESOS), Procedimento.id.desc()]
+    else:
+        base = db.select(*colunas).where(
+            *[
+                db.or_(
+                    *[
+                        getattr(Procedimento, campo).icontains(termo, autoescape=True)
+                        for campo in CAMPOS
+                    ]
+                )
+                for termo in termos
+            ]
+        )
+        trecho = db.null()
+        ordem = [Procedimento.data_realizacao.desc(), Procedimento.id.desc()]
+
+    base = base.join(Residente, Procedimento.residente_id == Residente.id).where(
+        _escopo(usuario)
+    )
+    total = db.session.execute(base.with_only_columns(db.func.count())).scalar()
+    linhas = db.session.execute(
+        base.add_columns(trecho.label("trecho"))
+        .order_by(*ordem)
+        .limit(por_pagina)
+        .offset((pagina - 1) * por_pagina)
+    ).all()
+    itens = [
+        {
+            "id": linha.id,
+            "nome_procedimento": linha.nome_procedimento,
+            "data_realizacao": linha.data_realizacao.isoformat(),
+            "status": linha.status,
+            "residente": linha.residente,
+            "trecho": _trecho(linha.trecho),
+        }
+        for linha in linhas
+    ]
+    return itens, total
@@ -0,0 +1,69 @@
+# app/startup_profile.py
+"""Perfil do tempo de inicialização da aplicação.
+
+Com ``PERFIL_INICIALIZACAO`` ligado, ``create_app`` mede cada etapa da
+inicialização (extensões, blueprints, pré-aquecimento...) e registra no log
+quanto tempo cada uma levou e quantos módulos novos importou.
+
+``flask inicializacao perfil`` sobe a aplicação num processo limpo com
+``python -X importtime`` e mostra, além das etapas, os imports de primeiro
+nível mais caros, que é onde costuma estar o grosso do tempo de boot de um
+worker novo.
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+
+class PerfilInicializacao:
+    def __init__(self, ativo=True):
+        self.ativo = ativo
+        self.etapas = []
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nome):
+        if not self.ativo:
+            yield
+            return
+        inicio = time.perf_counter()
+        modulos = len(sys.modules)
+        try:
+            yield
+        finally:
+            self.etapas.append(
+                (nome, time.perf_counter() - inicio, len(sys.modules) - modulos)
+            )
+
+    @property
+    def total(self):
+        return time.perf_counter() - self._inicio
+
+    def relatorio(self):
+        linhas = [f"{'etapa':<36} {'ms':>9} {'módulos':>8}"]
+        for nome, segundos, modulos in self.etapas:
+            linhas.append(f"{nome:<36} {segundos * 1000:9.1f} {modulos:8d}")
+        linhas.append(f"{'total do create_app':<36} {self.total * 1000:9.1f}")
+        return "\n".join(linhas)
+
+
+def resumir_importtime(saida, limite=20):
+    """Imports de primeiro nível mais caros na saída de ``-X importtime``.
+
+    Retorna (total em µs, [(módulo, µs acumulados)]) ordenados do mais caro.
+    """
+    imports = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:"):
+            continue
+        partes = linha[len("import time:") :].split("|")
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # cabeçalho
+        modulo = partes[2]
+        # Imports de primeiro nível têm só um espaço antes do nome
+        if modulo.startswith("  "):
+            continue
+        imports.append((modulo.strip(), int(partes[1])))
+    total = sum(cumulativo for _, cumulativo in imports)
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return total, imports[:limite]
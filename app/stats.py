@@ -0,0 +1,80 @@
+# app/stats.py
+"""Estatísticas dos procedimentos de um residente ou de um preceptor.
+
+Tudo sai de uma única consulta agrupada por status, contraparte (o
+preceptor, quando se olha para um residente, e vice-versa) e mês; os totais
+por status, por contraparte e por mês são somados a partir dela.
+"""
+from collections import Counter, defaultdict
+
+from app import db
+from app.models import Preceptor, Procedimento, Residente
+
+
+class EstatisticasProcedimentos:
+    def __init__(self):
+        self.por_status = Counter()
+        # status -> Counter(nome da contraparte -> quantidade)
+        self.por_contraparte = defaultdict(Counter)
+        # "AAAA-MM" -> Counter(status -> quantidade)
+        self.por_mes = defaultdict(Counter)
+
+    @property
+    def total(self):
+        return sum(self.por_status.values())
+
+    def contraparte(self, status=None):
+        """Quantidade por contraparte, opcionalmente só de um status."""
+        if status is not None:
+            return Counter(self.por_contraparte.get(status, {}))
+        total = Counter()
+        for contagem in self.por_contraparte.values():
+            total.update(contagem)
+        return total
+
+    def como_dict(self):
+        return {
+            "total": self.total,
+            "por_status": dict(self.por_status),
+            "por_contraparte": {
+                status: dict(contagem)
+                for status, contagem in self.por_contraparte.items()
+            },
+            "por_mes": {
+                mes: dict(contagem) for mes, contagem in sorted(self.por_mes.items())
+            },
+        }
+
+
+def estatisticas_procedimentos(residente_id=None, preceptor_id=None):
+    """Estatísticas de um residente ou de um preceptor (informe só um deles)."""
+    if (residente_id is None) == (preceptor_id is None):
+        raise ValueError("Informe residente_id ou preceptor_id.")
+
+    if residente_id is not None:
+        contraparte, filtro = Preceptor, Procedimento.residente_id == residente_id
+        juncao = Procedimento.preceptor_id == Preceptor.id
+    else:
+        contraparte, filtro = Residente, Procedimento.preceptor_id == preceptor_id
+        juncao = Procedimento.residente_id == Residente.id
+
+    ano = db.extract("year", Procedimento.data_realizacao)
+    mes = db.extract("month", Procedimento.data_realizacao)
+    linhas = (
+        db.session.query(
+            Procedimento.status, contraparte.nome, ano, mes, db.func.count()
+        )
+        .join(contraparte, juncao)
+        .filter(filtro)
+        .group_by(Procedimento.status, contraparte.id, contraparte.nome, ano, mes)
+        .all()
+    )
+
+    estatisticas = EstatisticasProcedimentos()
+    for status, nome, ano_valor, mes_valor, quantidade in linhas:
+        estatisticas.por_status[status] += quantidade
+        estatisticas.por_contraparte[status][nome] += quantidade
+        estatisticas.por_mes[f"{int(ano_valor):04d}-{int(mes_valor):02d}"][
+            status
+        ] += quantidade
+    return estatisticas
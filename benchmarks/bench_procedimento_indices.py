@@ -0,0 +1,215 @@
+# benchmarks/bench_procedimento_indices.py
+"""Benchmark dos índices compostos de Procedimento.
+
+Cria um banco SQLite temporário com muitos procedimentos, mede as consultas
+quentes dos dashboards e do relatório sem nenhum índice secundário em
+procedimento e residente, aplica só a migração 1 (a dos índices compostos,
+como seria feito num residentes.db antigo) e mede de novo. Para cada
+consulta mostra o tempo mediano e o plano de execução (EXPLAIN QUERY PLAN).
+
+    python benchmarks/bench_procedimento_indices.py --procedimentos 150000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+# Tabelas das consultas medidas; todos os índices secundários delas saem
+TABELAS = ["procedimento", "residente"]
+
+
+def indices_secundarios(conn, tabela):
+    """Índices criados com CREATE INDEX (os de PK e UNIQUE ficam de fora)."""
+    return [
+        linha[1]
+        for linha in conn.exec_driver_sql(f"PRAGMA index_list({tabela})")
+        if linha[3] == "c"
+    ]
+
+
+def popular(db, total, n_preceptores, n_residentes):
+    from app.models import (
+        Especialidade,
+        Hospital,
+        Preceptor,
+        Procedimento,
+        Residente,
+        Universidade,
+    )
+
+    universidade = Universidade(nome="Universidade Federal de Uberlândia", uf="MG")
+    db.session.add(universidade)
+    db.session.flush()
+    hospital = Hospital(nome="HC-UFU", universidade_id=universidade.id)
+    especialidade = Especialidade(nome="Clínica Médica")
+    db.session.add_all([hospital, especialidade])
+    db.session.flush()
+
+    comuns = dict(
+        celular="0",
+        crm_uf="MG",
+        crm_numero="0",
+        universidade_id=universidade.id,
+        hospital_id=hospital.id,
+        especialidade_id=especialidade.id,
+    )
+    db.session.execute(
+        db.insert(Preceptor),
+        [
+            dict(comuns, nome=f"Preceptor {i}", email=f"p{i}@bench", cpf=f"p{i}")
+            for i in range(n_preceptores)
+        ],
+    )
+    db.session.execute(
+        db.insert(Residente),
+        [
+            dict(
+                comuns,
+                nome=f"Residente {i}",
+                email=f"r{i}@bench",
+                cpf=f"r{i}",
+                supervisor_id=random.randint(1, n_preceptores),
+                ano_ingresso=2024,
+                categoria="R1",
+            )
+            for i in range(n_residentes)
+        ],
+    )
+
+    inicio = date(2022, 1, 1)
+    status = ["Pendente"] * 2 + ["Validado"] * 7 + ["Rejeitado"]
+    texto = "Lorem ipsum dolor sit amet. " * 4
+    lote = []
+    for i in range(total):
+        lote.append(
+            dict(
+                nome_procedimento=f"Procedimento {i % 300}",
+                data_realizacao=inicio + timedelta(days=random.randint(0, 1000)),
+                historia_clinica=texto,
+                exame_fisico=texto,
+                interpretacao_diagnostico=texto,
+                plano_terapeutico=texto,
+                orientacao_paciente=texto,
+                conhecimento_aprendizagem=texto,
+                status=random.choice(status),
+                residente_id=random.randint(1, n_residentes),
+                preceptor_id=random.randint(1, n_preceptores),
+            )
+        )
+        if len(lote) == 10000:
+            db.session.execute(db.insert(Procedimento), lote)
+            lote = []
+    if lote:
+        db.session.execute(db.insert(Procedimento), lote)
+    db.session.commit()
+
+
+def consultas(db, n_preceptores, n_residentes):
+    from app.models import Procedimento, Residente
+
+    preceptor_id = random.randint(1, n_preceptores)
+    residente_id = random.randint(1, n_residentes)
+    return {
+        "pendentes do preceptor": Procedimento.query.filter_by(
+            preceptor_id=preceptor_id, status="Pendente"
+        ).order_by(Procedimento.data_realizacao.asc()),
+        "avaliados do preceptor": Procedimento.query.filter(
+            Procedimento.preceptor_id == preceptor_id,
+            Procedimento.status != "Pendente",
+        ).order_by(Procedimento.data_realizacao.desc()),
+        "validados do residente": Procedimento.query.filter_by(
+            residente_id=residente_id, status="Validado"
+        ).order_by(Procedimento.data_realizacao.asc()),
+        "contagem por status": db.session.query(
+            Procedimento.status, db.func.count()
+        )
+        .filter(Procedimento.residente_id == residente_id)
+        .group_by(Procedimento.status),
+        "residentes supervisionados": Residente.query.filter_by(
+            supervisor_id=preceptor_id
+        ),
+    }
+
+
+def medir(db, titulo, n_preceptores, n_residentes, repeticoes):
+    print(f"\n== {titulo} ==")
+    random.seed(42)
+    for nome, query in consultas(db, n_preceptores, n_residentes).items():
+        tempos = []
+        for _ in range(repeticoes):
+            db.session.expunge_all()
+            inicio = time.perf_counter()
+            query.all()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        sql = str(
+            query.statement.compile(
+                dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+        with db.engine.connect() as conn:
+            plano = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+        print(f"{nome:<28} {statistics.median(tempos):9.2f} ms")
+        for linha in plano:
+            print(f"    {linha[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procedimentos", type=int, default=120000)
+    parser.add_argument("--preceptores", type=int, default=60)
+    parser.add_argument("--residentes", type=int, default=400)
+    parser.add_argument("--repeticoes", type=int, default=15)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="bench_indices_")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(diretorio, "bench.db")
+        PDF_AQUECER_NO_BOOT = False
+
+    from app import create_app, db
+    from app.migrations import MIGRACOES, aplicar_migracoes
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        # O boot não cria o schema (VERIFICAR_SCHEMA_NO_BOOT)
+        aplicar_migracoes()
+        random.seed(1)
+        inicio = time.perf_counter()
+        popular(db, args.procedimentos, args.preceptores, args.residentes)
+        print(
+            f"{args.procedimentos} procedimentos inseridos em "
+            f"{time.perf_counter() - inicio:.1f} s ({diretorio})"
+        )
+
+        # Simula um banco antigo: nenhum índice além das chaves primárias e
+        # das restrições UNIQUE, inclusive os da paginação (migração 5)
+        with db.engine.begin() as conn:
+            for tabela in TABELAS:
+                for indice in indices_secundarios(conn, tabela):
+                    conn.exec_driver_sql(f"DROP INDEX {indice}")
+            conn.exec_driver_sql("ANALYZE")
+        medir(db, "sem índices", args.preceptores, args.residentes, args.repeticoes)
+
+        # Só a migração 1: as outras (busca, descrições...) não entram no tempo
+        (migracao,) = [m for m in MIGRACOES if m.versao == 1]
+        inicio = time.perf_counter()
+        with db.engine.begin() as conn:
+            migracao.aplicar(conn)
+            conn.exec_driver_sql("ANALYZE")
+        print(f"\nMigração 1 aplicada em {time.perf_counter() - inicio:.1f} s")
+        medir(db, "com índices", args.preceptores, args.residentes, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
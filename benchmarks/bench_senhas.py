@@ -0,0 +1,132 @@
+# benchmarks/bench_senhas.py
+"""Benchmark de login sob cada política de hash de senha.
+
+Para cada valor de ``SENHA_HASH_METODO`` cria um banco SQLite temporário com
+um preceptor e mede quantos logins (``accounts.autenticar``: busca da conta
++ verificação da senha) um processo faz por segundo. Com ``--processos N``
+roda N processos ao mesmo tempo, como N workers do gunicorn numa rajada de
+logins, e mostra o total e a média por núcleo ocupado.
+
+    python benchmarks/bench_senhas.py --processos 2 \\
+        --metodo pbkdf2:sha256:600000 --metodo scrypt:16384:8:1
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+METODOS = [
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:260000",
+    "scrypt:32768:8:1",
+    "scrypt:16384:8:1",
+]
+EMAIL = "bench@example.com"
+SENHA = "senha-do-benchmark"
+
+
+def criar_config(caminho, metodo):
+    return type(
+        "BenchConfig",
+        (Config,),
+        {
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + caminho,
+            "SENHA_HASH_METODO": metodo,
+            "PDF_AQUECER_NO_BOOT": False,
+            "EMAIL_OUTBOX_THREAD": False,
+        },
+    )
+
+
+def popular(db):
+    from app.models import Especialidade, Hospital, Preceptor, Universidade
+
+    universidade = Universidade(nome="Universidade do Benchmark", uf="MG")
+    especialidade = Especialidade(nome="Clínica Médica")
+    db.session.add_all([universidade, especialidade])
+    db.session.flush()
+    hospital = Hospital(nome="Hospital do Benchmark", universidade_id=universidade.id)
+    db.session.add(hospital)
+    db.session.flush()
+    preceptor = Preceptor(
+        nome="Preceptor Benchmark",
+        email=EMAIL,
+        celular="0",
+        cpf="0",
+        crm_uf="MG",
+        crm_numero="0",
+        universidade_id=universidade.id,
+        hospital_id=hospital.id,
+        especialidade_id=especialidade.id,
+    )
+    preceptor.set_senha(SENHA)
+    db.session.add(preceptor)
+    db.session.commit()
+
+
+def _logar(caminho, metodo, inicio, segundos):
+    from app import create_app, db
+    from app.accounts import autenticar
+
+    app = create_app(criar_config(caminho, metodo))
+    logins = 0
+    with app.app_context():
+        while time.time() < inicio:
+            time.sleep(0.01)
+        fim = inicio + segundos
+        while time.time() < fim:
+            if autenticar(EMAIL, SENHA) is None:
+                raise RuntimeError("login do benchmark falhou")
+            db.session.rollback()
+            logins += 1
+    return logins
+
+
+def rodar(metodo, args):
+    from app import create_app, db
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix="bench_senhas_"), "bench.db")
+    app = create_app(criar_config(caminho, metodo))
+    with app.app_context():
+        db.create_all()
+        popular(db)
+        db.engine.dispose()
+
+    contexto = multiprocessing.get_context("spawn")
+    # Todos começam juntos, depois que os processos terminaram de subir
+    inicio = time.time() + 3 + 0.5 * args.processos
+    with contexto.Pool(args.processos) as pool:
+        logins = pool.starmap(
+            _logar,
+            [(caminho, metodo, inicio, args.segundos)] * args.processos,
+        )
+    total = sum(logins) / args.segundos
+    nucleos = min(args.processos, os.cpu_count() or 1)
+    print(f"{metodo:<28} {total:10.1f} {total / nucleos:14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--metodo",
+        action="append",
+        help="política a medir (pode repetir); padrão: %s" % ", ".join(METODOS),
+    )
+    parser.add_argument("--processos", type=int, default=1)
+    parser.add_argument("--segundos", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.processos} processo(s), {os.cpu_count()} núcleos na máquina\n")
+    print(f"{'política':<28} {'logins/s':>10} {'por núcleo':>14}")
+    for metodo in args.metodo or METODOS:
+        rodar(metodo, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/bench_sqlite_concorrencia.py
+"""Benchmark de concorrência de leitura e escrita no SQLite.
+
+Simula vários workers do gunicorn usando o mesmo residentes.db: processos
+leitores repetem as consultas dos dashboards e processos escritores fazem o
+que o POST de avaliação faz (lê um procedimento, muda o status e dá
+commit). Roda duas vezes, cada uma num banco novo: com os PRAGMAs padrão do
+SQLite e com os PRAGMAs de ``Config`` (app/database.py). Para cada rodada
+mostra operações por segundo e quantas falharam com "database is locked".
+
+    python benchmarks/bench_sqlite_concorrencia.py --leitores 6 --escritores 3
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config  # noqa: E402
+
+SEM_AJUSTES = {
+    "SQLITE_JOURNAL_MODE": None,
+    "SQLITE_SYNCHRONOUS": None,
+    "SQLITE_BUSY_TIMEOUT": None,
+    "SQLITE_MMAP_SIZE": None,
+    "SQLITE_CACHE_SIZE": None,
+}
+
+
+def criar_config(caminho, ajustado):
+    atributos = {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + caminho,
+        "PDF_AQUECER_NO_BOOT": False,
+        "EMAIL_OUTBOX_THREAD": False,
+    }
+    if not ajustado:
+        atributos.update(SEM_AJUSTES)
+    return type("BenchConfig", (Config,), atributos)
+
+
+def _trabalhar(papel, caminho, ajustado, inicio, segundos, n_preceptores, total):
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app, db
+    from app.models import Procedimento
+
+    app = create_app(criar_config(caminho, ajustado))
+    random.seed(os.getpid())
+    operacoes = travados = 0
+    with app.app_context():
+        while time.time() < inicio:
+            time.sleep(0.01)
+        fim = inicio + segundos
+        while time.time() < fim:
+            try:
+                if papel == "leitor":
+                    preceptor_id = random.randint(1, n_preceptores)
+                    Procedimento.query.filter_by(
+                        preceptor_id=preceptor_id, status="Pendente"
+                    ).order_by(Procedimento.data_realizacao.asc()).all()
+                    db.session.query(Procedimento.status, db.func.count()).filter(
+                        Procedimento.preceptor_id == preceptor_id
+                    ).group_by(Procedimento.status).all()
+                    db.session.rollback()
+                else:
+                    procedimento = db.session.get(
+                        Procedimento, random.randint(1, total)
+                    )
+                    procedimento.status = random.choice(["Validado", "Rejeitado"])
+                    procedimento.observacao_preceptor = f"bench {time.time()}"
+                    db.session.commit()
+                operacoes += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if "locked" not in str(e):
+                    raise
+                travados += 1
+            db.session.expunge_all()
+    return papel, operacoes, travados
+
+
+def rodar(titulo, ajustado, args):
+    from app import create_app, db
+    from app.migrations import aplicar_migracoes
+    from bench_procedimento_indices import popular
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix="bench_sqlite_"), "bench.db")
+    app = create_app(criar_config(caminho, ajustado))
+    with app.app_context():
+        # O boot não cria o schema (VERIFICAR_SCHEMA_NO_BOOT)
+        aplicar_migracoes()
+        random.seed(1)
+        popular(db, args.procedimentos, args.preceptores, args.residentes)
+        with db.engine.connect() as conn:
+            modo = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        db.engine.dispose()
+
+    contexto = multiprocessing.get_context("spawn")
+    papeis = ["leitor"] * args.leitores + ["escritor"] * args.escritores
+    # Todos começam juntos, depois que os processos terminaram de subir
+    inicio = time.time() + 3 + 0.5 * len(papeis)
+    with contexto.Pool(len(papeis)) as pool:
+        resultados = pool.starmap(
+            _trabalhar,
+            [
+                (
+                    papel,
+                    caminho,
+                    ajustado,
+                    inicio,
+                    args.segundos,
+                    args.preceptores,
+                    args.procedimentos,
+                )
+                for papel in papeis
+            ],
+        )
+
+    print(f"\n== {titulo} (journal_mode={modo}) ==")
+    for papel in ("leitor", "escritor"):
+        operacoes = sum(r[1] for r in resultados if r[0] == papel)
+        travados = sum(r[2] for r in resultados if r[0] == papel)
+        print(
+            f"{papel + 'es':<11} {operacoes / args.segundos:9.1f} op/s"
+            f"   {travados:6d} \"database is locked\""
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leitores", type=int, default=4)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--procedimentos", type=int, default=20000)
+    parser.add_argument("--preceptores", type=int, default=60)
+    parser.add_argument("--residentes", type=int, default=400)
+    args = parser.parse_args()
+
+    rodar("PRAGMAs padrão do SQLite", False, args)
+    rodar("PRAGMAs de Config", True, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,14 +9,109 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, ".env"))
 
 
+def _normalizar_url(url):
+    # Alguns provedores ainda usam o esquema antigo "postgres://"
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def _url_do_banco():
+    """DATABASE_URL (ex.: PostgreSQL) ou o residentes.db local."""
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        # IMPORTANTE: Força o uso do residentes.db na pasta RAIZ, nunca na pasta instance
+        return "sqlite:///" + os.path.join(basedir, "residentes.db")
+    return _normalizar_url(url)
+
+
+def _binds():
+    """Bind "leitura" (réplica) quando DATABASE_READ_URL está definido."""
+    url = os.environ.get("DATABASE_READ_URL")
+    return {"leitura": _normalizar_url(url)} if url else {}
+
+
 class Config:
     SECRET_KEY = (
         os.environ.get("SECRET_KEY") or "uma-chave-secreta-muito-dificil-de-adivinhar"
     )
 
-    # IMPORTANTE: Força o uso do residentes.db na pasta RAIZ, nunca na pasta instance
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(basedir, "residentes.db")
+    SQLALCHEMY_DATABASE_URI = _url_do_banco()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Banco somente leitura para as views de leitura (app/read_routing.py)
+    SQLALCHEMY_BINDS = _binds()
+    # Segundos após uma escrita em que o usuário continua lendo do principal
+    LEITURA_JANELA_POS_ESCRITA = int(os.environ.get("LEITURA_JANELA_POS_ESCRITA") or 5)
+
+    # Cria tabelas faltando e confere migrações a cada boot. Desligado, o
+    # schema é responsabilidade do deploy: rode `flask db upgrade` antes de
+    # subir a aplicação (inclusive num checkout novo)
+    VERIFICAR_SCHEMA_NO_BOOT = os.environ.get(
+        "VERIFICAR_SCHEMA_NO_BOOT", "false"
+    ).lower() in ["true", "on", "1"]
+
+    # Mede as etapas do create_app (veja `flask inicializacao perfil`)
+    PERFIL_INICIALIZACAO = os.environ.get("PERFIL_INICIALIZACAO", "false").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+    # Módulos importados já no boot (ex.: "weasyprint,pytz" com gunicorn --preload);
+    # os demais pesos ficam para a primeira requisição que precisar deles
+    PRE_AQUECER_MODULOS = [
+        modulo.strip()
+        for modulo in os.environ.get("PRE_AQUECER_MODULOS", "").split(",")
+        if modulo.strip()
+    ]
+
+    # Pool de conexões para bancos servidor (ignorado no SQLite)
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE") or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW") or 20)
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+    # Segundos até uma conexão ser reciclada (antes de timeouts do servidor)
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE") or 1800)
+
+    # PRAGMAs aplicados a cada conexão SQLite (app/database.py); vazio desativa
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT") or 5000)
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE") or 256 * 1024 * 1024)
+    # Negativo: tamanho em KiB (64 MiB por conexão)
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE") or -64 * 1024)
+
+    # Cache do usuário logado (app/identity.py)
+    IDENTIDADE_CACHE_TTL = int(os.environ.get("IDENTIDADE_CACHE_TTL") or 60)
+    IDENTIDADE_CACHE_MAX = int(os.environ.get("IDENTIDADE_CACHE_MAX") or 10000)
+
+    # Universidades, hospitais e especialidades em memória (app/reference_data.py):
+    # intervalo, em segundos, entre as conferências da versão no banco
+    REFERENCIAS_VERIFICAR_INTERVALO = int(
+        os.environ.get("REFERENCIAS_VERIFICAR_INTERVALO") or 30
+    )
+
+    # Hash de senhas (app/passwords.py): método e custo no formato do Werkzeug,
+    # ex. "pbkdf2:sha256:600000" ou "scrypt:32768:8:1"
+    SENHA_HASH_METODO = os.environ.get("SENHA_HASH_METODO") or "pbkdf2:sha256:600000"
+    SENHA_SALT_TAMANHO = int(os.environ.get("SENHA_SALT_TAMANHO") or 16)
+    # Verificações de senha simultâneas por processo e quantas podem esperar
+    SENHA_VERIFICACAO_WORKERS = int(os.environ.get("SENHA_VERIFICACAO_WORKERS") or 2)
+    SENHA_VERIFICACAO_FILA = int(os.environ.get("SENHA_VERIFICACAO_FILA") or 32)
+
+    # Busca textual nos procedimentos (app/search.py)
+    BUSCA_MAX_POR_PAGINA = int(os.environ.get("BUSCA_MAX_POR_PAGINA") or 100)
+
+    # Itens por página nas listas dos dashboards (app/pagination.py)
+    DASHBOARD_PAGINA_TAMANHO = int(os.environ.get("DASHBOARD_PAGINA_TAMANHO") or 25)
+    # Envia o dashboard do preceptor em partes, à medida que é renderizado
+    DASHBOARD_STREAMING = os.environ.get("DASHBOARD_STREAMING", "true").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
 
     # Configurações de Email
     MAIL_SERVER = os.environ.get("MAIL_SERVER") or "smtp.gmail.com"
@@ -27,3 +122,121 @@ class Config:
     MAIL_DEFAULT_SENDER = (
         os.environ.get("MAIL_DEFAULT_SENDER") or "noreply@logbook-residente.com"
     )
+
+    # Caixa de saída de emails (app/outbox.py)
+    EMAIL_OUTBOX_INTERVALO = float(os.environ.get("EMAIL_OUTBOX_INTERVALO") or 2)
+    EMAIL_OUTBOX_LOTE = int(os.environ.get("EMAIL_OUTBOX_LOTE") or 50)
+    EMAIL_OUTBOX_MAX_TENTATIVAS = int(
+        os.environ.get("EMAIL_OUTBOX_MAX_TENTATIVAS") or 6
+    )
+    # Espera antes de uma nova tentativa: base * 2^(tentativas - 1), até o máximo
+    EMAIL_OUTBOX_BACKOFF_BASE = int(os.environ.get("EMAIL_OUTBOX_BACKOFF_BASE") or 30)
+    EMAIL_OUTBOX_BACKOFF_MAX = int(os.environ.get("EMAIL_OUTBOX_BACKOFF_MAX") or 3600)
+    # Segundos que um email em envio fica reservado para o worker que o pegou
+    EMAIL_OUTBOX_RESERVA = int(os.environ.get("EMAIL_OUTBOX_RESERVA") or 300)
+    # Modo resumo: segundos que a notificação de uma avaliação espera para ser
+    # enviada junto com as outras do mesmo residente (0 envia uma a uma)
+    EMAIL_RESUMO_JANELA = int(os.environ.get("EMAIL_RESUMO_JANELA") or 0)
+    # O envio é feito por um único `flask outbox worker`. Ligar sobe também
+    # uma thread de envio em cada processo da aplicação (só para desenvolvimento)
+    EMAIL_OUTBOX_THREAD = os.environ.get("EMAIL_OUTBOX_THREAD", "false").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+
+    # Consulta de CRM na API do CFM (app/crm.py)
+    CFM_API_URL = (
+        os.environ.get("CFM_API_URL")
+        or "https://portal.cfm.org.br/api_rest_php/api/v1/medicos/buscar_medicos"
+    )
+    CRM_TIMEOUT_CONEXAO = float(os.environ.get("CRM_TIMEOUT_CONEXAO") or 3)
+    CRM_TIMEOUT = float(os.environ.get("CRM_TIMEOUT") or 10)
+    CRM_POOL_TAMANHO = int(os.environ.get("CRM_POOL_TAMANHO") or 10)
+    # Segundos que um CRM encontrado / não encontrado fica em cache
+    CRM_CACHE_TTL = int(os.environ.get("CRM_CACHE_TTL") or 6 * 3600)
+    CRM_CACHE_TTL_NEGATIVO = int(os.environ.get("CRM_CACHE_TTL_NEGATIVO") or 300)
+    CRM_CACHE_MAX = int(os.environ.get("CRM_CACHE_MAX") or 10000)
+    # Erros seguidos que abrem o circuito e quanto tempo ele fica aberto
+    CRM_CIRCUITO_FALHAS = int(os.environ.get("CRM_CIRCUITO_FALHAS") or 5)
+    CRM_CIRCUITO_ESPERA = int(os.environ.get("CRM_CIRCUITO_ESPERA") or 30)
+    # Verificação em lote: médicos por requisição e requisições simultâneas
+    CRM_LOTE_TAMANHO = int(os.environ.get("CRM_LOTE_TAMANHO") or 10)
+    CRM_LOTE_CONCORRENCIA = int(os.environ.get("CRM_LOTE_CONCORRENCIA") or 4)
+
+    # Geração assíncrona de relatórios (pool local de processos)
+    RELATORIO_WORKERS = int(os.environ.get("RELATORIO_WORKERS") or 2)
+    RELATORIO_JOBS_DIR = os.environ.get("RELATORIO_JOBS_DIR") or os.path.join(
+        basedir, "relatorios_jobs"
+    )
+    # Segundos após os quais um job "Processando" é considerado abandonado
+    RELATORIO_JOB_TIMEOUT = int(os.environ.get("RELATORIO_JOB_TIMEOUT") or 600)
+    # Segundos que um job pode ficar "Pendente" antes de ser dado como perdido
+    RELATORIO_JOB_PENDENTE_TIMEOUT = int(
+        os.environ.get("RELATORIO_JOB_PENDENTE_TIMEOUT") or 1800
+    )
+    # Teto de memória de cada worker da fila, que renderiza no próprio
+    # processo mas também carrega a aplicação inteira (0 desativa)
+    RELATORIO_JOB_LIMITE_MEMORIA_MB = int(
+        os.environ.get("RELATORIO_JOB_LIMITE_MEMORIA_MB") or 2048
+    )
+
+    # Cache em disco dos relatórios em PDF
+    RELATORIO_CACHE_DIR = os.environ.get("RELATORIO_CACHE_DIR") or os.path.join(
+        basedir, "relatorios_cache"
+    )
+    RELATORIO_CACHE_MAX_BYTES = int(
+        os.environ.get("RELATORIO_CACHE_MAX_BYTES") or 500 * 1024 * 1024
+    )
+
+    # Motor de renderização de PDF (pool de processos pré-aquecidos)
+    PDF_WORKERS = int(os.environ.get("PDF_WORKERS") or 2)
+    PDF_TIMEOUT = int(os.environ.get("PDF_TIMEOUT") or 60)
+    PDF_LIMITE_MEMORIA_MB = int(os.environ.get("PDF_LIMITE_MEMORIA_MB") or 1024)
+    # O pool sobe na primeira renderização. Ligar faz cada create_app (cada
+    # worker web, mas também cada comando ``flask``) subir e preparar o pool.
+    PDF_AQUECER_NO_BOOT = os.environ.get("PDF_AQUECER_NO_BOOT", "false").lower() in [
+        "true",
+        "on",
+        "1",
+    ]
+
+    # Limite de comandos SQL por requisição (None desativa a contagem).
+    # Em testes, passar do limite faz a requisição falhar.
+    SQL_LIMITE_POR_REQUISICAO = (
+        int(os.environ["SQL_LIMITE_POR_REQUISICAO"])
+        if os.environ.get("SQL_LIMITE_POR_REQUISICAO")
+        else None
+    )
+    SQL_LIMITES_POR_ENDPOINT = {}
+
+
+class TestingConfig(Config):
+    """Configuração da suíte de testes (tests/conftest.py define o banco)."""
+
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_BINDS = {}
+    # Hash barato: os testes fazem muitos logins
+    SENHA_HASH_METODO = "pbkdf2:sha256:1000"
+    # Tudo no próprio processo, sem pools nem threads em segundo plano
+    PDF_WORKERS = 0
+    PDF_AQUECER_NO_BOOT = False
+    EMAIL_OUTBOX_THREAD = False
+    MAIL_SERVER = "localhost"
+    MAIL_USE_TLS = False
+    MAIL_USERNAME = None
+    MAIL_PASSWORD = None
+    CFM_API_URL = "http://localhost:9/indisponivel"
+    # Guarda contra N+1: o número de comandos de cada página não pode crescer
+    # com o número de procedimentos (tests/test_contagem_sql.py)
+    SQL_LIMITE_POR_REQUISICAO = 15
+    SQL_LIMITES_POR_ENDPOINT = {
+        "GET main.dashboard_residente": 3,
+        "GET main.dashboard_preceptor": 4,
+        "main.api_procedimentos_residente": 1,
+        "main.api_avaliados_preceptor": 1,
+        "main.exportar_logbook": 2,
+        "GET main.gerar_relatorio": 6,
+        "main.api_estatisticas": 2,
+    }
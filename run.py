@@ -1,4 +1,6 @@
 # run.py
+# O schema não é criado no boot: antes da primeira subida (e depois de cada
+# atualização) rode `flask --app run db upgrade`.
 from app import create_app
 
 app = create_app()
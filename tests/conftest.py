@@ -0,0 +1,204 @@
+# tests/conftest.py
+"""Fixtures da suíte de testes.
+
+Os testes rodam num banco PostgreSQL descartável quando
+``TEST_DATABASE_URL`` aponta para um servidor local (ex.:
+``postgresql+psycopg2://postgres@localhost/postgres``): um banco novo é
+criado no início da sessão e apagado no fim. Sem a variável, ou se o
+servidor não responder, os testes usam um arquivo SQLite temporário. Nos
+dois casos o schema é criado pelas migrações (``aplicar_migracoes``).
+"""
+import os
+import uuid
+import warnings
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import create_app, db
+from config import TestingConfig
+
+SENHA = "senha-de-teste"
+
+
+def _criar_banco_postgres(url_servidor):
+    """Cria um banco vazio no servidor; retorna (url do banco, engine admin)."""
+    admin = create_engine(url_servidor, isolation_level="AUTOCOMMIT")
+    nome = f"logbook_teste_{uuid.uuid4().hex[:8]}"
+    try:
+        with admin.connect() as conn:
+            conn.execute(text(f'CREATE DATABASE "{nome}"'))
+    except SQLAlchemyError as e:
+        admin.dispose()
+        warnings.warn(f"PostgreSQL de teste indisponível ({e}); usando SQLite.")
+        return None, None
+    url = make_url(url_servidor).set(database=nome)
+    return url.render_as_string(hide_password=False), admin
+
+
+@pytest.fixture(scope="session")
+def banco_url(tmp_path_factory):
+    url_servidor = os.environ.get("TEST_DATABASE_URL")
+    url, admin = (None, None)
+    if url_servidor:
+        url, admin = _criar_banco_postgres(url_servidor)
+    if url is None:
+        caminho = tmp_path_factory.mktemp("banco") / "teste.db"
+        yield f"sqlite:///{caminho}"
+        return
+
+    yield url
+    with admin.connect() as conn:
+        conn.execute(
+            text(f'DROP DATABASE IF EXISTS "{make_url(url).database}" WITH (FORCE)')
+        )
+    admin.dispose()
+
+
+@pytest.fixture(scope="session")
+def app(banco_url, tmp_path_factory):
+    from app.migrations import aplicar_migracoes
+
+    diretorio = tmp_path_factory.mktemp("arquivos")
+    config = type(
+        "ConfigTeste",
+        (TestingConfig,),
+        {
+            "SQLALCHEMY_DATABASE_URI": banco_url,
+            "RELATORIO_JOBS_DIR": str(diretorio / "jobs"),
+            "RELATORIO_CACHE_DIR": str(diretorio / "cache"),
+        },
+    )
+    app = create_app(config)
+    with app.app_context():
+        aplicar_migracoes()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def banco_limpo(app):
+    """Cada teste começa com as tabelas vazias e os caches zerados."""
+    yield
+    from app.crm import cliente_crm
+    from app.identity import cache_identidades
+    from app.reference_data import criar_contador, registro_referencias
+
+    with app.app_context():
+        db.session.remove()
+        with db.engine.begin() as conn:
+            for tabela in reversed(db.metadata.sorted_tables):
+                conn.execute(tabela.delete())
+            criar_contador(conn)
+    cache_identidades.limpar()
+    registro_referencias.invalidar()
+    cliente_crm.limpar_cache()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def dados(app):
+    """Um preceptor e um residente supervisionado por ele; retorna os ids."""
+    from app.models import Especialidade, Hospital, Preceptor, Residente, Universidade
+
+    with app.app_context():
+        universidade = Universidade(nome="Universidade Federal de Uberlândia", uf="MG")
+        especialidade = Especialidade(nome="Clínica Médica")
+        db.session.add_all([universidade, especialidade])
+        db.session.flush()
+        hospital = Hospital(
+            nome="Hospital de Clínicas de Uberlândia (HC-UFU)",
+            universidade_id=universidade.id,
+        )
+        db.session.add(hospital)
+        db.session.flush()
+        preceptor = Preceptor(
+            nome="Dra. Preceptora",
+            email="preceptor@teste.com",
+            celular="34999990000",
+            cpf="11111111111",
+            crm_uf="MG",
+            crm_numero="10000",
+            universidade_id=universidade.id,
+            hospital_id=hospital.id,
+            especialidade_id=especialidade.id,
+        )
+        preceptor.set_senha(SENHA)
+        db.session.add(preceptor)
+        db.session.flush()
+        residente = Residente(
+            nome="Residente Um",
+            email="residente@teste.com",
+            celular="34999991111",
+            cpf="22222222222",
+            crm_uf="MG",
+            crm_numero="20000",
+            especialidade_id=especialidade.id,
+            supervisor_id=preceptor.id,
+            universidade_id=universidade.id,
+            hospital_id=hospital.id,
+            ano_ingresso=2024,
+            categoria="R1",
+        )
+        residente.set_senha(SENHA)
+        db.session.add(residente)
+        db.session.commit()
+        return SimpleNamespace(
+            preceptor_id=preceptor.id,
+            preceptor_email=preceptor.email,
+            residente_id=residente.id,
+            residente_email=residente.email,
+            especialidade_id=especialidade.id,
+        )
+
+
+@pytest.fixture
+def criar_procedimentos(app, dados):
+    """Cria ``n`` procedimentos do residente de ``dados``; retorna os ids."""
+
+    def criar(n, status="Pendente", inicio=date(2025, 1, 1)):
+        from app.models import Procedimento
+
+        with app.app_context():
+            procedimentos = [
+                Procedimento(
+                    nome_procedimento=f"Procedimento {i + 1}",
+                    data_realizacao=inicio + timedelta(days=i),
+                    historia_clinica=f"História clínica do paciente {i + 1}.",
+                    exame_fisico="Exame físico sem alterações.",
+                    interpretacao_diagnostico="Hipótese diagnóstica principal.",
+                    plano_terapeutico="Plano terapêutico proposto.",
+                    orientacao_paciente="Orientações ao paciente.",
+                    conhecimento_aprendizagem="Aprendizado do caso.",
+                    status=status,
+                    residente_id=dados.residente_id,
+                    preceptor_id=dados.preceptor_id,
+                )
+                for i in range(n)
+            ]
+            db.session.add_all(procedimentos)
+            db.session.commit()
+            return [procedimento.id for procedimento in procedimentos]
+
+    return criar
+
+
+@pytest.fixture
+def entrar(client):
+    """Faz login com o ``client`` do teste."""
+
+    def entrar(email, senha=SENHA):
+        return client.post("/login", data={"email": email, "password": senha})
+
+    return entrar
@@ -0,0 +1,177 @@
+# tests/test_contagem_sql.py
+"""O número de comandos SQL de cada página não cresce com os dados.
+
+Cada página é pedida com N e com 2N procedimentos; a contagem tem de ser a
+mesma e caber no limite de ``SQL_LIMITES_POR_ENDPOINT`` (TestingConfig).
+"""
+import pytest
+
+from app.query_counter import contar_queries
+
+N = 6
+
+
+def _contar(app, client, url, headers=None, status=200):
+    """Comandos da requisição inteira, inclusive o corpo em streaming."""
+    with contar_queries(app) as contador:
+        # Fechar a resposta dispara a conferência do limite (call_on_close)
+        with client.get(url, headers=headers) as resposta:
+            resposta.get_data()
+            assert resposta.status_code == status
+    return contador.total
+
+
+def _contar_revalidacao(app, client, url):
+    """Comandos do GET que o ETag da resposta anterior transforma em 304."""
+    etag = client.get(url).headers["ETag"]
+    return _contar(app, client, url, headers={"If-None-Match": etag}, status=304)
+
+
+def _contar_com_n_e_2n(app, client, entrar, email, criar, url, contar=_contar):
+    totais = []
+    for _ in range(2):
+        criar(N)
+        entrar(email)
+        totais.append(contar(app, client, url))
+        client.get("/logout")
+    return totais
+
+
+@pytest.fixture
+def criar_mistos(criar_procedimentos):
+    """Procedimentos pendentes, validados e rejeitados em igual número."""
+
+    def criar(n):
+        for status in ("Pendente", "Validado", "Rejeitado"):
+            criar_procedimentos(n, status=status)
+
+    return criar
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["/dashboard/preceptor", "/api/dashboard/preceptor/avaliados"],
+)
+def test_paginas_do_preceptor(app, client, dados, entrar, criar_mistos, url):
+    com_n, com_2n = _contar_com_n_e_2n(
+        app, client, entrar, dados.preceptor_email, criar_mistos, url
+    )
+    assert com_n == com_2n
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["/dashboard/residente", "/api/dashboard/residente/procedimentos"],
+)
+def test_paginas_do_residente(app, client, dados, entrar, criar_mistos, url):
+    com_n, com_2n = _contar_com_n_e_2n(
+        app, client, entrar, dados.residente_email, criar_mistos, url
+    )
+    assert com_n == com_2n
+
+
+@pytest.mark.parametrize("formato", ["csv", "xlsx"])
+def test_exportacao_do_logbook(app, client, dados, entrar, criar_mistos, formato):
+    url = f"/relatorio/residente/{dados.residente_id}/logbook.{formato}"
+    com_n, com_2n = _contar_com_n_e_2n(
+        app, client, entrar, dados.preceptor_email, criar_mistos, url
+    )
+    assert com_n == com_2n
+
+
+@pytest.mark.parametrize(
+    "usuario, consulta",
+    [("residente", ""), ("preceptor", ""), ("preceptor", "?residente_id={id}")],
+    ids=["residente", "preceptor", "preceptor_residente"],
+)
+def test_api_de_estatisticas(
+    app, client, dados, entrar, criar_mistos, usuario, consulta
+):
+    url = "/api/estatisticas" + consulta.format(id=dados.residente_id)
+    com_n, com_2n = _contar_com_n_e_2n(
+        app, client, entrar, getattr(dados, f"{usuario}_email"), criar_mistos, url
+    )
+    # Uma consulta agrupada; com ?residente_id=, antes dela, a do residente
+    assert com_n == com_2n == (2 if consulta else 1)
+
+
+@pytest.fixture
+def criar_com_preceptores(app, dados, criar_mistos):
+    """Além dos mistos, um validado por cada um de ``n`` preceptores novos."""
+    from datetime import date
+
+    from app import db
+    from app.models import Preceptor, Procedimento
+
+    criados = []
+
+    def criar(n):
+        criar_mistos(n)
+        with app.app_context():
+            modelo = db.session.get(Preceptor, dados.preceptor_id)
+            for _ in range(n):
+                i = len(criados) + 1
+                preceptor = Preceptor(
+                    nome=f"Preceptor {i}",
+                    email=f"preceptor{i}@teste.com",
+                    celular="0",
+                    cpf=f"9{i:010d}",
+                    crm_uf="MG",
+                    crm_numero=f"9{i:04d}",
+                    universidade_id=modelo.universidade_id,
+                    hospital_id=modelo.hospital_id,
+                    especialidade_id=modelo.especialidade_id,
+                )
+                db.session.add(preceptor)
+                db.session.flush()
+                criados.append(preceptor.id)
+                db.session.add(
+                    Procedimento(
+                        nome_procedimento=f"Procedimento com o preceptor {i}",
+                        data_realizacao=date(2025, 3, 1),
+                        historia_clinica="História.",
+                        exame_fisico="Exame.",
+                        interpretacao_diagnostico="Diagnóstico.",
+                        plano_terapeutico="Plano.",
+                        orientacao_paciente="Orientação.",
+                        conhecimento_aprendizagem="Aprendizado.",
+                        status="Validado",
+                        residente_id=dados.residente_id,
+                        preceptor_id=preceptor.id,
+                    )
+                )
+            db.session.commit()
+
+    return criar
+
+
+@pytest.mark.parametrize(
+    "contar", [_contar, _contar_revalidacao], ids=["sem_cache", "etag"]
+)
+def test_relatorio_do_residente(
+    app, client, dados, entrar, criar_com_preceptores, monkeypatch, contar
+):
+    import app.reports as reports
+
+    # Sem renderizar de verdade: o que se conta são as consultas. Os
+    # procedimentos novos mudam a chave, então cada rodada é um cache miss.
+    # Preceptores distintos pegam um nome de preceptor lido por linha.
+    monkeypatch.setattr(reports, "gerar_pdf", lambda html: b"%PDF-1.7 teste")
+    url = f"/relatorio/residente/{dados.residente_id}"
+    com_n, com_2n = _contar_com_n_e_2n(
+        app, client, entrar, dados.preceptor_email, criar_com_preceptores, url, contar
+    )
+    assert com_n == com_2n
+
+
+def test_limite_vale_para_o_corpo_em_streaming(
+    app, client, dados, entrar, criar_mistos, monkeypatch
+):
+    criar_mistos(2)
+    entrar(dados.preceptor_email)
+    limites = dict(app.config["SQL_LIMITES_POR_ENDPOINT"])
+    limites["GET main.dashboard_preceptor"] = 1
+    monkeypatch.setitem(app.config, "SQL_LIMITES_POR_ENDPOINT", limites)
+
+    with pytest.raises(AssertionError, match="comandos SQL"):
+        _contar(app, client, "/dashboard/preceptor")
@@ -0,0 +1,152 @@
+# tests/test_contas.py
+"""Índice de contas: login numa consulta, senhas e checagens do cadastro."""
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.accounts import autenticar, conflitos_cadastro
+from app.models import Conta, Preceptor, Residente
+from app.passwords import gerar_hash
+from app.query_counter import contar_queries
+
+
+def test_login_busca_conta_e_usuario_numa_consulta(app, client, dados, entrar):
+    with contar_queries(app) as contador:
+        resposta = entrar(dados.residente_email)
+    assert resposta.status_code == 302
+    assert contador.total == 1
+
+    # O principal do login já está no cache: a próxima página não o consulta
+    with contar_queries(app) as contador:
+        resposta = client.get("/home")
+    assert resposta.headers["Location"].endswith("/dashboard/residente")
+    assert contador.total == 0
+
+
+def test_autenticar_devolve_o_principal(app, dados):
+    with app.app_context():
+        principal = autenticar(dados.residente_email, "senha-de-teste")
+        assert principal.get_id() == f"residente-{dados.residente_id}"
+        assert principal.nome == "Residente Um"
+        assert principal.supervisor_id == dados.preceptor_id
+
+        principal = autenticar(dados.preceptor_email, "senha-de-teste")
+        assert principal.get_id() == f"preceptor-{dados.preceptor_id}"
+        assert principal.supervisor_id is None
+
+        assert autenticar(dados.preceptor_email, "senha-errada") is None
+        assert autenticar("ninguem@teste.com", "senha-de-teste") is None
+
+
+def _pela_orm(usuario_id, senha):
+    db.session.get(Residente, usuario_id).set_senha(senha)
+
+
+def _por_update_em_massa(usuario_id, senha):
+    db.session.execute(
+        db.update(Residente)
+        .where(Residente.id == usuario_id)
+        .values(senha_hash=gerar_hash(senha))
+    )
+
+
+def _por_sql_direto(usuario_id, senha):
+    db.session.execute(
+        text("UPDATE residente SET senha_hash = :hash WHERE id = :id"),
+        {"hash": gerar_hash(senha), "id": usuario_id},
+    )
+
+
+@pytest.mark.parametrize(
+    "trocar",
+    [_pela_orm, _por_update_em_massa, _por_sql_direto],
+    ids=["orm", "update_em_massa", "sql"],
+)
+def test_troca_de_senha_vale_por_qualquer_caminho(app, dados, entrar, trocar):
+    with app.app_context():
+        trocar(dados.residente_id, "senha-nova-123")
+        db.session.commit()
+
+    assert entrar(dados.residente_email).status_code == 200
+    assert entrar(dados.residente_email, "senha-nova-123").status_code == 302
+
+
+def test_migracao_preenche_as_contas_dos_usuarios(app, dados, entrar):
+    from app.migrations import MIGRACOES
+
+    (migracao,) = [m for m in MIGRACOES if m.versao == 3]
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(Conta.__table__.delete())
+    assert entrar(dados.residente_email).status_code == 200
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            migracao.aplicar(conn)
+        contas = {
+            (conta.tipo, conta.usuario_id): (conta.email, conta.cpf)
+            for conta in Conta.query.all()
+        }
+    assert contas == {
+        ("residente", dados.residente_id): (dados.residente_email, "22222222222"),
+        ("preceptor", dados.preceptor_id): (dados.preceptor_email, "11111111111"),
+    }
+    assert entrar(dados.residente_email).status_code == 302
+
+
+def test_reconstruir_acompanha_email_alterado_em_massa(app, dados, entrar):
+    from app.accounts import reconstruir
+
+    with app.app_context():
+        db.session.execute(
+            db.update(Preceptor)
+            .where(Preceptor.id == dados.preceptor_id)
+            .values(email="novo@teste.com")
+        )
+        db.session.commit()
+        with db.engine.begin() as conn:
+            reconstruir(conn)
+
+    assert entrar("novo@teste.com").status_code == 302
+
+
+def test_conflitos_do_cadastro_numa_consulta(app, dados):
+    casos = [
+        ("residente", dados.residente_email, "00000000000", {"email"}),
+        ("residente", "novo@teste.com", "22222222222", {"cpf"}),
+        ("residente", dados.residente_email, "22222222222", {"email", "cpf"}),
+        ("residente", "novo@teste.com", "00000000000", set()),
+        # Cada tipo de usuário tem os seus emails e CPFs
+        ("preceptor", dados.residente_email, "22222222222", set()),
+        ("preceptor", dados.preceptor_email, "00000000000", {"email"}),
+    ]
+    with app.app_context():
+        for tipo, email, cpf, esperado in casos:
+            with contar_queries() as contador:
+                assert conflitos_cadastro(tipo, email, cpf) == esperado
+            assert contador.total == 1
+
+
+def test_cadastro_recusa_email_em_uso(app, client, dados):
+    with client.session_transaction() as sessao:
+        sessao["crm_verificado"] = {"uf": "MG", "crm": "60000"}
+
+    resposta = client.post(
+        "/registrar",
+        data={
+            "nome": "Residente Repetido",
+            "email": dados.residente_email,
+            "celular": "34999992222",
+            "cpf": "66666666666",
+            "especialidade": dados.especialidade_id,
+            "supervisor": dados.preceptor_id,
+            "ano_ingresso": "2025",
+            "categoria": "R1",
+            "password": "senha-de-teste",
+            "confirm_password": "senha-de-teste",
+        },
+    )
+    assert resposta.status_code == 200
+    assert "Este email já está em uso." in resposta.get_data(as_text=True)
+    with app.app_context():
+        assert Residente.query.count() == 1
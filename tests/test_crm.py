@@ -0,0 +1,152 @@
+# tests/test_crm.py
+"""Cliente do CFM contra um servidor local: lote, cache e circuit breaker."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import db
+from app.crm import CircuitoAberto, ErroConsultaCRM, cliente_crm
+from app.models import CrmCache
+
+
+class _CFM:
+    """Imita a API do CFM; ``modo`` escolhe como ela responde a um lote."""
+
+    def __init__(self, inexistentes=()):
+        self.inexistentes = set(inexistentes)
+        self.modo = "lote"
+        self.requisicoes = []
+
+    def responder(self, buscas):
+        self.requisicoes.append(buscas)
+        if self.modo == "erro":
+            return 500, {}
+        if self.modo == "ignora_lote":
+            # API que só atende à primeira busca de cada requisição
+            buscas = buscas[:1]
+        dados = []
+        for busca in buscas:
+            crm = busca["medico"]["crmMedico"]
+            uf = busca["medico"]["ufMedico"]
+            if crm in self.inexistentes:
+                if len(buscas) == 1:
+                    dados.append({"COUNT": "0"})
+                continue
+            dados.append(
+                {"COUNT": "1", "SITUACAO": "Regular", "NU_CRM": crm, "SG_UF": uf}
+            )
+        return 200, {"dados": dados}
+
+
+@pytest.fixture
+def cfm(app, monkeypatch):
+    api = _CFM(inexistentes={"99999"})
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            tamanho = int(self.headers["Content-Length"])
+            status, corpo = api.responder(json.loads(self.rfile.read(tamanho)))
+            conteudo = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(conteudo)))
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        cliente_crm, "url", f"http://127.0.0.1:{servidor.server_port}/buscar"
+    )
+    monkeypatch.setattr(cliente_crm, "tamanho_lote", 3)
+    monkeypatch.setattr(cliente_crm, "limite_falhas", 2)
+    monkeypatch.setattr(cliente_crm, "espera_circuito", 60)
+    monkeypatch.setattr(cliente_crm, "_falhas", 0)
+    monkeypatch.setattr(cliente_crm, "_aberto_ate", 0.0)
+    yield api
+    servidor.shutdown()
+    servidor.server_close()
+    cliente_crm.encerrar()
+
+
+def _cache_no_banco(app):
+    with app.app_context():
+        return {
+            (linha.uf, linha.crm): linha.encontrado
+            for linha in db.session.query(CrmCache)
+        }
+
+
+def test_lote_agrupa_as_buscas_e_usa_o_cache(app, cfm):
+    pares = [("mg", "10001"), ("MG", "10002"), ("SP", "10003"), ("SP", "10004")]
+
+    with app.app_context():
+        resultados = cliente_crm.consultar_lote(pares)
+
+    # Dois blocos (3 + 1), nenhuma consulta individual extra
+    assert sorted(len(buscas) for buscas in cfm.requisicoes) == [1, 3]
+    assert all(resultado.encontrado for resultado in resultados.values())
+    assert set(resultados) == {("MG", "10001"), ("MG", "10002"), *pares[2:]}
+    assert set(_cache_no_banco(app).values()) == {True}
+
+    # Da memória do processo
+    with app.app_context():
+        cliente_crm.consultar_lote(pares)
+    assert len(cfm.requisicoes) == 2
+
+    # Do banco, como outro worker veria
+    cliente_crm.limpar_cache()
+    with app.app_context():
+        assert cliente_crm.consultar("SP", "10004").situacao == "Regular"
+    assert len(cfm.requisicoes) == 2
+
+
+def test_crm_ausente_do_lote_e_conferido_individualmente(app, cfm):
+    pares = [("MG", "10001"), ("MG", "99999"), ("MG", "10002")]
+
+    with app.app_context():
+        resultados = cliente_crm.consultar_lote(pares)
+
+    assert [len(buscas) for buscas in cfm.requisicoes] == [3, 1]
+    assert not resultados[("MG", "99999")].encontrado
+    assert resultados[("MG", "10002")].encontrado
+    assert _cache_no_banco(app) == {
+        ("MG", "10001"): True,
+        ("MG", "10002"): True,
+        ("MG", "99999"): False,
+    }
+
+
+def test_api_que_ignora_o_lote_nao_gera_cache_negativo(app, cfm):
+    cfm.modo = "ignora_lote"
+    pares = [("MG", "10001"), ("MG", "10002"), ("MG", "10003")]
+
+    with app.app_context():
+        resultados = cliente_crm.consultar_lote(pares)
+
+    # A primeira veio no lote; as outras duas, uma a uma
+    assert [len(buscas) for buscas in cfm.requisicoes] == [3, 1, 1]
+    assert all(resultado.encontrado for resultado in resultados.values())
+    assert set(_cache_no_banco(app).values()) == {True}
+
+
+def test_circuito_abre_depois_de_falhas_seguidas(app, cfm):
+    cfm.modo = "erro"
+
+    with app.app_context():
+        for crm in ("10001", "10002"):
+            with pytest.raises(ErroConsultaCRM):
+                cliente_crm.consultar("MG", crm)
+        assert len(cfm.requisicoes) == 2
+
+        with pytest.raises(CircuitoAberto):
+            cliente_crm.consultar("MG", "10003")
+    # Com o circuito aberto a API nem é chamada, e nada vai para o cache
+    assert len(cfm.requisicoes) == 2
+    assert _cache_no_banco(app) == {}
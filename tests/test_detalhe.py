@@ -0,0 +1,168 @@
+# tests/test_detalhe.py
+"""Texto HEIPOC sob demanda: quem pode ler o detalhe e o que as listas trazem."""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models import Preceptor, Procedimento, Residente
+
+# Os textos que ``criar_procedimentos`` grava nos campos HEIPOC
+TEXTOS_HEIPOC = [
+    "História clínica do paciente",
+    "Exame físico sem alterações.",
+    "Hipótese diagnóstica principal.",
+    "Plano terapêutico proposto.",
+    "Orientações ao paciente.",
+    "Aprendizado do caso.",
+]
+
+
+@pytest.fixture
+def cenario(app, dados, criar_procedimentos):
+    """Um procedimento do Residente Um avaliado pelo Outro Preceptor.
+
+    A Dra. Preceptora (de ``dados``) só supervisiona o Residente Um; o Outro
+    Preceptor supervisiona o Residente Dois, que tem a sua Paracentese.
+    """
+    (avaliado_por_outro,) = criar_procedimentos(1)
+    with app.app_context():
+        original = db.session.get(Residente, dados.residente_id)
+        comuns = dict(
+            celular="0",
+            crm_uf="MG",
+            universidade_id=original.universidade_id,
+            hospital_id=original.hospital_id,
+            especialidade_id=original.especialidade_id,
+        )
+        outro = Preceptor(
+            nome="Outro Preceptor",
+            email="outro@teste.com",
+            cpf="33333333333",
+            crm_numero="30000",
+            **comuns,
+        )
+        outro.set_senha("senha-de-teste")
+        db.session.add(outro)
+        db.session.flush()
+        dois = Residente(
+            nome="Residente Dois",
+            email="dois@teste.com",
+            cpf="44444444444",
+            crm_numero="40000",
+            supervisor_id=outro.id,
+            ano_ingresso=2024,
+            categoria="R2",
+            **comuns,
+        )
+        dois.set_senha("senha-de-teste")
+        db.session.add(dois)
+        db.session.flush()
+        paracentese = Procedimento(
+            nome_procedimento="Paracentese",
+            data_realizacao=date(2025, 2, 1),
+            historia_clinica="Paciente com ascite.",
+            exame_fisico="Macicez móvel.",
+            interpretacao_diagnostico="Cirrose.",
+            plano_terapeutico="Paracentese de alívio.",
+            orientacao_paciente="Retorno em uma semana.",
+            conhecimento_aprendizagem="Técnica asséptica.",
+            residente_id=dois.id,
+            preceptor_id=outro.id,
+        )
+        db.session.add(paracentese)
+        db.session.get(Procedimento, avaliado_por_outro).preceptor_id = outro.id
+        db.session.commit()
+        return SimpleNamespace(
+            avaliado_por_outro=avaliado_por_outro, paracentese=paracentese.id
+        )
+
+
+def _detalhe(client, procedimento_id, **kwargs):
+    return client.get(f"/api/procedimentos/{procedimento_id}", **kwargs)
+
+
+@pytest.mark.parametrize(
+    "email",
+    ["residente@teste.com", "outro@teste.com", "preceptor@teste.com"],
+    ids=["residente_dono", "preceptor_avaliador", "preceptor_supervisor"],
+)
+def test_detalhe_para_quem_participa_do_procedimento(
+    client, dados, entrar, cenario, email
+):
+    entrar(email)
+
+    resposta = _detalhe(client, cenario.avaliado_por_outro)
+    assert resposta.status_code == 200
+    assert resposta.json["historia_clinica"] == "História clínica do paciente 1."
+    assert resposta.json["residente"] == "Residente Um"
+    assert resposta.json["preceptor"] == "Outro Preceptor"
+
+
+@pytest.mark.parametrize(
+    "email, procedimento, status",
+    [
+        ("dois@teste.com", "avaliado_por_outro", 403),
+        ("preceptor@teste.com", "paracentese", 403),
+        ("residente@teste.com", "inexistente", 404),
+        ("preceptor@teste.com", "inexistente", 404),
+    ],
+    ids=[
+        "outro_residente",
+        "preceptor_sem_vinculo",
+        "inexistente_residente",
+        "inexistente_preceptor",
+    ],
+)
+def test_detalhe_negado_ou_inexistente(
+    client, dados, entrar, cenario, email, procedimento, status
+):
+    entrar(email)
+    procedimento_id = getattr(cenario, procedimento, 999999)
+
+    assert _detalhe(client, procedimento_id).status_code == status
+
+
+def test_detalhe_repetido_com_if_none_match_e_304(client, dados, entrar, cenario):
+    entrar(dados.residente_email)
+
+    resposta = _detalhe(client, cenario.avaliado_por_outro)
+    etag = resposta.headers["ETag"]
+    resposta = _detalhe(
+        client, cenario.avaliado_por_outro, headers={"If-None-Match": etag}
+    )
+    assert resposta.status_code == 304
+    assert resposta.data == b""
+
+
+def test_detalhe_exige_login(client, cenario):
+    resposta = _detalhe(client, cenario.avaliado_por_outro)
+    assert resposta.status_code == 302
+    assert "/login" in resposta.headers["Location"]
+
+
+@pytest.mark.parametrize(
+    "usuario, urls",
+    [
+        (
+            "residente",
+            ["/dashboard/residente", "/api/dashboard/residente/procedimentos"],
+        ),
+        ("preceptor", ["/dashboard/preceptor", "/api/dashboard/preceptor/avaliados"]),
+    ],
+)
+def test_listas_nao_trazem_o_texto_heipoc(
+    client, dados, entrar, criar_procedimentos, usuario, urls
+):
+    criar_procedimentos(2)
+    criar_procedimentos(2, status="Validado", inicio=date(2025, 2, 1))
+    entrar(getattr(dados, f"{usuario}_email"))
+
+    for url in urls:
+        resposta = client.get(url)
+        assert resposta.status_code == 200
+        conteudo = resposta.get_data(as_text=True)
+        assert "Procedimento 1" in conteudo
+        for texto in TEXTOS_HEIPOC:
+            assert texto not in conteudo, (url, texto)
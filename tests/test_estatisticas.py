@@ -0,0 +1,195 @@
+# tests/test_estatisticas.py
+"""Estatísticas por status, contraparte e mês, e quem pode pedi-las."""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models import Preceptor, Procedimento, Residente
+from app.stats import estatisticas_procedimentos
+
+
+def _procedimento(residente_id, preceptor_id, status, data_realizacao):
+    return Procedimento(
+        nome_procedimento="Procedimento",
+        data_realizacao=data_realizacao,
+        historia_clinica="História.",
+        exame_fisico="Exame.",
+        interpretacao_diagnostico="Diagnóstico.",
+        plano_terapeutico="Plano.",
+        orientacao_paciente="Orientação.",
+        conhecimento_aprendizagem="Aprendizado.",
+        status=status,
+        residente_id=residente_id,
+        preceptor_id=preceptor_id,
+    )
+
+
+@pytest.fixture
+def cenario(app, dados, criar_procedimentos):
+    """Residente Um com procedimentos de dois preceptores em três meses.
+
+    A Dra. Preceptora (de ``dados``) supervisiona os residentes Um e Dois;
+    o Outro Preceptor supervisiona o Residente Três e avaliou um
+    procedimento do Residente Um.
+    """
+    criar_procedimentos(3, status="Validado", inicio=date(2025, 1, 30))
+    criar_procedimentos(2, status="Pendente", inicio=date(2025, 2, 10))
+    criar_procedimentos(1, status="Rejeitado", inicio=date(2025, 3, 5))
+    with app.app_context():
+        original = db.session.get(Residente, dados.residente_id)
+        comuns = dict(
+            celular="0",
+            crm_uf="MG",
+            universidade_id=original.universidade_id,
+            hospital_id=original.hospital_id,
+            especialidade_id=original.especialidade_id,
+        )
+        outro = Preceptor(
+            nome="Outro Preceptor",
+            email="outro@teste.com",
+            cpf="33333333333",
+            crm_numero="30000",
+            **comuns,
+        )
+        db.session.add(outro)
+        db.session.flush()
+
+        def residente(nome, email, cpf, supervisor_id):
+            return Residente(
+                nome=nome,
+                email=email,
+                cpf=cpf,
+                crm_numero=cpf[:5],
+                supervisor_id=supervisor_id,
+                ano_ingresso=2024,
+                categoria="R2",
+                **comuns,
+            )
+
+        dois = residente(
+            "Residente Dois", "dois@teste.com", "44444444444", dados.preceptor_id
+        )
+        tres = residente("Residente Três", "tres@teste.com", "55555555555", outro.id)
+        db.session.add_all([dois, tres])
+        db.session.flush()
+        db.session.add_all(
+            [
+                _procedimento(
+                    dados.residente_id, outro.id, "Validado", date(2025, 3, 20)
+                ),
+                _procedimento(
+                    dois.id, dados.preceptor_id, "Pendente", date(2025, 2, 20)
+                ),
+                _procedimento(tres.id, outro.id, "Validado", date(2025, 2, 1)),
+            ]
+        )
+        db.session.commit()
+        return SimpleNamespace(dois_id=dois.id, tres_id=tres.id)
+
+
+ESPERADO_RESIDENTE = {
+    "total": 7,
+    "por_status": {"Validado": 4, "Pendente": 2, "Rejeitado": 1},
+    "por_contraparte": {
+        "Validado": {"Dra. Preceptora": 3, "Outro Preceptor": 1},
+        "Pendente": {"Dra. Preceptora": 2},
+        "Rejeitado": {"Dra. Preceptora": 1},
+    },
+    "por_mes": {
+        "2025-01": {"Validado": 2},
+        "2025-02": {"Validado": 1, "Pendente": 2},
+        "2025-03": {"Validado": 1, "Rejeitado": 1},
+    },
+}
+
+ESPERADO_PRECEPTOR = {
+    "total": 7,
+    "por_status": {"Validado": 3, "Pendente": 3, "Rejeitado": 1},
+    "por_contraparte": {
+        "Validado": {"Residente Um": 3},
+        "Pendente": {"Residente Um": 2, "Residente Dois": 1},
+        "Rejeitado": {"Residente Um": 1},
+    },
+    "por_mes": {
+        "2025-01": {"Validado": 2},
+        "2025-02": {"Validado": 1, "Pendente": 3},
+        "2025-03": {"Rejeitado": 1},
+    },
+}
+
+
+def test_estatisticas_do_residente(app, dados, cenario):
+    from app.query_counter import contar_queries
+
+    with contar_queries(app) as contador, app.app_context():
+        estatisticas = estatisticas_procedimentos(residente_id=dados.residente_id)
+    assert contador.total == 1
+    assert estatisticas.como_dict() == ESPERADO_RESIDENTE
+    assert estatisticas.contraparte() == {"Dra. Preceptora": 6, "Outro Preceptor": 1}
+
+
+def test_estatisticas_do_preceptor(app, dados, cenario):
+    from app.query_counter import contar_queries
+
+    with contar_queries(app) as contador, app.app_context():
+        estatisticas = estatisticas_procedimentos(preceptor_id=dados.preceptor_id)
+    assert contador.total == 1
+    assert estatisticas.como_dict() == ESPERADO_PRECEPTOR
+
+
+def test_estatisticas_exigem_um_escopo(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            estatisticas_procedimentos()
+        with pytest.raises(ValueError):
+            estatisticas_procedimentos(residente_id=1, preceptor_id=1)
+
+
+def test_api_devolve_as_estatisticas_do_usuario(client, dados, entrar, cenario):
+    entrar(dados.residente_email)
+    assert client.get("/api/estatisticas").json == ESPERADO_RESIDENTE
+    resposta = client.get(
+        "/api/estatisticas", query_string={"residente_id": dados.residente_id}
+    )
+    assert resposta.json == ESPERADO_RESIDENTE
+    client.get("/logout")
+
+    entrar(dados.preceptor_email)
+    assert client.get("/api/estatisticas").json == ESPERADO_PRECEPTOR
+    resposta = client.get(
+        "/api/estatisticas", query_string={"residente_id": cenario.dois_id}
+    )
+    assert resposta.json == {
+        "total": 1,
+        "por_status": {"Pendente": 1},
+        "por_contraparte": {"Pendente": {"Dra. Preceptora": 1}},
+        "por_mes": {"2025-02": {"Pendente": 1}},
+    }
+
+
+@pytest.mark.parametrize(
+    "usuario, residente, status",
+    [
+        ("residente", "dois", 403),
+        ("preceptor", "tres", 403),
+        ("preceptor", "inexistente", 404),
+    ],
+)
+def test_api_nega_estatisticas_de_outros(
+    client, dados, entrar, cenario, usuario, residente, status
+):
+    ids = {"dois": cenario.dois_id, "tres": cenario.tres_id, "inexistente": 999999}
+    entrar(getattr(dados, f"{usuario}_email"))
+
+    resposta = client.get(
+        "/api/estatisticas", query_string={"residente_id": ids[residente]}
+    )
+    assert resposta.status_code == status
+
+
+def test_api_exige_login(client):
+    resposta = client.get("/api/estatisticas")
+    assert resposta.status_code == 302
+    assert "/login" in resposta.headers["Location"]
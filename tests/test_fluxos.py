@@ -0,0 +1,682 @@
+# tests/test_fluxos.py
+"""Fluxos de ponta a ponta: login, dashboards, avaliação e exportações."""
+import csv
+import io
+
+import pytest
+
+from app import db
+from app.models import EmailOutbox, Procedimento
+
+
+def _weasyprint_disponivel():
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        # OSError: o pacote está lá, mas faltam as bibliotecas do sistema (Pango)
+        return False
+    return True
+
+
+def test_login_leva_ao_dashboard_do_usuario(client, dados, entrar):
+    resposta = entrar(dados.residente_email)
+    assert resposta.status_code == 302
+    assert resposta.headers["Location"].endswith("/home")
+
+    resposta = client.get("/home")
+    assert resposta.headers["Location"].endswith("/dashboard/residente")
+
+
+def test_login_com_senha_errada(client, dados, entrar):
+    resposta = entrar(dados.preceptor_email, "senha-errada")
+    assert resposta.status_code == 200
+    assert "Login inválido" in resposta.get_data(as_text=True)
+
+    resposta = client.get("/dashboard/preceptor")
+    assert resposta.status_code == 302
+    assert "/login" in resposta.headers["Location"]
+
+
+def test_dashboard_do_residente_lista_os_procedimentos(
+    client, dados, entrar, criar_procedimentos
+):
+    criar_procedimentos(3)
+    entrar(dados.residente_email)
+
+    html = client.get("/dashboard/residente").get_data(as_text=True)
+    for i in range(1, 4):
+        assert f"Procedimento {i}" in html
+    assert "Dra. Preceptora" in html
+
+
+def test_dashboard_do_preceptor_lista_pendentes_e_avaliados(
+    client, dados, entrar, criar_procedimentos
+):
+    criar_procedimentos(2)
+    criar_procedimentos(1, status="Validado")
+    entrar(dados.preceptor_email)
+
+    resposta = client.get("/dashboard/preceptor")
+    html = resposta.get_data(as_text=True)
+    assert resposta.status_code == 200
+    assert html.count('data-bs-target="#avaliacaoModal"') == 2
+    assert html.count('data-bs-target="#detalhesModal"') == 1
+    assert "Residente Um" in html
+
+
+def test_residente_nao_acessa_o_dashboard_do_preceptor(client, dados, entrar):
+    entrar(dados.residente_email)
+    resposta = client.get("/dashboard/preceptor")
+    assert resposta.status_code == 302
+    assert resposta.headers["Location"].endswith("/home")
+
+
+def test_avaliacao_valida_o_procedimento_e_enfileira_o_email(
+    app, client, dados, entrar, criar_procedimentos
+):
+    (procedimento_id,) = criar_procedimentos(1)
+    entrar(dados.preceptor_email)
+
+    resposta = client.post(
+        "/dashboard/preceptor",
+        data={
+            "procedimento_id": procedimento_id,
+            "observacao": "Muito bem conduzido.",
+            "validar": "Validar Procedimento",
+        },
+    )
+    assert resposta.status_code == 302
+    html = client.get("/dashboard/preceptor").get_data(as_text=True)
+    assert "validado com sucesso" in html
+
+    with app.app_context():
+        procedimento = db.session.get(Procedimento, procedimento_id)
+        assert procedimento.status == "Validado"
+        assert procedimento.observacao_preceptor == "Muito bem conduzido."
+        emails = EmailOutbox.query.all()
+        assert [email.destinatarios for email in emails] == [dados.residente_email]
+        assert emails[0].status == "Pendente"
+
+
+def test_preceptor_so_avalia_os_proprios_procedimentos(
+    app, client, dados, entrar, criar_procedimentos
+):
+    from app.models import Preceptor
+
+    (procedimento_id,) = criar_procedimentos(1)
+    with app.app_context():
+        original = db.session.get(Preceptor, dados.preceptor_id)
+        outro = Preceptor(
+            nome="Outro Preceptor",
+            email="outro@teste.com",
+            celular="0",
+            cpf="33333333333",
+            crm_uf="MG",
+            crm_numero="30000",
+            universidade_id=original.universidade_id,
+            hospital_id=original.hospital_id,
+            especialidade_id=original.especialidade_id,
+        )
+        outro.set_senha("senha-de-teste")
+        db.session.add(outro)
+        db.session.commit()
+    entrar("outro@teste.com")
+
+    client.post(
+        "/dashboard/preceptor",
+        data={"procedimento_id": procedimento_id, "rejeitar": "Rejeitar"},
+    )
+    with app.app_context():
+        assert db.session.get(Procedimento, procedimento_id).status == "Pendente"
+        assert EmailOutbox.query.count() == 0
+
+
+def test_exportacao_csv_do_logbook(client, dados, entrar, criar_procedimentos):
+    criar_procedimentos(3, status="Validado")
+    entrar(dados.residente_email)
+
+    resposta = client.get(f"/relatorio/residente/{dados.residente_id}/logbook.csv")
+    assert resposta.status_code == 200
+    assert resposta.mimetype == "text/csv"
+    assert "logbook_residente_um.csv" in resposta.headers["Content-Disposition"]
+
+    linhas = list(csv.reader(io.StringIO(resposta.get_data(as_text=True))))
+    assert linhas[0][0] == "\ufeffID"
+    # Uma coluna por campo HEIPOC, para filtrar e ordenar na planilha
+    heipoc = [titulo for titulo in linhas[0] if titulo[:4] in ("H - ", "E - ")]
+    assert heipoc == ["H - História clínica", "E - Exame físico"]
+    coluna = linhas[0].index("H - História clínica")
+    assert linhas[1][coluna] == "História clínica do paciente 1."
+    coluna = linhas[0].index("C - Conhecimento adquirido")
+    assert linhas[1][coluna] == "Aprendizado do caso."
+    assert [linha[1] for linha in linhas[1:]] == [
+        "Procedimento 1",
+        "Procedimento 2",
+        "Procedimento 3",
+    ]
+
+
+def test_exportacao_xlsx_do_logbook(client, dados, entrar, criar_procedimentos):
+    criar_procedimentos(2)
+    entrar(dados.preceptor_email)
+
+    resposta = client.get(f"/relatorio/residente/{dados.residente_id}/logbook.xlsx")
+    assert resposta.status_code == 200
+    # XLSX é um ZIP
+    assert resposta.data[:2] == b"PK"
+
+
+def test_residente_nao_exporta_o_logbook_de_outro(app, client, dados, entrar):
+    from app.models import Residente
+
+    with app.app_context():
+        original = db.session.get(Residente, dados.residente_id)
+        outro = Residente(
+            nome="Residente Dois",
+            email="dois@teste.com",
+            celular="0",
+            cpf="44444444444",
+            crm_uf="MG",
+            crm_numero="40000",
+            especialidade_id=original.especialidade_id,
+            supervisor_id=original.supervisor_id,
+            universidade_id=original.universidade_id,
+            hospital_id=original.hospital_id,
+            ano_ingresso=2024,
+            categoria="R2",
+        )
+        db.session.add(outro)
+        db.session.commit()
+        outro_id = outro.id
+    entrar(dados.residente_email)
+
+    resposta = client.get(f"/relatorio/residente/{outro_id}/logbook.csv")
+    assert resposta.status_code == 302
+    assert resposta.headers["Location"].endswith("/dashboard/residente")
+
+
+@pytest.mark.skipif(not _weasyprint_disponivel(), reason="WeasyPrint indisponível")
+def test_relatorio_em_pdf_e_revalidado_pelo_etag(
+    client, dados, entrar, criar_procedimentos
+):
+    criar_procedimentos(2, status="Validado")
+    entrar(dados.residente_email)
+    url = f"/relatorio/residente/{dados.residente_id}"
+
+    resposta = client.get(url)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == "application/pdf"
+    assert resposta.data[:4] == b"%PDF"
+
+    etag = resposta.headers["ETag"]
+    resposta = client.get(url, headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+
+
+def test_exportacao_neutraliza_formulas_e_nomes_de_planilha(
+    app, client, dados, entrar, criar_procedimentos
+):
+    from app.models import Residente
+
+    (procedimento_id,) = criar_procedimentos(1)
+    with app.app_context():
+        db.session.get(Procedimento, procedimento_id).nome_procedimento = (
+            '=HYPERLINK("http://exemplo.com")'
+        )
+        db.session.get(Residente, dados.residente_id).nome = "Residente [Um]: R1/R2?"
+        db.session.commit()
+    entrar(dados.residente_email)
+
+    resposta = client.get(f"/relatorio/residente/{dados.residente_id}/logbook.csv")
+    linhas = list(csv.reader(io.StringIO(resposta.get_data(as_text=True))))
+    assert linhas[1][1] == "'=HYPERLINK(\"http://exemplo.com\")"
+
+    resposta = client.get(f"/relatorio/residente/{dados.residente_id}/logbook.xlsx")
+    assert resposta.status_code == 200
+    assert resposta.data[:2] == b"PK"
+
+
+def _outro_preceptor_com_residente(app, dados):
+    """Preceptor e residente fora da supervisão de ``dados``, com um procedimento."""
+    from datetime import date
+
+    from app.models import Preceptor, Residente
+
+    with app.app_context():
+        original = db.session.get(Residente, dados.residente_id)
+        comuns = dict(
+            celular="0",
+            crm_uf="MG",
+            universidade_id=original.universidade_id,
+            hospital_id=original.hospital_id,
+            especialidade_id=original.especialidade_id,
+        )
+        preceptor = Preceptor(
+            nome="Outro Preceptor",
+            email="outro@teste.com",
+            cpf="33333333333",
+            crm_numero="30000",
+            **comuns,
+        )
+        preceptor.set_senha("senha-de-teste")
+        db.session.add(preceptor)
+        db.session.flush()
+        residente = Residente(
+            nome="Residente Dois",
+            email="dois@teste.com",
+            cpf="44444444444",
+            crm_numero="40000",
+            supervisor_id=preceptor.id,
+            ano_ingresso=2024,
+            categoria="R2",
+            **comuns,
+        )
+        db.session.add(residente)
+        db.session.flush()
+        db.session.add(
+            Procedimento(
+                nome_procedimento="Paracentese",
+                data_realizacao=date(2025, 2, 1),
+                historia_clinica="História clínica do paciente com ascite.",
+                exame_fisico="Macicez móvel.",
+                interpretacao_diagnostico="Cirrose.",
+                plano_terapeutico="Paracentese de alívio.",
+                orientacao_paciente="Retorno em uma semana.",
+                conhecimento_aprendizagem="Técnica asséptica.",
+                residente_id=residente.id,
+                preceptor_id=preceptor.id,
+            )
+        )
+        db.session.commit()
+
+
+def _buscar(client, q):
+    resposta = client.get("/api/procedimentos/busca", query_string={"q": q})
+    assert resposta.status_code == 200
+    return resposta.json
+
+
+def test_busca_encontra_pelo_texto_heipoc(client, dados, entrar, criar_procedimentos):
+    criar_procedimentos(3)
+    entrar(dados.residente_email)
+
+    resultado = _buscar(client, "paciente 2")
+    assert resultado["total"] == 1
+    assert [item["nome_procedimento"] for item in resultado["itens"]] == [
+        "Procedimento 2"
+    ]
+
+    # Prefixo da palavra também encontra
+    assert _buscar(client, "pacien")["total"] == 3
+    assert _buscar(client, "inexistente")["total"] == 0
+    # Sintaxe do FTS5 no texto não vira erro
+    assert _buscar(client, 'paciente" OR *')["total"] == 3
+
+
+def test_busca_no_indice_fts_ignora_acentos_e_marca_o_trecho(
+    app, client, dados, entrar, criar_procedimentos
+):
+    from app.search import indice_disponivel
+
+    with app.app_context():
+        if not indice_disponivel():
+            pytest.skip("Banco sem FTS5")
+    (procedimento_id,) = criar_procedimentos(1)
+    entrar(dados.residente_email)
+
+    (item,) = _buscar(client, "historia clinica")["itens"]
+    assert "<mark>" in item["trecho"]
+
+    # O trigger de UPDATE mantém o índice em dia
+    with app.app_context():
+        db.session.get(Procedimento, procedimento_id).historia_clinica = "Dispneia."
+        db.session.commit()
+    assert _buscar(client, "historia")["total"] == 0
+    assert _buscar(client, "dispneia")["total"] == 1
+
+
+def test_busca_so_mostra_procedimentos_visiveis_ao_usuario(
+    app, client, dados, entrar, criar_procedimentos
+):
+    criar_procedimentos(2)
+    _outro_preceptor_com_residente(app, dados)
+
+    # Residente: só os próprios procedimentos
+    entrar(dados.residente_email)
+    assert _buscar(client, "paciente")["total"] == 2
+    assert _buscar(client, "paracentese")["total"] == 0
+    client.get("/logout")
+
+    # Preceptor: os que avalia e os dos residentes que supervisiona
+    entrar(dados.preceptor_email)
+    resultado = _buscar(client, "paciente")
+    assert resultado["total"] == 2
+    assert {item["residente"] for item in resultado["itens"]} == {"Residente Um"}
+    client.get("/logout")
+
+    entrar("outro@teste.com")
+    (item,) = _buscar(client, "paciente")["itens"]
+    assert item["nome_procedimento"] == "Paracentese"
+    assert item["residente"] == "Residente Dois"
+
+
+@pytest.fixture
+def app_com_leitura(app, monkeypatch):
+    """Aplicação com o bind ``leitura`` apontando para o mesmo banco.
+
+    No SQLite é uma conexão ``mode=ro`` ao mesmo arquivo; no PostgreSQL, uma
+    segunda engine para o mesmo banco. Cada engine anota os SQL que executa.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import make_url
+
+    from app import create_app
+    from app.jobs import fila_relatorios
+
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        url_leitura = f"sqlite:///file:{url.database}?mode=ro&uri=true"
+    else:
+        url_leitura = url.render_as_string(hide_password=False)
+    config = type(
+        "ConfigLeitura",
+        (fila_relatorios._config_class,),
+        {"SQLALCHEMY_BINDS": {"leitura": url_leitura}},
+    )
+    # A segunda aplicação não pode tomar o lugar da primeira na fila
+    monkeypatch.setattr(fila_relatorios, "_app", fila_relatorios._app)
+    monkeypatch.setattr(fila_relatorios, "_config_class", config.__base__)
+    outra = create_app(config)
+
+    comandos = {}
+    with outra.app_context():
+        for chave, engine in db.engines.items():
+            comandos[chave or "principal"] = anotados = []
+            event.listen(
+                engine,
+                "before_cursor_execute",
+                lambda conn, cursor, sql, *args, anotados=anotados: anotados.append(
+                    sql
+                ),
+            )
+    outra.comandos = comandos
+    yield outra
+    with outra.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _cliente_do_preceptor(app, dados):
+    client = app.test_client()
+    client.post(
+        "/login", data={"email": dados.preceptor_email, "password": "senha-de-teste"}
+    )
+    return client
+
+
+def test_views_de_leitura_usam_o_bind_de_leitura(
+    app_com_leitura, dados, criar_procedimentos
+):
+    criar_procedimentos(2)
+    client = _cliente_do_preceptor(app_com_leitura, dados)
+    comandos = app_com_leitura.comandos
+    for anotados in comandos.values():
+        anotados.clear()
+
+    with client.get("/dashboard/preceptor") as resposta:
+        assert "Procedimento 2" in resposta.get_data(as_text=True)
+
+    # Os procedimentos vêm da réplica; nada de leitura deles no principal
+    assert any("FROM procedimento" in sql for sql in comandos["leitura"])
+    assert not any("FROM procedimento" in sql for sql in comandos["principal"])
+
+
+def test_escrita_mantem_as_leituras_no_principal_pela_janela(
+    app_com_leitura, dados, criar_procedimentos, monkeypatch
+):
+    (procedimento_id,) = criar_procedimentos(1)
+    client = _cliente_do_preceptor(app_com_leitura, dados)
+    comandos = app_com_leitura.comandos
+
+    resposta = client.post(
+        "/dashboard/preceptor",
+        data={"procedimento_id": procedimento_id, "validar": "x"},
+    )
+    assert resposta.status_code == 302
+    # A escrita e o que veio antes dela na mesma requisição ficam no principal
+    assert any(sql.startswith("UPDATE procedimento") for sql in comandos["principal"])
+    assert not any(sql.startswith("UPDATE") for sql in comandos["leitura"])
+
+    # Logo depois da escrita, a view de leitura continua no principal
+    comandos["leitura"].clear()
+    with client.get("/dashboard/preceptor") as resposta:
+        assert resposta.status_code == 200
+    assert comandos["leitura"] == []
+
+    # Passada a janela, volta para a réplica
+    monkeypatch.setitem(app_com_leitura.config, "LEITURA_JANELA_POS_ESCRITA", 0)
+    with client.get("/dashboard/preceptor") as resposta:
+        assert resposta.status_code == 200
+    assert any("FROM procedimento" in sql for sql in comandos["leitura"])
+
+
+def _escrever_com_query_update(Procedimento):
+    db.session.query(Procedimento).update(
+        {"status": "Validado"}, synchronize_session=False
+    )
+
+
+def _escrever_com_query_delete(Procedimento):
+    db.session.query(Procedimento).delete(synchronize_session=False)
+
+
+def _escrever_com_db_update(Procedimento):
+    db.session.execute(db.update(Procedimento).values(status="Validado"))
+
+
+@pytest.mark.parametrize(
+    "escrever",
+    [_escrever_com_query_update, _escrever_com_query_delete, _escrever_com_db_update],
+    ids=["query_update", "query_delete", "db_update"],
+)
+def test_escrita_em_massa_tira_a_requisicao_da_replica(
+    app_com_leitura, criar_procedimentos, escrever
+):
+    from flask import g
+
+    from app.models import Procedimento
+
+    criar_procedimentos(1)
+    consulta = db.select(Procedimento)
+    with app_com_leitura.test_request_context():
+        g.usar_leitura = True
+        assert db.session.get_bind(clause=consulta) is db.engines["leitura"]
+
+        escrever(Procedimento)
+
+        assert db.session.info["escreveu"]
+        assert db.session.get_bind(clause=consulta) is db.engines[None]
+        db.session.rollback()
+
+
+def test_cache_de_identidades_e_invalidado_ao_alterar_o_usuario(
+    app, client, dados, entrar
+):
+    from app.identity import cache_identidades
+    from app.models import Residente
+
+    user_id = f"residente-{dados.residente_id}"
+    entrar(dados.residente_email)
+    assert "Olá, Residente Um" in client.get("/dashboard/residente").get_data(
+        as_text=True
+    )
+
+    with app.app_context():
+        principal = cache_identidades.obter(user_id)
+        # Do cache: o mesmo objeto, sem consultar o banco
+        assert cache_identidades.obter(user_id) is principal
+
+        # Alteração por fora da ORM não é vista até invalidar
+        db.session.execute(
+            db.update(Residente)
+            .where(Residente.id == dados.residente_id)
+            .values(nome="Residente Renomeado")
+        )
+        db.session.commit()
+        assert cache_identidades.obter(user_id).nome == "Residente Um"
+        cache_identidades.invalidar(user_id)
+        assert cache_identidades.obter(user_id).nome == "Residente Renomeado"
+
+        # Pela ORM, o próprio UPDATE invalida a entrada
+        db.session.get(Residente, dados.residente_id).nome = "Residente Três"
+        db.session.commit()
+        assert cache_identidades.obter(user_id).nome == "Residente Três"
+    assert "Olá, Residente Três" in client.get("/dashboard/residente").get_data(
+        as_text=True
+    )
+
+
+def test_usuario_removido_perde_a_sessao(app, client, dados, entrar):
+    from app.identity import cache_identidades
+    from app.models import Residente
+
+    user_id = f"residente-{dados.residente_id}"
+    entrar(dados.residente_email)
+    assert client.get("/dashboard/residente").status_code == 200
+
+    with app.app_context():
+        assert cache_identidades.obter(user_id) is not None
+        db.session.delete(db.session.get(Residente, dados.residente_id))
+        db.session.commit()
+        assert cache_identidades.obter(user_id) is None
+
+    resposta = client.get("/dashboard/residente")
+    assert resposta.status_code == 302
+    assert "/login" in resposta.headers["Location"]
+
+
+def test_login_refaz_o_hash_de_politica_antiga(app, client, dados, entrar):
+    from werkzeug.security import generate_password_hash
+
+    from app.models import Residente
+
+    def hash_atual():
+        with app.app_context():
+            return db.session.get(Residente, dados.residente_id).senha_hash
+
+    antigo = generate_password_hash("senha-de-teste", "pbkdf2:sha256:500", 8)
+    with app.app_context():
+        db.session.get(Residente, dados.residente_id).senha_hash = antigo
+        db.session.commit()
+
+    # Senha errada não mexe no hash
+    entrar(dados.residente_email, "senha-errada")
+    assert hash_atual() == antigo
+
+    assert entrar(dados.residente_email).status_code == 302
+    novo = hash_atual()
+    metodo = app.config["SENHA_HASH_METODO"]
+    assert novo.startswith(f"{metodo}$")
+    assert len(novo.split("$")[1]) == app.config["SENHA_SALT_TAMANHO"]
+
+    # Com o hash já na política atual, o próximo login não regrava
+    client.get("/logout")
+    assert entrar(dados.residente_email).status_code == 302
+    assert hash_atual() == novo
+
+
+def test_alteracao_de_referencias_incrementa_a_versao(app, dados, monkeypatch):
+    from app.models import Especialidade, VersaoReferencias
+    from app.reference_data import registro_referencias
+
+    def versao():
+        return db.session.get(VersaoReferencias, 1).versao
+
+    with app.app_context():
+        antes = registro_referencias.obter()
+        assert registro_referencias.obter() is antes
+        assert antes.versao == versao()
+
+        # Pela ORM: a versão sobe na mesma transação e o registro é recarregado
+        db.session.add(Especialidade(nome="Cardiologia"))
+        db.session.commit()
+        assert versao() == antes.versao + 1
+        depois = registro_referencias.obter()
+        assert depois.versao == versao()
+        assert "Cardiologia" in depois.especialidades.por_nome
+
+        # Outro worker alterou e incrementou a versão: este processo só vê a
+        # mudança na próxima conferência, depois do intervalo
+        tabela = VersaoReferencias.__table__
+        db.session.execute(db.insert(Especialidade).values(nome="Dermatologia"))
+        db.session.execute(tabela.update().values(versao=tabela.c.versao + 1))
+        db.session.commit()
+        assert registro_referencias.obter() is depois
+        monkeypatch.setattr(registro_referencias, "intervalo", 0)
+        recarregado = registro_referencias.obter()
+        assert recarregado.versao == depois.versao + 1
+        assert "Dermatologia" in recarregado.especialidades.por_nome
+
+        # Sem mudança de versão, a conferência não recarrega
+        assert registro_referencias.obter() is recarregado
+
+
+def test_contador_de_referencias_nasce_com_a_tabela(app, tmp_path):
+    from sqlalchemy import create_engine
+
+    from app.migrations import MIGRACOES
+    from app.models import VersaoReferencias
+
+    tabela = VersaoReferencias.__table__
+    engine = create_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+    with app.app_context():
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            assert conn.execute(db.select(tabela)).all() == [(1, 0)]
+
+            # A migração cria a linha em bancos que já tinham a tabela
+            conn.execute(tabela.delete())
+            (migracao,) = [m for m in MIGRACOES if m.versao == 7]
+            migracao.aplicar(conn)
+            migracao.aplicar(conn)
+            assert conn.execute(db.select(tabela)).all() == [(1, 0)]
+    engine.dispose()
+
+
+def test_registro_de_referencias_so_e_descartado_no_commit(app, dados):
+    from app.models import Especialidade
+    from app.reference_data import registro_referencias
+
+    with app.app_context():
+        antes = registro_referencias.obter()
+
+        db.session.add(Especialidade(nome="Cardiologia"))
+        db.session.flush()
+        assert registro_referencias.obter() is antes
+        db.session.rollback()
+        assert registro_referencias.obter() is antes
+
+        db.session.add(Especialidade(nome="Cardiologia"))
+        db.session.commit()
+        depois = registro_referencias.obter()
+        assert depois is not antes
+        assert depois.versao == antes.versao + 1
+        assert "Cardiologia" in depois.especialidades.por_nome
+
+
+def test_carga_anterior_ao_descarte_nao_fica_no_registro(app, dados, monkeypatch):
+    import app.reference_data as reference_data
+
+    carregar = reference_data._carregar
+
+    def carregar_e_alterar():
+        referencias = carregar()
+        # Outra thread fez commit de uma alteração durante a carga
+        reference_data.registro_referencias.invalidar()
+        return referencias
+
+    monkeypatch.setattr(reference_data, "_carregar", carregar_e_alterar)
+    with app.app_context():
+        primeira = reference_data.registro_referencias.obter()
+        assert reference_data.registro_referencias.obter() is not primeira
@@ -0,0 +1,152 @@
+# tests/test_jobs.py
+"""Fila de relatórios: falhas fora do job e jobs esquecidos na fila."""
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.jobs import fila_relatorios
+from app.models import RelatorioJob
+
+
+@pytest.fixture
+def criar_job(app, dados):
+    def criar(status="Pendente", idade=timedelta(0)):
+        momento = datetime.now(timezone.utc) - idade
+        with app.app_context():
+            job = RelatorioJob(
+                residente_id=dados.residente_id,
+                solicitante_id=f"residente-{dados.residente_id}",
+                status=status,
+                criado_em=momento,
+                atualizado_em=momento,
+            )
+            db.session.add(job)
+            db.session.commit()
+            return job.id
+
+    return criar
+
+
+def test_falha_do_worker_antes_de_reivindicar_marca_o_job(app, criar_job):
+    job_id = criar_job()
+    futuro = Future()
+    futuro.set_exception(RuntimeError("banco fora do ar"))
+
+    fila_relatorios._ao_terminar(None, job_id, futuro)
+
+    with app.app_context():
+        job = db.session.get(RelatorioJob, job_id)
+        assert job.status == "Erro"
+        assert job.erro == "banco fora do ar"
+
+
+def test_callback_nao_sobrescreve_job_concluido(app, criar_job):
+    job_id = criar_job(status="Concluido")
+    futuro = Future()
+    futuro.set_exception(RuntimeError("tarde demais"))
+
+    fila_relatorios._ao_terminar(None, job_id, futuro)
+
+    with app.app_context():
+        job = db.session.get(RelatorioJob, job_id)
+        assert job.status == "Concluido"
+        assert job.erro is None
+
+
+def test_status_expira_job_parado_na_fila(app, client, dados, entrar, criar_job):
+    job_id = criar_job(
+        idade=timedelta(seconds=app.config["RELATORIO_JOB_PENDENTE_TIMEOUT"] + 60)
+    )
+    entrar(dados.residente_email)
+
+    resposta = client.get(f"/relatorio/job/{job_id}")
+    assert resposta.status_code == 200
+    assert resposta.json["status"] == "Erro"
+    assert "não foi processado a tempo" in resposta.json["erro"]
+
+
+def test_job_nao_depende_do_pdf_continuar_no_cache(
+    app, criar_job, tmp_path, monkeypatch
+):
+    import app.jobs as jobs
+    import app.reports as reports
+    from app.report_cache import cache_relatorios
+
+    job_id = criar_job()
+    monkeypatch.setattr(jobs, "_app_worker", app)
+    monkeypatch.setattr(reports, "gerar_pdf", lambda html: b"%PDF-1.7 teste")
+    monkeypatch.setitem(app.config, "RELATORIO_JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(cache_relatorios, "diretorio", str(tmp_path / "cache"))
+    # Cache menor que um PDF: o arquivo some logo depois de gravado
+    monkeypatch.setattr(cache_relatorios, "max_bytes", 1)
+
+    jobs._executar_job(job_id)
+
+    with app.app_context():
+        job = db.session.get(RelatorioJob, job_id)
+        assert job.status == "Concluido", job.erro
+        with open(job.arquivo, "rb") as arquivo:
+            assert arquivo.read() == b"%PDF-1.7 teste"
+    assert not list((tmp_path / "cache").iterdir())
+
+
+@pytest.fixture
+def pool_quebrado(monkeypatch):
+    """Troca a criação do pool por um registro dos jobs reenviados."""
+    from concurrent.futures.process import BrokenProcessPool
+
+    reenviados = []
+    monkeypatch.setattr(fila_relatorios, "_reenviados", set())
+    monkeypatch.setattr(fila_relatorios, "_descartar", lambda executor: None)
+    monkeypatch.setattr(fila_relatorios, "_obter_executor", lambda: "pool novo")
+    monkeypatch.setattr(
+        fila_relatorios,
+        "_submeter",
+        lambda executor, job_id: reenviados.append((executor, job_id)),
+    )
+
+    def quebrar(job_id):
+        futuro = Future()
+        futuro.set_exception(BrokenProcessPool("processo morto"))
+        fila_relatorios._ao_terminar("pool antigo", job_id, futuro)
+
+    quebrar.reenviados = reenviados
+    return quebrar
+
+
+@pytest.mark.parametrize("status", ["Pendente", "Processando"])
+def test_pool_quebrado_devolve_o_job_a_fila(app, criar_job, pool_quebrado, status):
+    job_id = criar_job(status=status)
+
+    pool_quebrado(job_id)
+
+    assert pool_quebrado.reenviados == [("pool novo", job_id)]
+    with app.app_context():
+        job = db.session.get(RelatorioJob, job_id)
+        assert job.status == "Pendente"
+        assert job.erro is None
+
+
+def test_job_que_quebra_o_pool_de_novo_fica_com_erro(app, criar_job, pool_quebrado):
+    job_id = criar_job(status="Processando")
+
+    pool_quebrado(job_id)
+    pool_quebrado(job_id)
+
+    assert len(pool_quebrado.reenviados) == 1
+    with app.app_context():
+        job = db.session.get(RelatorioJob, job_id)
+        assert job.status == "Erro"
+        assert job.erro == "processo morto"
+
+
+def test_pool_quebrado_nao_reenvia_job_concluido(app, criar_job, pool_quebrado):
+    job_id = criar_job(status="Concluido")
+
+    pool_quebrado(job_id)
+
+    assert pool_quebrado.reenviados == []
+    with app.app_context():
+        assert db.session.get(RelatorioJob, job_id).status == "Concluido"
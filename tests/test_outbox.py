@@ -0,0 +1,220 @@
+# tests/test_outbox.py
+"""Caixa de saída de emails contra um servidor SMTP local (aiosmtpd)."""
+import socket
+from datetime import datetime, timedelta, timezone
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+import pytest
+
+from app import db
+from app.email import send_email
+from app.models import EmailOutbox
+from app.outbox import RemetenteOutbox
+
+controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class _Caixa:
+    """Handler do aiosmtpd que guarda as mensagens ou recusa com ``resposta``."""
+
+    def __init__(self):
+        self.mensagens = []
+        self.sessoes = []
+        self.resposta = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.resposta:
+            return self.resposta
+        self.mensagens.append(message_from_bytes(envelope.content))
+        self.sessoes.append(id(session))
+        return "250 OK"
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    caixa = _Caixa()
+    servidor = controller.Controller(caixa, hostname="127.0.0.1", port=_porta_livre())
+    servidor.start()
+    estado = app.extensions["mail"]
+    monkeypatch.setattr(estado, "server", servidor.hostname)
+    monkeypatch.setattr(estado, "port", servidor.port)
+    monkeypatch.setattr(estado, "use_tls", False)
+    monkeypatch.setattr(estado, "use_ssl", False)
+    monkeypatch.setattr(estado, "username", None)
+    monkeypatch.setattr(estado, "password", None)
+    # Com TESTING o Flask-Mail só finge que envia
+    monkeypatch.setattr(estado, "suppress", False)
+    yield caixa
+    servidor.stop()
+
+
+def _enfileirar(app, quantidade):
+    with app.app_context():
+        for i in range(quantidade):
+            send_email(
+                f"Assunto {i + 1}",
+                "logbook@teste.com",
+                ["residente@teste.com"],
+                f"Corpo {i + 1}",
+            )
+        db.session.commit()
+
+
+def _drenar(app):
+    with app.app_context():
+        remetente = RemetenteOutbox(app)
+        try:
+            return remetente.drenar()
+        finally:
+            remetente._fechar_conexao()
+
+
+def _assunto(mensagem):
+    return str(make_header(decode_header(mensagem["Subject"])))
+
+
+def test_entrega_o_lote_numa_conexao_so(app, smtp):
+    _enfileirar(app, 3)
+
+    assert _drenar(app) == 3
+
+    assert [_assunto(m) for m in smtp.mensagens] == [
+        "Assunto 1",
+        "Assunto 2",
+        "Assunto 3",
+    ]
+    assert len(set(smtp.sessoes)) == 1
+    with app.app_context():
+        emails = EmailOutbox.query.all()
+        assert {email.status for email in emails} == {"Enviado"}
+        assert all(email.enviado_em for email in emails)
+
+
+def test_falha_temporaria_volta_para_a_fila_com_backoff(app, smtp):
+    smtp.resposta = "451 Tente mais tarde"
+    _enfileirar(app, 1)
+    antes = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    _drenar(app)
+
+    base = app.config["EMAIL_OUTBOX_BACKOFF_BASE"]
+    with app.app_context():
+        email = EmailOutbox.query.one()
+        assert email.status == "Pendente"
+        assert email.tentativas == 1
+        assert "451" in email.ultimo_erro
+        proxima = email.proxima_tentativa.replace(tzinfo=None)
+        espera = (proxima - antes).total_seconds()
+        assert base - 5 <= espera <= base + 5
+
+        # Ainda não venceu: a próxima rodada não tenta de novo
+        assert RemetenteOutbox(app).drenar() == 0
+
+        # Na última tentativa permitida o email é descartado
+        email.tentativas = app.config["EMAIL_OUTBOX_MAX_TENTATIVAS"] - 1
+        email.proxima_tentativa = datetime.now(timezone.utc)
+        db.session.commit()
+    _drenar(app)
+
+    with app.app_context():
+        email = EmailOutbox.query.one()
+        assert email.status == "Falhou"
+        assert email.tentativas == app.config["EMAIL_OUTBOX_MAX_TENTATIVAS"]
+    assert smtp.mensagens == []
+
+
+def test_avaliacoes_na_janela_saem_num_resumo(
+    app, client, dados, entrar, criar_procedimentos, smtp, monkeypatch
+):
+    monkeypatch.setitem(app.config, "EMAIL_RESUMO_JANELA", 300)
+    ids = criar_procedimentos(2)
+    entrar(dados.preceptor_email)
+    for procedimento_id, botao in zip(ids, ["validar", "rejeitar"]):
+        client.post(
+            "/dashboard/preceptor",
+            data={"procedimento_id": procedimento_id, botao: "x"},
+        )
+
+    # Dentro da janela nada sai
+    assert _drenar(app) == 0
+
+    with app.app_context():
+        primeiro = EmailOutbox.query.order_by(EmailOutbox.id).first()
+        primeiro.proxima_tentativa = datetime.now(timezone.utc) - timedelta(
+            seconds=1
+        )
+        db.session.commit()
+    # Vencido o primeiro, os dois saem juntos
+    assert _drenar(app) == 2
+
+    (mensagem,) = smtp.mensagens
+    assert _assunto(mensagem).startswith("📋 2 procedimentos avaliados")
+    assert "1 aprovado(s), 1 rejeitado(s)" in _assunto(mensagem)
+    with app.app_context():
+        assert {email.status for email in EmailOutbox.query} == {"Enviado"}
+
+
+def test_resumo_com_um_procedimento_so_envia_cada_email(
+    app, client, dados, entrar, criar_procedimentos, smtp, monkeypatch
+):
+    from app.models import Procedimento
+
+    monkeypatch.setitem(app.config, "EMAIL_RESUMO_JANELA", 300)
+    ids = criar_procedimentos(2)
+    entrar(dados.preceptor_email)
+    for procedimento_id in ids:
+        client.post(
+            "/dashboard/preceptor",
+            data={"procedimento_id": procedimento_id, "validar": "x"},
+        )
+
+    with app.app_context():
+        # O segundo procedimento foi removido antes do envio
+        removido = EmailOutbox.query.filter_by(procedimento_id=ids[1]).one()
+        removido.procedimento_id = None
+        db.session.delete(db.session.get(Procedimento, ids[1]))
+        EmailOutbox.query.update(
+            {"proxima_tentativa": datetime.now(timezone.utc) - timedelta(seconds=1)}
+        )
+        db.session.commit()
+
+    # Sem resumo possível, cada email sai com o próprio corpo
+    assert _drenar(app) == 2
+    assert len(smtp.mensagens) == 2
+    assert not any(_assunto(m).startswith("📋") for m in smtp.mensagens)
+    with app.app_context():
+        assert {email.status for email in EmailOutbox.query} == {"Enviado"}
+
+
+def test_emails_de_avaliacao_escapam_o_que_o_usuario_digitou():
+    from datetime import date
+    from types import SimpleNamespace
+
+    from app.email import montar_email_avaliacao, montar_email_resumo_avaliacoes
+
+    residente = SimpleNamespace(nome="Residente <i>Um</i>")
+    procedimento = SimpleNamespace(
+        nome_procedimento='<img src="x">Punção',
+        data_realizacao=date(2025, 1, 1),
+        preceptor=SimpleNamespace(nome="<b>Preceptora</b>"),
+        observacao_preceptor='<a href="http://exemplo.com">Clique</a>',
+    )
+    corpos = [
+        montar_email_avaliacao(residente, procedimento, "Validado")[2],
+        montar_email_avaliacao(residente, procedimento, "Rejeitado")[2],
+        montar_email_resumo_avaliacoes(
+            residente, [(procedimento, "Validado"), (procedimento, "Rejeitado")]
+        )[2],
+    ]
+    for html in corpos:
+        for marcacao in ("<i>", "<img", "<b>", "<a "):
+            assert marcacao not in html
+        assert "&lt;img src=&#34;x&#34;&gt;Punção" in html
+        assert "&lt;a href=&#34;http://exemplo.com&#34;&gt;Clique&lt;/a&gt;" in html
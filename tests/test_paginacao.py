@@ -0,0 +1,70 @@
+# tests/test_paginacao.py
+"""Paginação por (data, id) das listas dos dashboards."""
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import Procedimento
+
+
+def _percorrer(client, url):
+    """Segue os cursores até o fim; retorna os ids, página a página."""
+    paginas, cursor = [], None
+    while True:
+        resposta = client.get(url, query_string={"cursor": cursor} if cursor else {})
+        assert resposta.status_code == 200
+        paginas.append([item["id"] for item in resposta.json["itens"]])
+        cursor = resposta.json["proximo_cursor"]
+        if cursor is None:
+            return paginas
+
+
+@pytest.mark.parametrize(
+    "usuario, url",
+    [
+        ("residente", "/api/dashboard/residente/procedimentos"),
+        ("preceptor", "/api/dashboard/preceptor/avaliados"),
+    ],
+)
+def test_cursores_passam_por_todos_uma_vez_em_ordem(
+    app, client, dados, entrar, criar_procedimentos, monkeypatch, usuario, url
+):
+    monkeypatch.setitem(app.config, "DASHBOARD_PAGINA_TAMANHO", 2)
+    # Três procedimentos por dia: as páginas cortam no meio de um mesmo dia
+    inicio = date(2025, 5, 1)
+    for status in ("Validado", "Rejeitado", "Validado"):
+        criar_procedimentos(3, status=status, inicio=inicio)
+    with app.app_context():
+        esperado = [
+            id
+            for (id,) in db.session.query(Procedimento.id).order_by(
+                Procedimento.data_realizacao.desc(), Procedimento.id.desc()
+            )
+        ]
+    entrar(getattr(dados, f"{usuario}_email"))
+
+    paginas = _percorrer(client, url)
+
+    assert [len(pagina) for pagina in paginas] == [2, 2, 2, 2, 1]
+    assert [id for pagina in paginas for id in pagina] == esperado
+
+
+def test_ultima_pagina_cheia_nao_tem_proximo_cursor(
+    app, client, dados, entrar, criar_procedimentos, monkeypatch
+):
+    monkeypatch.setitem(app.config, "DASHBOARD_PAGINA_TAMANHO", 2)
+    criar_procedimentos(4)
+    entrar(dados.residente_email)
+
+    paginas = _percorrer(client, "/api/dashboard/residente/procedimentos")
+    assert [len(pagina) for pagina in paginas] == [2, 2]
+
+
+@pytest.mark.parametrize("cursor", ["lixo", "2025-13-01.1", "2025-01-01.x"])
+def test_cursor_invalido_e_400(client, dados, entrar, cursor):
+    entrar(dados.residente_email)
+    resposta = client.get(
+        "/api/dashboard/residente/procedimentos", query_string={"cursor": cursor}
+    )
+    assert resposta.status_code == 400
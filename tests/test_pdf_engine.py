@@ -0,0 +1,146 @@
+# tests/test_pdf_engine.py
+"""Motor de PDF: tempo máximo, teto de memória e troca do pool quebrado.
+
+Cada teste sobe um pool próprio, com um processo só, em vez de usar o
+``motor_pdf`` da aplicação (que nos testes renderiza no próprio processo).
+"""
+import base64
+import struct
+import zlib
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app import pdf_engine
+from app.pdf_engine import MotorPDF, TempoRenderizacaoEsgotado
+
+
+def _weasyprint_disponivel():
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        # OSError: o pacote está lá, mas faltam as bibliotecas do sistema (Pango)
+        return False
+    return True
+
+
+pytestmark = pytest.mark.skipif(
+    not _weasyprint_disponivel(), reason="WeasyPrint indisponível"
+)
+
+HTML_SIMPLES = "<p>Relatório</p>"
+
+
+@pytest.fixture
+def motor():
+    motor = MotorPDF()
+    motor.workers = 1
+    motor.timeout = 60
+    motor.limite_memoria_mb = 0
+    yield motor
+    motor.encerrar()
+
+
+def _html_demorado(linhas=20000):
+    """Uma tabela grande: bem mais de um segundo de layout."""
+    celulas = "".join(
+        f"<tr><td>{i}</td><td>Procedimento {i} do relatório</td></tr>"
+        for i in range(linhas)
+    )
+    return f"<table>{celulas}</table>"
+
+
+def _png_rgba(lado, cor):
+    """PNG ``lado`` x ``lado`` de uma cor só: poucos KB, centenas de MB aberto."""
+
+    def bloco(tipo, dados):
+        corpo = tipo + dados
+        crc = zlib.crc32(corpo)
+        return struct.pack(">I", len(dados)) + corpo + struct.pack(">I", crc)
+
+    compressor = zlib.compressobj(9)
+    linha = b"\x00" + bytes(cor) * lado
+    dados = b"".join(compressor.compress(linha) for _ in range(lado))
+    dados += compressor.flush()
+    cabecalho = struct.pack(">IIBBBBB", lado, lado, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + bloco(b"IHDR", cabecalho)
+        + bloco(b"IDAT", dados)
+        + bloco(b"IEND", b"")
+    )
+
+
+def _html_pesado():
+    """Imagens que, abertas para o PDF, passam de 1 GB."""
+    imagens = []
+    for cor in ((255, 0, 0, 128), (0, 255, 0, 128), (0, 0, 255, 128)):
+        png = base64.b64encode(_png_rgba(8000, cor)).decode()
+        imagens.append(f'<img src="data:image/png;base64,{png}">')
+    return "".join(imagens)
+
+
+def test_tempo_esgotado_volta_como_erro_e_o_pool_continua(motor):
+    motor.timeout = 1
+
+    with pytest.raises(TempoRenderizacaoEsgotado):
+        motor.renderizar(_html_demorado())
+
+    # O alarme interrompeu só a renderização: o mesmo processo atende a próxima
+    executor = motor._executor
+    assert motor.renderizar(HTML_SIMPLES)[:4] == b"%PDF"
+    assert motor._executor is executor
+
+
+def test_renderizacao_acima_do_teto_de_memoria_falha_sem_quebrar_o_pool(motor):
+    motor.limite_memoria_mb = 1024
+    assert motor.renderizar(HTML_SIMPLES)[:4] == b"%PDF"
+    executor = motor._executor
+
+    with pytest.raises(MemoryError):
+        motor.renderizar(_html_pesado())
+
+    assert motor.renderizar(HTML_SIMPLES)[:4] == b"%PDF"
+    assert motor._executor is executor
+
+
+def test_processo_morto_troca_o_pool(motor):
+    futuro = motor.submeter(_html_demorado())
+    executor = motor._executor
+    # Faz o papel do watchdog, que encerra o processo preso
+    for processo in list(executor._processes.values()):
+        processo.kill()
+
+    with pytest.raises(BrokenProcessPool):
+        motor.aguardar(futuro)
+
+    assert motor.renderizar(HTML_SIMPLES)[:4] == b"%PDF"
+    assert motor._executor is not executor
+
+
+@pytest.mark.parametrize(
+    "preparar, encerra",
+    [
+        (lambda motor: motor.usar_processo_atual(), False),
+        (lambda motor: pdf_engine.preparar_processo(motor.timeout), True),
+    ],
+    ids=["worker_da_fila", "processo_do_pool"],
+)
+def test_watchdog_so_encerra_processos_que_so_renderizam(
+    motor, monkeypatch, preparar, encerra
+):
+    # Os globais que preparar_processo altera voltam ao fim do teste
+    monkeypatch.setattr(pdf_engine, "_timeout", 0)
+    monkeypatch.setattr(pdf_engine, "_encerrar_se_preso", True)
+    chamadas = []
+    monkeypatch.setattr(
+        pdf_engine.faulthandler,
+        "dump_traceback_later",
+        lambda segundos, exit: chamadas.append(exit),
+    )
+    motor.timeout = 60
+    preparar(motor)
+    motor.workers = 0
+
+    assert motor.renderizar(HTML_SIMPLES)[:4] == b"%PDF"
+    assert chamadas == [encerra]
@@ -0,0 +1,212 @@
+# tests/test_relatorios.py
+"""Impressão digital do relatório em PDF (chave do cache e ETag)."""
+import pytest
+
+from app import db
+from app.models import Hospital, Procedimento, Residente
+from app.reports import fingerprint_relatorio
+
+
+@pytest.fixture
+def chave_atual(app, dados):
+    def chave():
+        with app.app_context():
+            return fingerprint_relatorio(db.session.get(Residente, dados.residente_id))
+
+    return chave
+
+
+@pytest.mark.parametrize(
+    "alterar",
+    [
+        lambda p, r: setattr(p, "nome_procedimento", "Outro nome"),
+        lambda p, r: setattr(p, "historia_clinica", "Outra história."),
+        lambda p, r: setattr(p, "observacao_preceptor", "Revisar a técnica."),
+        lambda p, r: setattr(p.preceptor, "nome", "Dra. Renomeada"),
+        lambda p, r: setattr(r.especialidade, "nome", "Cardiologia"),
+        lambda p, r: setattr(
+            db.session.get(Hospital, r.supervisor.hospital_id), "nome", "Outro HC"
+        ),
+        lambda p, r: setattr(r.supervisor.universidade, "nome", "Outra"),
+    ],
+    ids=[
+        "nome",
+        "heipoc",
+        "observacao",
+        "preceptor",
+        "especialidade",
+        "hospital",
+        "universidade",
+    ],
+)
+def test_chave_muda_com_o_que_o_relatorio_mostra(
+    app, dados, criar_procedimentos, chave_atual, alterar
+):
+    (procedimento_id,) = criar_procedimentos(1, status="Validado")
+    antes = chave_atual()
+    assert chave_atual() == antes
+
+    with app.app_context():
+        procedimento = db.session.get(Procedimento, procedimento_id)
+        alterar(procedimento, db.session.get(Residente, dados.residente_id))
+        db.session.commit()
+
+    assert chave_atual() != antes
+
+
+def test_chave_nao_le_os_textos_dos_procedimentos(
+    app, dados, criar_procedimentos, chave_atual
+):
+    from app.query_counter import contar_queries
+
+    criar_procedimentos(3, status="Validado")
+    with contar_queries(app) as contador:
+        chave_atual()
+
+    comandos = " ".join(contador.comandos)
+    assert "procedimento.revisao" in comandos
+    for coluna in ("historia_clinica", "descricao_html", "observacao_preceptor"):
+        assert coluna not in comandos
+
+
+def test_recalcular_depois_de_update_em_massa_muda_a_chave(
+    app, dados, criar_procedimentos, chave_atual
+):
+    from app.descriptions import recalcular
+
+    (procedimento_id,) = criar_procedimentos(1, status="Validado")
+    antes = chave_atual()
+
+    with app.app_context():
+        # Por fora dos eventos da ORM: nem a descrição nem a revisão mudam
+        db.session.execute(
+            db.update(Procedimento)
+            .where(Procedimento.id == procedimento_id)
+            .values(historia_clinica="Outra história.")
+        )
+        db.session.commit()
+    assert chave_atual() == antes
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            assert recalcular(conn) == 1
+        procedimento = db.session.get(Procedimento, procedimento_id)
+        assert "Outra história." in procedimento.descricao_html
+    assert chave_atual() != antes
+
+
+def test_chave_muda_com_o_dia_da_emissao(
+    app, dados, criar_procedimentos, chave_atual, monkeypatch
+):
+    from datetime import datetime, timedelta
+
+    import app.reports as reports
+
+    criar_procedimentos(1, status="Validado")
+    antes = chave_atual()
+    amanha = datetime.now() + timedelta(days=1)
+    monkeypatch.setattr(reports, "_agora_local", lambda: amanha)
+
+    assert chave_atual() != antes
+
+
+def test_chave_ignora_texto_de_procedimentos_nao_validados(
+    app, dados, criar_procedimentos, chave_atual
+):
+    (procedimento_id,) = criar_procedimentos(1)
+    antes = chave_atual()
+
+    with app.app_context():
+        db.session.get(Procedimento, procedimento_id).nome_procedimento = "Rascunho"
+        db.session.commit()
+
+    assert chave_atual() == antes
+
+
+def test_zip_nao_espera_para_sempre_por_um_pdf_travado(
+    dados, client, entrar, criar_procedimentos, monkeypatch
+):
+    import io
+    import zipfile
+    from concurrent.futures import Future
+
+    import app.reports as reports
+
+    criar_procedimentos(1, status="Validado")
+    # Um Future que nunca termina faz o papel de um processo do pool travado
+    monkeypatch.setattr(reports.motor_pdf, "submeter", lambda html: Future())
+    monkeypatch.setattr(reports, "_limite_espera_zip", lambda: 0.1)
+    entrar(dados.preceptor_email)
+
+    resposta = client.get("/relatorio/preceptor/residentes.zip")
+    assert resposta.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo_zip:
+        (nome,) = arquivo_zip.namelist()
+        assert nome.endswith("_ERRO.txt")
+        assert b"tempo de renderiza" in arquivo_zip.read(nome)
+
+
+
+def test_zip_renderiza_de_novo_o_pdf_que_sai_do_cache_antes_da_leitura(
+    dados, client, entrar, criar_procedimentos, monkeypatch, tmp_path
+):
+    import io
+    import zipfile
+    from concurrent.futures import Future
+
+    import app.reports as reports
+
+    def renderizado(html):
+        futuro = Future()
+        futuro.set_result(b"%PDF-renderizado")
+        return futuro
+
+    criar_procedimentos(1, status="Validado")
+    # O cache acha o PDF, mas o limite o apaga antes de o ZIP abri-lo
+    monkeypatch.setattr(
+        reports.cache_relatorios,
+        "obter",
+        lambda residente_id, chave: str(tmp_path / "descartado.pdf"),
+    )
+    monkeypatch.setattr(reports.cache_relatorios, "guardar", lambda *args: None)
+    monkeypatch.setattr(reports.motor_pdf, "submeter", renderizado)
+    entrar(dados.preceptor_email)
+
+    resposta = client.get("/relatorio/preceptor/residentes.zip")
+    assert resposta.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo_zip:
+        (nome,) = arquivo_zip.namelist()
+        assert nome.endswith(".pdf")
+        assert arquivo_zip.read(nome) == b"%PDF-renderizado"
+
+
+def test_gravacoes_simultaneas_da_mesma_chave_nao_se_misturam(tmp_path):
+    import threading
+
+    from app.report_cache import CacheRelatorios
+
+    cache = CacheRelatorios()
+    cache.diretorio = str(tmp_path)
+    cache.max_bytes = 10**9
+    conteudos = [bytes([ord("A") + i]) * 2_000_000 for i in range(8)]
+    inicio = threading.Barrier(len(conteudos))
+    erros = []
+
+    def gravar(pdf_bytes):
+        inicio.wait()
+        try:
+            for _ in range(5):
+                cache.guardar(1, "chave", pdf_bytes)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=gravar, args=(c,)) for c in conteudos]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert erros == []
+    (arquivo,) = tmp_path.iterdir()
+    assert arquivo.name == "1-chave.pdf"
+    assert arquivo.read_bytes() in conteudos